@@ -0,0 +1,108 @@
+import argparse
+import gc
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from sapiens_inference import SapiensMultiTask, SapiensSegmentationType, SapiensDepthType, SapiensNormalType, clear_model_cache
+from sapiens_inference.precision import PRECISIONS, COMPILE_MODES, InferenceOptions, compare_maps, passes_guard
+
+SEGMENTATION_TYPES = {"03b": SapiensSegmentationType.SEGMENTATION_03B,
+                      "06b": SapiensSegmentationType.SEGMENTATION_06B,
+                      "1b": SapiensSegmentationType.SEGMENTATION_1B}
+DEPTH_TYPES = {"off": SapiensDepthType.OFF, "03b": SapiensDepthType.DEPTH_03B, "06b": SapiensDepthType.DEPTH_06B,
+               "1b": SapiensDepthType.DEPTH_1B, "2b": SapiensDepthType.DEPTH_2B}
+NORMAL_TYPES = {"off": SapiensNormalType.OFF, "03b": SapiensNormalType.NORMAL_03B, "06b": SapiensNormalType.NORMAL_06B,
+                "1b": SapiensNormalType.NORMAL_1B, "2b": SapiensNormalType.NORMAL_2B}
+
+
+def load_calibration_images(folder, limit):
+    names = sorted(f for f in os.listdir(folder) if os.path.splitext(f)[1].lower() in (".jpg", ".jpeg", ".png", ".bmp"))
+    return [cv2.imread(os.path.join(folder, name)) for name in names[:limit]]
+
+
+def run_mode(args, options, images, device):
+    """Latency, peak memory and maps of every calibration image for one inference mode."""
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats(device)
+    start = time.perf_counter()
+    runner = SapiensMultiTask(SEGMENTATION_TYPES[args.segmentation], DEPTH_TYPES[args.depth], NORMAL_TYPES[args.normal],
+                              device=device, options=options)
+    load_seconds = time.perf_counter() - start
+
+    for img in images[:args.warmup]:
+        runner(img)
+    latencies, maps = [], []
+    for img in images:
+        start = time.perf_counter()
+        maps.append(runner(img))
+        latencies.append(time.perf_counter() - start)
+    peak_mb = torch.cuda.max_memory_allocated(device) / 2 ** 20 if device.type == "cuda" else float("nan")
+
+    # Drop the process-wide model cache too, so the next mode's peak memory is its own
+    del runner
+    clear_model_cache()
+    gc.collect()
+    return {"load_s": load_seconds, "latency_ms": 1000.0 * float(np.median(latencies)), "peak_mb": peak_mb}, maps
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Latency, memory and accuracy of the reduced-precision inference modes "
+                                                 "against float32 on a calibration set")
+    parser.add_argument("calibration_dir", help="Folder with calibration images")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--modes", nargs="+", choices=list(PRECISIONS), default=list(PRECISIONS))
+    parser.add_argument("--channels_last", action="store_true")
+    parser.add_argument("--compile", choices=COMPILE_MODES, default="none")
+    parser.add_argument("--segmentation", choices=list(SEGMENTATION_TYPES), default="1b")
+    parser.add_argument("--depth", choices=list(DEPTH_TYPES), default="1b")
+    parser.add_argument("--normal", choices=list(NORMAL_TYPES), default="off")
+    parser.add_argument("--num_images", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--min_seg_agreement", type=float, default=0.99)
+    parser.add_argument("--max_depth_error", type=float, default=0.02)
+    parser.add_argument("--max_normal_error", type=float, default=0.05)
+    parser.add_argument("--fail_on_guard", action="store_true", help="Exit with status 1 if a mode fails the accuracy guard")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    device = torch.device(args.device)
+    images = load_calibration_images(args.calibration_dir, args.num_images)
+    if not images:
+        raise FileNotFoundError(f"No calibration images in {args.calibration_dir}")
+
+    # The float32 run is the reference and always comes first
+    modes = ["fp32"] + [mode for mode in args.modes if mode != "fp32"]
+    reference, failed = None, []
+    print(f"{len(images)} calibration images on {device}\n")
+    print(f"{'mode':<34} {'load':>7} {'latency':>10} {'peak mem':>10} {'seg agree':>10} {'depth err':>16} {'guard':>6}")
+    for mode in modes:
+        options = InferenceOptions(precision=mode, channels_last=args.channels_last, compile=args.compile)
+        try:
+            stats, maps = run_mode(args, options, images, device)
+        except RuntimeError as e:
+            print(f"{str(options):<34} failed: {str(e).splitlines()[0]}")
+            failed.append(mode)
+            continue
+        if reference is None:
+            reference = maps
+        metrics = [compare_maps(ref, out) for ref, out in zip(reference, maps)]
+        summary = {key: float(np.mean([m[key] for m in metrics])) for key in metrics[0]}
+        summary.update({key: float(np.max([m[key] for m in metrics])) for key in metrics[0] if key.endswith("max_error")})
+        ok = passes_guard(summary, args.min_seg_agreement, args.max_depth_error, args.max_normal_error)
+        if not ok:
+            failed.append(mode)
+        depth = f"{summary.get('depth_mean_error', 0.0):.4f}/{summary.get('depth_max_error', 0.0):.4f}"
+        print(f"{str(options):<34} {stats['load_s']:6.1f}s {stats['latency_ms']:8.1f}ms {stats['peak_mb']:8.0f}MB "
+              f"{100 * summary.get('seg_agreement', 1.0):9.3f}% {depth:>16} {'ok' if ok else 'FAIL':>6}")
+
+    print("\ndepth err is mean/max absolute error of the normalized depth against fp32")
+    if failed and args.fail_on_guard:
+        sys.exit(1)
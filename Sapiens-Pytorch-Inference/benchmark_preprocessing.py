@@ -0,0 +1,92 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from sapiens_inference.common import create_preprocessor, TensorPreprocessor
+from sapiens_inference.segmentation import postprocess_segmentation, postprocess_segmentation_tensor
+from sapiens_inference.depth import postprocess_depth, postprocess_depth_tensor
+
+INPUT_SIZE = (1024, 768)
+
+
+def sync(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def median_ms(fn, device, warmup=2, repeat=10):
+    times = []
+    for i in range(warmup + repeat):
+        sync(device)
+        start = time.perf_counter()
+        fn()
+        sync(device)
+        if i >= warmup:
+            times.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(times))
+
+
+def benchmark_preprocessing(images, device, dtype, repeat):
+    pil = create_preprocessor(input_size=INPUT_SIZE)
+    tensor = TensorPreprocessor(input_size=INPUT_SIZE, device=device, dtype=dtype)
+
+    def run_pil():
+        return torch.cat([pil(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)) for img in images]).to(device).to(dtype)
+
+    def run_tensor():
+        return tensor(images)
+
+    difference = (run_pil().float() - run_tensor().float()).abs()
+    return median_ms(run_pil, device, repeat=repeat), median_ms(run_tensor, device, repeat=repeat), difference
+
+
+def benchmark_postprocessing(shape, device, repeat, num_classes=28):
+    # Model outputs are a quarter of the input resolution
+    logits = torch.randn((1, num_classes, INPUT_SIZE[0] // 4, INPUT_SIZE[1] // 4), device=device)
+    depth = torch.randn((1, 1, INPUT_SIZE[0] // 4, INPUT_SIZE[1] // 4), device=device)
+
+    seg_pil = median_ms(lambda: postprocess_segmentation(logits, shape), device, repeat=repeat)
+    seg_tensor = median_ms(lambda: postprocess_segmentation_tensor(logits, shape), device, repeat=repeat)
+    depth_pil = median_ms(lambda: postprocess_depth(depth, shape), device, repeat=repeat)
+    depth_tensor = median_ms(lambda: postprocess_depth_tensor(depth, shape), device, repeat=repeat)
+    agreement = (postprocess_segmentation(logits, shape) == postprocess_segmentation_tensor(logits, shape)).mean()
+    depth_error = np.abs(postprocess_depth(depth, shape) - postprocess_depth_tensor(depth, shape).astype(np.float32)).max()
+    return seg_pil, seg_tensor, depth_pil, depth_tensor, agreement, depth_error
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Compare the PIL and the tensor-native pre/post-processing")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--dtype", choices=["float32", "float16", "bfloat16"], default="float32")
+    parser.add_argument("--sizes", nargs="+", default=["1280x720", "1920x1080", "4032x3024"],
+                        help="Image sizes as WIDTHxHEIGHT")
+    parser.add_argument("--batch_size", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=10)
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    device = torch.device(args.device)
+    dtype = getattr(torch, args.dtype)
+    rng = np.random.default_rng(0)
+
+    print(f"Device {device}, dtype {args.dtype}, batch size {args.batch_size}")
+    print(f"{'size':>10} | {'pre PIL':>9} {'pre tensor':>10} {'speedup':>7} {'max diff':>8} | "
+          f"{'seg PIL':>8} {'seg tensor':>10} {'agree':>7} | {'depth PIL':>9} {'depth tensor':>12} {'max err':>8}")
+    for size in args.sizes:
+        width, height = map(int, size.split("x"))
+        # Smooth images so the resize comparison is not dominated by aliasing of pure noise
+        small = rng.integers(0, 256, (height // 16 + 1, width // 16 + 1, 3), dtype=np.uint8)
+        images = [cv2.resize(np.roll(small, i, axis=1), (width, height), interpolation=cv2.INTER_CUBIC)
+                  for i in range(args.batch_size)]
+
+        pre_pil, pre_tensor, difference = benchmark_preprocessing(images, device, dtype, args.repeat)
+        seg_pil, seg_tensor, depth_pil, depth_tensor, agreement, depth_error = \
+            benchmark_postprocessing((height, width), device, args.repeat)
+        print(f"{size:>10} | {pre_pil:7.1f}ms {pre_tensor:8.1f}ms {pre_pil / pre_tensor:6.1f}x {difference.max().item():8.4f} | "
+              f"{seg_pil:6.1f}ms {seg_tensor:8.1f}ms {100 * agreement:6.2f}% | "
+              f"{depth_pil:7.1f}ms {depth_tensor:10.1f}ms {depth_error:8.4f}")
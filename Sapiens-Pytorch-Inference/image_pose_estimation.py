@@ -12,6 +12,8 @@ img = imread_from_url("https://learnopencv.com/wp-content/uploads/2024/09/footba
 segmentation_map = estimator(img)
 
 result_img, keypoints = estimator(img)
+print(estimator.timings)
+print(f"{len(keypoints)} persons")
 
 cv2.imshow("pose_estimation", result_img)
 cv2.waitKey(0)
@@ -15,6 +15,8 @@ img = imread_from_url("https://github.com/ibaiGorordo/Sapiens-Pytorch-Inference/
 
 # Estimate the maps
 result = predictor(img)
+for timings in predictor.timings:
+    print(timings)
 
 cv2.namedWindow("Combined", cv2.WINDOW_NORMAL)
 cv2.imshow("Combined", result)
@@ -22,28 +22,34 @@ model_type_dict = {
 
 
 @torch.no_grad()
-def export_model(model_name: str, filename: str):
+def export_model(model_name: str, filename: str, dynamic_batch: bool = False, opset: int = 14):
     type, task_type = model_type_dict[model_name]
-    path = download_hf_model(type.value, TaskType.SEG)
+    path = download_hf_model(type.value)
     model = torch.jit.load(path)
     model = model.eval().to(device).to(torch.float32)
     input = torch.randn(1, 3, 1024, 768, dtype=torch.float32, device=device)  # Only this size seems to work well
+    # With a dynamic batch axis the ONNX Runtime backend can run a whole batch per call
+    dynamic_axes = {"input": {0: "batch"}, "output": {0: "batch"}} if dynamic_batch else None
     torch.onnx.export(model,
                       input,
                       filename,
                       export_params=True,
                       do_constant_folding=True,
-                      opset_version=14,
+                      opset_version=opset,
                       input_names=["input"],
-                      output_names=["output"])
+                      output_names=["output"],
+                      dynamic_axes=dynamic_axes)
 
 
 def get_parser():
     parser = argparse.ArgumentParser(description="Export Sapiens models to ONNX")
     parser.add_argument("model_name", type=str, choices=model_type_dict.keys(), help="Model type to export")
+    parser.add_argument("--output", type=str, default=None, help="Output file (default: <model_name>.onnx)")
+    parser.add_argument("--dynamic_batch", action="store_true", help="Export with a dynamic batch axis")
+    parser.add_argument("--opset", type=int, default=14)
     return parser
 
 
 if __name__ == "__main__":
     args = get_parser().parse_args()
-    export_model(args.model, f"{args.model}.onnx")
+    export_model(args.model_name, args.output or f"{args.model_name}.onnx", args.dynamic_batch, args.opset)
@@ -1,4 +1,9 @@
 from .predictor import SapiensPredictor, SapiensConfig
 from .normal import SapiensNormal, SapiensNormalType
 from .segmentation import SapiensSegmentation, SapiensSegmentationType
-from .depth import SapiensDepth, SapiensDepthType
\ No newline at end of file
+from .depth import SapiensDepth, SapiensDepthType
+from .multitask import SapiensMultiTask
+from .common import InferenceTimings
+from .precision import InferenceOptions
+from .onnx_runtime import SapiensSegmentationOnnx, SapiensDepthOnnx, OnnxModel, ONNXRUNTIME_AVAILABLE
+from .registry import ModelRegistry, load_model, clear_model_cache
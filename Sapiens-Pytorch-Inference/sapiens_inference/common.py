@@ -1,7 +1,13 @@
 import os
 import shutil
-from typing import List
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+import numpy as np
 import requests
+import torch
+import torch.nn.functional as F
 from tqdm import tqdm
 from enum import Enum
 from huggingface_hub import hf_hub_download, hf_hub_url
@@ -36,26 +42,15 @@ def download(url: str, filename: str):
                     f.write(chunk)
 
 
-def download_hf_model(model_name: str, model_dir: str = 'models'):
-    if not os.path.exists(model_dir):
-        os.makedirs(model_dir)
-
-    repo_name = model_name.split("/")[0]
-    filename = model_name.split("/")[1]
-
-    path = model_dir + "/" + filename
-    if os.path.exists(path):
-        return path
-
-    print(f"Model {filename} not found, downloading from Hugging Face Hub...")
-
-    repo_id = f"facebook/{repo_name}"
-
-    url = hf_hub_url(repo_id=repo_id, filename=filename)
-    download(url, path)
-    print("Model downloaded successfully to", path)
-
-    return path
+def download_hf_model(model_name: str, model_dir: Optional[str] = None):
+    """
+    Absolute path of a checkpoint in the model registry (model_dir, or
+    $SAPIENS_MODEL_DIR / Sapiens-Pytorch-Inference/models), downloaded and
+    checksummed on first use. Works without a network for cached files.
+    """
+    from .registry import ModelRegistry, get_registry
+    registry = ModelRegistry(model_dir) if model_dir else get_registry()
+    return registry.resolve(model_name)
 
 
 def create_preprocessor(input_size: tuple[int, int],
@@ -68,6 +63,48 @@ def create_preprocessor(input_size: tuple[int, int],
                                transforms.Lambda(lambda x: x.unsqueeze(0))
                                ])
 
+class TensorPreprocessor:
+    """
+    Tensor-native counterpart of create_preprocessor. Takes uint8 BGR images
+    as read by cv2, uploads each one once and does the channel flip, the
+    (antialiased bilinear, like PIL) resize and the normalization on the
+    target device. Accepts one image or a list of images of any size and
+    returns a (N, 3, H, W) batch in dtype.
+    """
+
+    def __init__(self, input_size: tuple[int, int], device: torch.device, dtype: torch.dtype = torch.float32,
+                 mean: List[float] = (0.485, 0.456, 0.406),
+                 std: List[float] = (0.229, 0.224, 0.225)):
+        self.input_size = tuple(input_size)
+        self.device = torch.device(device)
+        self.dtype = dtype
+        # Applied to 0..255 values, which saves the division by 255
+        self.mean = torch.tensor(mean, device=self.device).view(1, 3, 1, 1) * 255.0
+        self.std = torch.tensor(std, device=self.device).view(1, 3, 1, 1) * 255.0
+
+    def upload(self, img: Union[np.ndarray, torch.Tensor]) -> torch.Tensor:
+        tensor = torch.from_numpy(np.ascontiguousarray(img)) if isinstance(img, np.ndarray) else img
+        if self.device.type == "cuda" and tensor.device.type == "cpu":
+            tensor = tensor.pin_memory()
+        return tensor.to(self.device, non_blocking=True)
+
+    def resize(self, x: torch.Tensor) -> torch.Tensor:
+        if tuple(x.shape[-2:]) == self.input_size:
+            return x
+        return F.interpolate(x, size=self.input_size, mode="bilinear", align_corners=False, antialias=True)
+
+    def __call__(self, imgs: Union[np.ndarray, Sequence[np.ndarray]]) -> torch.Tensor:
+        if isinstance(imgs, (np.ndarray, torch.Tensor)) and imgs.ndim == 3:
+            imgs = [imgs]
+        uploaded = [self.upload(img) for img in imgs]
+        if all(x.shape == uploaded[0].shape for x in uploaded):
+            # Same size: one resize call for the whole batch
+            batch = self.resize(torch.stack(uploaded).permute(0, 3, 1, 2).flip(1).float())
+        else:
+            batch = torch.cat([self.resize(x.permute(2, 0, 1).flip(0)[None].float()) for x in uploaded])
+        return ((batch - self.mean) / self.std).to(self.dtype)
+
+
 def pose_estimation_preprocessor(input_size: tuple[int, int],
                         mean: List[float] = (0.485, 0.456, 0.406),
                         std: List[float] = (0.229, 0.224, 0.225)):
@@ -77,3 +114,34 @@ def pose_estimation_preprocessor(input_size: tuple[int, int],
                                transforms.ToTensor(),
                                transforms.Normalize(mean=mean, std=std),
                                ])
+
+
+@dataclass
+class InferenceTimings:
+    """Wall-clock seconds per stage of one prediction; heads holds the time of each model inside inference."""
+    stages: Dict[str, float] = field(default_factory=dict)
+    heads: Dict[str, float] = field(default_factory=dict)
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    @property
+    def total(self) -> float:
+        return sum(self.stages.values())
+
+    def __str__(self):
+        parts = []
+        for stage, seconds in self.stages.items():
+            part = f"{stage} {seconds * 1000:.1f} ms"
+            if stage == "inference" and self.heads:
+                part += " (" + ", ".join(f"{name} {t * 1000:.1f}" for name, t in self.heads.items()) + ")"
+            parts.append(part)
+        return " | ".join(parts + [f"total {self.total * 1000:.1f} ms"])
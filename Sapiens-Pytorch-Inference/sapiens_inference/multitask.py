@@ -0,0 +1,165 @@
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import torch
+
+from .common import create_preprocessor, InferenceTimings, TensorPreprocessor
+from .precision import InferenceOptions
+from .depth import SapiensDepth, SapiensDepthType, postprocess_depth, postprocess_depth_tensor
+from .normal import SapiensNormal, SapiensNormalType, postprocess_normal, postprocess_normal_tensor
+from .segmentation import (SapiensSegmentation, SapiensSegmentationType, postprocess_segmentation,
+                           postprocess_segmentation_tensor)
+
+PREPROCESSING = ["tensor", "pil"]
+
+POSTPROCESSORS = {
+    "pil": {
+        "seg": postprocess_segmentation,
+        "depth": postprocess_depth,
+        "normal": postprocess_normal,
+    },
+    "tensor": {
+        "seg": postprocess_segmentation_tensor,
+        "depth": postprocess_depth_tensor,
+        "normal": postprocess_normal_tensor,
+    },
+}
+
+
+class SapiensMultiTask:
+    """
+    Runs the segmentation, depth and normal models on one shared input. Every
+    image is preprocessed and copied to the device once and all enabled heads
+    read the same normalized tensor. On CUDA each head runs on its own stream,
+    on the CPU they run one after another on the same tensor.
+
+    preprocessing="tensor" resizes and normalizes on the device and also
+    upsamples there, returning uint8 class maps and float16 depth/normals;
+    "pil" is the original torchvision/PIL path on the CPU.
+    """
+
+    def __init__(self,
+                 segmentation_type: Optional[SapiensSegmentationType] = SapiensSegmentationType.SEGMENTATION_1B,
+                 depth_type: SapiensDepthType = SapiensDepthType.OFF,
+                 normal_type: SapiensNormalType = SapiensNormalType.OFF,
+                 device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu"),
+                 dtype: torch.dtype = torch.float32,
+                 use_streams: bool = True,
+                 preprocessing: str = "tensor",
+                 options: Optional[InferenceOptions] = None,
+                 heads: Optional[Dict] = None):
+        if preprocessing not in PREPROCESSING:
+            raise ValueError(f"Unknown preprocessing {preprocessing}, expected one of {PREPROCESSING}")
+        self.options = options or InferenceOptions.from_dtype(dtype)
+        self.device = torch.device(device)
+        self.dtype = dtype = self.options.dtype
+        self.preprocessing = preprocessing
+        if heads:
+            # Ready-made heads (e.g. the ONNX Runtime ones) instead of loading the TorchScript models
+            self.heads = dict(heads)
+        else:
+            self.heads = {}
+            if segmentation_type is not None:
+                self.heads["seg"] = SapiensSegmentation(segmentation_type, self.device, options=self.options)
+            if depth_type not in (None, SapiensDepthType.OFF):
+                self.heads["depth"] = SapiensDepth(depth_type, self.device, options=self.options)
+            if normal_type not in (None, SapiensNormalType.OFF):
+                self.heads["normal"] = SapiensNormal(normal_type, self.device, options=self.options)
+        if not self.heads:
+            raise ValueError("At least one task has to be enabled")
+
+        # Same input for all heads
+        if preprocessing == "tensor":
+            self.preprocessor = TensorPreprocessor(input_size=(1024, 768), device=self.device, dtype=dtype)
+        else:
+            self.preprocessor = create_preprocessor(input_size=(1024, 768))
+        self.postprocessors = POSTPROCESSORS[preprocessing]
+        self.streams = None
+        if use_streams and self.device.type == "cuda" and len(self.heads) > 1:
+            self.streams = {name: torch.cuda.Stream(self.device) for name in self.heads}
+        self.timings = None
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        kwargs.setdefault("options", config.inference_options)
+        return cls(config.segmentation_type, config.depth_type, config.normal_type, config.device, config.dtype, **kwargs)
+
+    @property
+    def tasks(self):
+        return list(self.heads)
+
+    def prepare(self, img: np.ndarray):
+        """Host side part of the preprocessing, safe to run in worker threads."""
+        if self.preprocessing == "tensor":
+            return img
+        # Model expects BGR, but we change to RGB here because the preprocessor will switch the channels also
+        return self.preprocessor(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+    def to_batch(self, prepared: List) -> torch.Tensor:
+        """Device batch from the results of prepare()."""
+        if self.preprocessing == "tensor":
+            return self.preprocessor(prepared)
+        batch = torch.cat(prepared)
+        if self.device.type == "cuda":
+            batch = batch.pin_memory()
+        return batch.to(self.device, non_blocking=True).to(self.dtype)
+
+    def preprocess(self, img: np.ndarray) -> torch.Tensor:
+        return self.to_batch([self.prepare(img)])
+
+    def forward(self, batch: torch.Tensor, tasks: Optional[List[str]] = None) -> (Dict[str, torch.Tensor], Dict[str, float]):
+        """
+        Raw outputs of every head (or only of the given tasks) for a
+        preprocessed batch on the device, and the seconds each head took.
+        """
+        if tasks is None:
+            heads = self.heads
+        else:
+            unknown = [name for name in tasks if name not in self.heads]
+            if unknown:
+                raise ValueError(f"Tasks {unknown} are not loaded, available: {self.tasks}")
+            heads = {name: self.heads[name] for name in tasks}
+        outputs, head_times = {}, {}
+        if self.streams is None:
+            for name, head in heads.items():
+                start = time.perf_counter()
+                outputs[name] = head.infer(batch)
+                if self.device.type == "cuda":
+                    torch.cuda.synchronize(self.device)
+                head_times[name] = time.perf_counter() - start
+            return outputs, head_times
+
+        current = torch.cuda.current_stream(self.device)
+        events = {}
+        for name, head in heads.items():
+            stream = self.streams[name]
+            stream.wait_stream(current)
+            batch.record_stream(stream)
+            start, end = torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True)
+            with torch.cuda.stream(stream):
+                start.record(stream)
+                outputs[name] = head.infer(batch)
+                end.record(stream)
+            events[name] = (start, end)
+        for name in heads:
+            current.wait_stream(self.streams[name])
+            # The output was allocated on the head's stream but is consumed on the current one
+            outputs[name].record_stream(current)
+        for name, (start, end) in events.items():
+            end.synchronize()
+            head_times[name] = start.elapsed_time(end) / 1000.0
+        return outputs, head_times
+
+    def __call__(self, img: np.ndarray) -> Dict[str, np.ndarray]:
+        """Maps of all enabled tasks at the image resolution, keyed by task name."""
+        timings = InferenceTimings()
+        with timings.measure("preprocess"):
+            tensor = self.preprocess(img)
+        with timings.measure("inference"):
+            outputs, timings.heads = self.forward(tensor)
+        with timings.measure("postprocess"):
+            maps = {name: self.postprocessors[name](output, img.shape[:2]) for name, output in outputs.items()}
+        self.timings = timings
+        return maps
@@ -1,11 +1,14 @@
 from enum import Enum
 import time
+from typing import Optional
 import cv2
 import numpy as np
 import torch
 import torch.nn.functional as F
 
-from .common import create_preprocessor, TaskType, download_hf_model
+from .common import create_preprocessor, TaskType, InferenceTimings
+from .precision import InferenceOptions, run_model
+from .registry import load_model
 
 
 class SapiensNormalType(Enum):
@@ -38,31 +41,43 @@ def postprocess_normal(results: torch.Tensor, img_shape: tuple[int, int]) -> np.
     return normal_map
 
 
+def postprocess_normal_tensor(results: torch.Tensor, img_shape: tuple[int, int]) -> np.ndarray:
+    """Upsample on the device the results live on; only the float16 (H, W, 3) normal map is copied back."""
+    normal_map = F.interpolate(results[:1].float(), size=img_shape, mode="bilinear")
+    return normal_map[0].permute(1, 2, 0).half().cpu().numpy()
+
+
 class SapiensNormal():
     def __init__(self,
                  type: SapiensNormalType = SapiensNormalType.NORMAL_03B,
                  device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu"),
-                 dtype: torch.dtype = torch.float32):
-        path = download_hf_model(type.value)
-        model = torch.jit.load(path)
-        model = model.eval()
-        self.model = model.to(device).to(dtype)
+                 dtype: torch.dtype = torch.float32,
+                 options: Optional[InferenceOptions] = None):
+        self.options = options or InferenceOptions.from_dtype(dtype)
+        # Shared with every other instance using the same model, device and options
+        self.model = load_model(type, device, self.options)
         self.device = device
-        self.dtype = dtype
+        self.dtype = self.options.dtype
         self.preprocessor = create_preprocessor(input_size=(1024, 768))  # Only these values seem to work well
+        self.timings = None
 
-    def __call__(self, img: np.ndarray) -> np.ndarray:
-        start = time.perf_counter()
-
-        # Model expects BGR, but we change to RGB here because the preprocessor will switch the channels also
-        input = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        tensor = self.preprocessor(input).to(self.device).to(self.dtype)
-
-        with torch.inference_mode():
-            results = self.model(tensor)
+    def infer(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Raw float32 model output for a preprocessed batch."""
+        return run_model(self.model, tensor, self.options)
 
-        normals = postprocess_normal(results, img.shape[:2])
-        print(f"Normal inference took: {time.perf_counter() - start:.4f} seconds")
+    def __call__(self, img: np.ndarray) -> np.ndarray:
+        timings = InferenceTimings()
+        with timings.measure("preprocess"):
+            # Model expects BGR, but we change to RGB here because the preprocessor will switch the channels also
+            input = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            tensor = self.preprocessor(input).to(self.device).to(self.dtype)
+
+        with timings.measure("inference"):
+            results = self.infer(tensor)
+
+        with timings.measure("postprocess"):
+            normals = postprocess_normal(results, img.shape[:2])
+        self.timings = timings
         return normals
 
 
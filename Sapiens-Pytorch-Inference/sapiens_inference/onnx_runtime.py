@@ -0,0 +1,140 @@
+import os
+from typing import Optional
+
+import numpy as np
+import torch
+
+from .common import InferenceTimings, TensorPreprocessor
+from .depth import postprocess_depth
+from .segmentation import postprocess_segmentation
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+
+def create_session(path: str,
+                   device: str = "cpu",
+                   intra_op_threads: int = 0,
+                   inter_op_threads: int = 1,
+                   allow_spinning: bool = True):
+    """
+    InferenceSession with full graph optimizations. intra_op_threads = 0 lets
+    ONNX Runtime use one thread per physical core; turning spinning off
+    keeps idle worker threads from burning CPU next to the decode pool.
+    """
+    if not ONNXRUNTIME_AVAILABLE:
+        raise ImportError("onnxruntime is not installed, install it with: pip install onnxruntime (or onnxruntime-gpu)")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    if not allow_spinning:
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+
+    providers = ["CPUExecutionProvider"]
+    if torch.device(device).type == "cuda":
+        if "CUDAExecutionProvider" not in ort.get_available_providers():
+            raise RuntimeError("onnxruntime was built without CUDA support, install onnxruntime-gpu or use device='cpu'")
+        providers = [("CUDAExecutionProvider", {"device_id": torch.device(device).index or 0})] + providers
+    return ort.InferenceSession(path, sess_options=options, providers=providers)
+
+
+class OnnxModel:
+    """
+    ONNX Runtime session callable like the TorchScript models: float32
+    (N, 3, H, W) torch tensor in, torch tensor out, on the same device.
+    Input and output are bound to torch memory through IO binding, so
+    nothing is copied between torch, numpy and ONNX Runtime. Output buffers
+    are reused per batch size, so a returned tensor is only valid until the
+    next call with the same batch size.
+    """
+
+    def __init__(self, path: str, device: str = "cpu", **session_kwargs):
+        self.device = torch.device(device)
+        self.session = create_session(path, device, **session_kwargs)
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+        self.output_shape = self.session.get_outputs()[0].shape
+        self.dynamic_batch = not isinstance(self.session.get_inputs()[0].shape[0], int)
+        self.binding = self.session.io_binding()
+        self.outputs = {}
+
+    def _output_buffer(self, batch_size: int) -> Optional[torch.Tensor]:
+        dims = self.output_shape[1:]
+        if not all(isinstance(d, int) for d in dims):
+            return None
+        if batch_size not in self.outputs:
+            self.outputs[batch_size] = torch.empty((batch_size, *dims), dtype=torch.float32, device=self.device)
+        return self.outputs[batch_size]
+
+    def _run(self, tensor: torch.Tensor) -> torch.Tensor:
+        tensor = tensor.to(self.device, torch.float32).contiguous()
+        device_type, device_id = self.device.type, self.device.index or 0
+        if device_type == "cuda":
+            # ONNX Runtime runs on its own stream; the input has to be ready
+            torch.cuda.synchronize(self.device)
+        self.binding.bind_input(self.input_name, device_type, device_id, np.float32, tuple(tensor.shape), tensor.data_ptr())
+        output = self._output_buffer(tensor.shape[0])
+        if output is not None:
+            self.binding.bind_output(self.output_name, device_type, device_id, np.float32, tuple(output.shape), output.data_ptr())
+        else:
+            self.binding.bind_output(self.output_name, device_type, device_id)
+        self.session.run_with_iobinding(self.binding)
+        self.binding.synchronize_outputs()
+        if output is None:
+            output = torch.from_numpy(self.binding.copy_outputs_to_cpu()[0]).to(self.device)
+        return output
+
+    def __call__(self, tensor: torch.Tensor) -> torch.Tensor:
+        if self.dynamic_batch or tensor.shape[0] == 1:
+            return self._run(tensor)
+        # Models exported without a dynamic batch axis take one image at a time. _run returns the
+        # same reused buffer for every image, so each result is copied into its slice right away
+        first = self._run(tensor[:1])
+        output = torch.empty((tensor.shape[0], *first.shape[1:]), dtype=first.dtype, device=first.device)
+        output[:1] = first
+        for i in range(1, tensor.shape[0]):
+            output[i:i + 1] = self._run(tensor[i:i + 1])
+        return output
+
+
+class _SapiensOnnx:
+    postprocess = None
+
+    def __init__(self, path: str, device: str = "cpu", **session_kwargs):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX model {path} not found, export it first with onnx_export.py")
+        self.device = torch.device(device)
+        self.dtype = torch.float32
+        self.model = OnnxModel(path, device, **session_kwargs)
+        self.preprocessor = TensorPreprocessor(input_size=(1024, 768), device=self.device)
+        self.timings = None
+
+    def infer(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Raw float32 model output for a preprocessed batch."""
+        return self.model(tensor)
+
+    def __call__(self, img: np.ndarray) -> np.ndarray:
+        timings = InferenceTimings()
+        with timings.measure("preprocess"):
+            tensor = self.preprocessor(img)
+        with timings.measure("inference"):
+            results = self.infer(tensor)
+        with timings.measure("postprocess"):
+            output = self.postprocess(results, img.shape[:2])
+        self.timings = timings
+        return output
+
+
+class SapiensSegmentationOnnx(_SapiensOnnx):
+    """ONNX Runtime counterpart of SapiensSegmentation with the same __call__(img) -> np.ndarray."""
+    postprocess = staticmethod(postprocess_segmentation)
+
+
+class SapiensDepthOnnx(_SapiensOnnx):
+    """ONNX Runtime counterpart of SapiensDepth with the same __call__(img) -> np.ndarray."""
+    postprocess = staticmethod(postprocess_depth)
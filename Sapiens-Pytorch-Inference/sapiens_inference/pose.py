@@ -1,12 +1,13 @@
 import time
 from enum import Enum
-from typing import List
+from typing import List, Optional
 import cv2
 import numpy as np
 import torch
-import torch.nn.functional as F
 
-from .common import pose_estimation_preprocessor, TaskType, download_hf_model
+from .common import InferenceTimings, TensorPreprocessor
+from .precision import InferenceOptions, run_model
+from .registry import load_model
 from .detector import Detector, DetectorConfig
 
 from .pose_classes_and_palettes import (
@@ -24,81 +25,142 @@ class SapiensPoseEstimationType(Enum):
     POSE_ESTIMATION_1B = "sapiens-pose-1b-torchscript/sapiens_1b_goliath_best_goliath_AP_640_torchscript.pt2"
     
 
+def decode_heatmaps(heatmaps: torch.Tensor) -> (torch.Tensor, torch.Tensor):
+    """
+    Keypoints of a (N, K, H, W) heatmap batch on its device: argmax of every
+    heatmap, refined by a quarter pixel towards the higher neighbour along x
+    and y. Returns (N, K, 2) x/y in heatmap pixels and (N, K) confidences.
+    """
+    n, k, h, w = heatmaps.shape
+    flat = heatmaps.float().flatten(2)
+    conf, index = flat.max(dim=2)
+    x, y = index % w, torch.div(index, w, rounding_mode="floor")
+
+    def gradient(step, interior):
+        after = flat.gather(2, (index + step).clamp(0, h * w - 1).unsqueeze(2)).squeeze(2)
+        before = flat.gather(2, (index - step).clamp(0, h * w - 1).unsqueeze(2)).squeeze(2)
+        # No refinement on the border, where one neighbour is missing
+        return torch.where(interior, after - before, torch.zeros_like(conf))
+
+    dx = gradient(1, (x > 0) & (x < w - 1))
+    dy = gradient(w, (y > 0) & (y < h - 1))
+    coords = torch.stack([x.float() + 0.25 * torch.sign(dx), y.float() + 0.25 * torch.sign(dy)], dim=2)
+    return coords, conf
+
+
 class SapiensPoseEstimation:
     def __init__(self,
                  type: SapiensPoseEstimationType = SapiensPoseEstimationType.POSE_ESTIMATION_03B,
                  device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu"),
-                 dtype: torch.dtype = torch.float32):
+                 dtype: torch.dtype = torch.float32,
+                 options: Optional[InferenceOptions] = None,
+                 max_batch_size: int = 16):
         # Load the model
-        self.device = device
-        self.dtype = dtype
-        path = download_hf_model(type.value)
-        self.model = torch.jit.load(path).eval().to(device).to(dtype)
-        self.preprocessor = pose_estimation_preprocessor(input_size=(1024, 768))
+        self.options = options or InferenceOptions.from_dtype(dtype)
+        self.device = torch.device(device)
+        self.dtype = self.options.dtype
+        self.model = load_model(type, device, self.options)
+        self.preprocessor = TensorPreprocessor(input_size=(1024, 768), device=self.device, dtype=self.dtype)
+        # Persons per forward, bounds the memory of crowded images
+        self.max_batch_size = max_batch_size
+        self.timings = None
 
         # Initialize the YOLO-based detector
         self.detector = Detector()
 
-
-
-    def __call__(self, img: np.ndarray) -> np.ndarray:
-        start = time.perf_counter()
+    def __call__(self, img: np.ndarray, draw: bool = True) -> (Optional[np.ndarray], List[dict]):
+        timings = InferenceTimings()
 
         # Detect persons in the image
-        bboxes = self.detector.detect(img)
+        with timings.measure("detection"):
+            bboxes = self.detector.detect(img)
 
         # Process the image and estimate the pose
-        pose_result_image, keypoints = self.estimate_pose(img, bboxes)
+        keypoints = self.estimate_pose(img, bboxes, timings)
+        pose_result_image = None
+        if draw:
+            with timings.measure("draw"):
+                pose_result_image = self.draw_poses(img, keypoints, bboxes)
 
-        print(f"Pose estimation inference took: {time.perf_counter() - start:.4f} seconds")
+        self.timings = timings
         return pose_result_image, keypoints
 
+    def preprocess_crops(self, img: np.ndarray, bboxes: List[List[float]]) -> torch.Tensor:
+        """
+        Uploads the image once and crops, resizes and normalizes all persons
+        on the device into one (N, 3, 1024, 768) batch.
+        """
+        image = self.preprocessor.upload(img)
+        return self.preprocessor([image[y1:y2, x1:x2] for x1, y1, x2, y2 in self.crop_boxes(img, bboxes)])
 
-    @torch.inference_mode()
-    def estimate_pose(self, img: np.ndarray, bboxes: List[List[float]]) -> (np.ndarray, List[dict]):
-        all_keypoints = []
-        result_img = img.copy()
+    def infer(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Raw heatmaps for a batch of preprocessed crops, at most max_batch_size per forward."""
+        return torch.cat([run_model(self.model, tensor[i:i + self.max_batch_size], self.options)
+                          for i in range(0, tensor.shape[0], self.max_batch_size)])
 
+    @torch.inference_mode()
+    def estimate_pose(self, img: np.ndarray, bboxes: List[List[float]],
+                      timings: Optional[InferenceTimings] = None) -> List[dict]:
+        """Keypoints of every person box, as heatmap coordinates like heatmaps_to_keypoints."""
+        timings = timings or InferenceTimings()
+        if len(bboxes) == 0:
+            return []
+        with timings.measure("preprocess"):
+            tensor = self.preprocess_crops(img, bboxes)
+        with timings.measure("inference"):
+            heatmaps = self.infer(tensor)
+        with timings.measure("postprocess"):
+            coords, conf = decode_heatmaps(heatmaps)
+            # One transfer for all persons
+            values = torch.cat([coords, conf.unsqueeze(2)], dim=2).cpu().numpy()
+            names = GOLIATH_KEYPOINTS[:values.shape[1]]
+            all_keypoints = [{name: tuple(float(v) for v in person[i]) for i, name in enumerate(names)}
+                             for person in values]
+        return all_keypoints
+
+    def crop_boxes(self, img: np.ndarray, bboxes: List[List[float]]) -> List[tuple]:
+        """Integer boxes clipped to the image, at least one pixel in size."""
+        h, w = img.shape[:2]
+        boxes = []
         for bbox in bboxes:
-            cropped_img = self.crop_image(img, bbox)
-            tensor = self.preprocessor(cropped_img).unsqueeze(0).to(self.device).to(self.dtype)
-
-            heatmaps = self.model(tensor)
-            keypoints = self.heatmaps_to_keypoints(heatmaps[0].cpu().numpy())
-            all_keypoints.append(keypoints)
-
-            # Draw the keypoints on the original image
-            result_img = self.draw_keypoints(result_img, keypoints, bbox)
-
-        return result_img, all_keypoints
+            x1, y1, x2, y2 = map(int, bbox[:4])
+            x1, y1 = min(max(x1, 0), w - 1), min(max(y1, 0), h - 1)
+            boxes.append((x1, y1, max(min(x2, w), x1 + 1), max(min(y2, h), y1 + 1)))
+        return boxes
 
     def crop_image(self, img: np.ndarray, bbox: List[float]) -> np.ndarray:
         x1, y1, x2, y2 = map(int, bbox[:4])
         return img[y1:y2, x1:x2]
 
-
     def heatmaps_to_keypoints(self, heatmaps: np.ndarray) -> dict:
-        keypoints = {}
-        for i, name in enumerate(GOLIATH_KEYPOINTS):
-            if i < heatmaps.shape[0]:
-                y, x = np.unravel_index(np.argmax(heatmaps[i]), heatmaps[i].shape)
-                conf = heatmaps[i, y, x]
-                keypoints[name] = (float(x), float(y), float(conf))
-        return keypoints
-
-
+        """Single-person decoding on the CPU, kept for (K, H, W) numpy heatmaps."""
+        coords, conf = decode_heatmaps(torch.from_numpy(np.ascontiguousarray(heatmaps))[None])
+        names = GOLIATH_KEYPOINTS[:heatmaps.shape[0]]
+        return {name: (float(coords[0, i, 0]), float(coords[0, i, 1]), float(conf[0, i]))
+                for i, name in enumerate(names)}
+
+    def draw_poses(self, img: np.ndarray, all_keypoints: List[dict], bboxes: List[List[float]]) -> np.ndarray:
+        """Draws all persons onto one copy of the image."""
+        result_img = img.copy()
+        for keypoints, bbox in zip(all_keypoints, bboxes):
+            self._draw_keypoints(result_img, keypoints, bbox)
+        return result_img
 
     def draw_keypoints(self, img: np.ndarray, keypoints: dict, bbox: List[float]) -> np.ndarray:
+        img_copy = img.copy()
+        self._draw_keypoints(img_copy, keypoints, bbox)
+        return img_copy
+
+    def _draw_keypoints(self, img: np.ndarray, keypoints: dict, bbox: List[float]):
         x1, y1, x2, y2 = map(int, bbox[:4])
         bbox_width, bbox_height = x2 - x1, y2 - y1
-        img_copy = img.copy()
 
-        # Draw keypoints on t1Bhe image
+        # Draw keypoints on the image
         for i, (name, (x, y, conf)) in enumerate(keypoints.items()):
             if conf > 0.3:  # Only draw confident keypoints
                 x_coord = int(x * bbox_width / 192) + x1
                 y_coord = int(y * bbox_height / 256) + y1
-                cv2.circle(img_copy, (x_coord, y_coord), 3, GOLIATH_KPTS_COLORS[i], -1)
+                cv2.circle(img, (x_coord, y_coord), 3, GOLIATH_KPTS_COLORS[i], -1)
 
         # Optionally draw skeleton
         for _, link_info in GOLIATH_SKELETON_INFO.items():
@@ -111,11 +173,7 @@ class SapiensPoseEstimation:
                     y1_coord = int(pt1[1] * bbox_height / 256) + y1
                     x2_coord = int(pt2[0] * bbox_width / 192) + x1
                     y2_coord = int(pt2[1] * bbox_height / 256) + y1
-                    cv2.line(img_copy, (x1_coord, y1_coord), (x2_coord, y2_coord), GOLIATH_KPTS_COLORS[i], 2)
-
-        return img_copy
-
-
+                    cv2.line(img, (x1_coord, y1_coord), (x2_coord, y2_coord), link_info['color'], 2)
 
 
 if __name__ == "__main__":
@@ -130,7 +188,7 @@ if __name__ == "__main__":
 
     start = time.perf_counter()
     result_img, keypoints = estimator(img)
-    
+    print(estimator.timings)
     print(f"Time taken: {time.perf_counter() - start:.4f} seconds")
 
     
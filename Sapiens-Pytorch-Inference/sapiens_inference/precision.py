@@ -0,0 +1,114 @@
+import warnings
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import torch
+
+# Weights cast to the dtype, or kept in float32 and run under autocast
+PRECISIONS = {
+    "fp32": (torch.float32, None),
+    "fp16": (torch.float16, None),
+    "bf16": (torch.bfloat16, None),
+    "autocast-fp16": (torch.float32, torch.float16),
+    "autocast-bf16": (torch.float32, torch.bfloat16),
+}
+
+COMPILE_MODES = ["none", "freeze", "torch_compile"]
+
+
+@dataclass
+class InferenceOptions:
+    precision: str = "fp32"
+    channels_last: bool = False
+    compile: str = "none"  # "freeze" for TorchScript models, "torch_compile" for eager nn.Modules
+    cache_converted: bool = False  # Keep fp16/bf16 copies of the checkpoints on disk for faster cold starts
+
+    def __post_init__(self):
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {self.precision}, expected one of {list(PRECISIONS)}")
+        if self.compile not in COMPILE_MODES:
+            raise ValueError(f"Unknown compile mode {self.compile}, expected one of {COMPILE_MODES}")
+
+    @classmethod
+    def from_dtype(cls, dtype: torch.dtype, **kwargs):
+        names = {torch.float32: "fp32", torch.float16: "fp16", torch.bfloat16: "bf16"}
+        return cls(precision=names[dtype], **kwargs)
+
+    @property
+    def dtype(self) -> torch.dtype:
+        """dtype of the weights and of the model input."""
+        return PRECISIONS[self.precision][0]
+
+    @property
+    def autocast_dtype(self) -> Optional[torch.dtype]:
+        return PRECISIONS[self.precision][1]
+
+    def __str__(self):
+        parts = [self.precision]
+        if self.channels_last:
+            parts.append("channels_last")
+        if self.compile != "none":
+            parts.append(self.compile)
+        return "+".join(parts)
+
+
+def prepare_model(model, device: torch.device, options: InferenceOptions):
+    """Moves a loaded model to the device and applies dtype, memory format and compilation."""
+    model = model.eval().to(device).to(options.dtype)
+    if options.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if options.compile == "freeze":
+        if isinstance(model, torch.jit.ScriptModule):
+            model = torch.jit.optimize_for_inference(torch.jit.freeze(model))
+        else:
+            warnings.warn("Freezing needs a TorchScript model, running it unfrozen")
+    elif options.compile == "torch_compile":
+        if isinstance(model, torch.jit.ScriptModule):
+            warnings.warn("torch.compile can not trace TorchScript models, use compile='freeze' instead")
+        else:
+            model = torch.compile(model)
+    return model
+
+
+@torch.inference_mode()
+def run_model(model, tensor: torch.Tensor, options: InferenceOptions) -> torch.Tensor:
+    """Forward in the configured precision; the output is always float32."""
+    tensor = tensor.to(options.dtype)
+    if options.channels_last:
+        tensor = tensor.contiguous(memory_format=torch.channels_last)
+    if options.autocast_dtype is not None:
+        with torch.autocast(device_type=tensor.device.type, dtype=options.autocast_dtype):
+            output = model(tensor)
+    else:
+        output = model(tensor)
+    return output.float()
+
+
+def compare_maps(reference: dict, maps: dict) -> dict:
+    """
+    Accuracy of one prediction against the float32 reference: fraction of
+    equal segmentation labels, and the largest and mean absolute error of
+    depth (after the min-max normalization the pipeline uses) and normals.
+    """
+    metrics = {}
+    if "seg" in reference:
+        metrics["seg_agreement"] = float((np.asarray(reference["seg"]) == np.asarray(maps["seg"])).mean())
+    if "depth" in reference:
+        def normalize(depth):
+            depth = np.asarray(depth, dtype=np.float32)
+            return (depth - np.nanmin(depth)) / (np.nanmax(depth) - np.nanmin(depth) + 1e-8)
+        error = np.abs(normalize(reference["depth"]) - normalize(maps["depth"]))
+        metrics["depth_max_error"], metrics["depth_mean_error"] = float(np.nanmax(error)), float(np.nanmean(error))
+    if "normal" in reference:
+        error = np.abs(np.asarray(reference["normal"], dtype=np.float32) - np.asarray(maps["normal"], dtype=np.float32))
+        metrics["normal_max_error"], metrics["normal_mean_error"] = float(error.max()), float(error.mean())
+    return metrics
+
+
+def passes_guard(metrics: dict, min_seg_agreement: float = 0.99, max_depth_error: float = 0.02,
+                 max_normal_error: float = 0.05) -> bool:
+    """Accuracy guard for a reduced-precision mode; mean errors are checked, the maxima are informative."""
+    return (metrics.get("seg_agreement", 1.0) >= min_seg_agreement
+            and metrics.get("depth_mean_error", 0.0) <= max_depth_error
+            and metrics.get("normal_mean_error", 0.0) <= max_normal_error)
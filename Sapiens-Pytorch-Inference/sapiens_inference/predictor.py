@@ -4,11 +4,14 @@ import cv2
 import numpy as np
 import torch
 
-from .depth import SapiensDepth, SapiensDepthType, draw_depth_map
-from .segmentation import SapiensSegmentation, SapiensSegmentationType, draw_segmentation_map
-from .normal import SapiensNormal, SapiensNormalType, draw_normal_map
+from .depth import SapiensDepthType, draw_depth_map
+from .segmentation import SapiensSegmentationType, draw_segmentation_map
+from .normal import SapiensNormalType, draw_normal_map
+from .multitask import SapiensMultiTask
 from .detector import Detector, DetectorConfig
+from .precision import InferenceOptions
 from dataclasses import field
+from typing import Optional
 
 
 @dataclass
@@ -20,6 +23,7 @@ class SapiensConfig:
     depth_type: SapiensDepthType = SapiensDepthType.OFF
     detector_config: DetectorConfig = field(default_factory=DetectorConfig)
     minimum_person_height: int = 0.5  # 50% of the image height
+    inference_options: Optional[InferenceOptions] = None  # Overrides dtype: precision, channels_last, compile
 
     def __str__(self):
         return f"SapiensConfig(dtype={self.dtype}\n" \
@@ -28,7 +32,8 @@ class SapiensConfig:
                f"normal_type={self.normal_type}\n" \
                f"depth_type={self.depth_type}\n" \
                f"detector_config={self.detector_config}\n" \
-               f"minimum_person_height={self.minimum_person_height * 100}% of the image height"
+               f"minimum_person_height={self.minimum_person_height * 100}% of the image height\n" \
+               f"inference_options={self.inference_options})"
 
 
 def filter_small_boxes(boxes: np.ndarray, img_height: int, height_thres: float = 0.1) -> np.ndarray:
@@ -60,10 +65,9 @@ class SapiensPredictor:
         self.has_depth = config.depth_type != SapiensDepthType.OFF
         self.minimum_person_height = config.minimum_person_height
 
-        self.normal_predictor = SapiensNormal(config.normal_type, config.device,
-                                              config.dtype) if self.has_normal else None
-        self.segmentation_predictor = SapiensSegmentation(config.segmentation_type, config.device, config.dtype)
-        self.depth_predictor = SapiensDepth(config.depth_type, config.device, config.dtype) if self.has_depth else None
+        # One preprocessing pass per crop shared by segmentation, normal and depth
+        self.runner = SapiensMultiTask.from_config(config)
+        self.timings = []
         self.detector = None  #Detector(config.detector_config) #TODO: Cropping seems to make the results worse
 
     def __call__(self, img: np.ndarray) -> np.ndarray:
@@ -88,15 +92,18 @@ class SapiensPredictor:
         normal_maps = []
         segmentation_maps = []
         depth_maps = []
+        self.timings = []
 
         for box in person_boxes:
             crop = img[box[1]:box[3], box[0]:box[2]]
 
-            segmentation_maps.append(self.segmentation_predictor(crop))
+            maps = self.runner(crop)
+            self.timings.append(self.runner.timings)
+            segmentation_maps.append(maps["seg"])
             if self.has_normal:
-                normal_maps.append(self.normal_predictor(crop))
+                normal_maps.append(maps["normal"])
             if self.has_depth:
-                depth_maps.append(self.depth_predictor(crop))
+                depth_maps.append(maps["depth"])
 
         return self.draw_maps(img, person_boxes, normal_maps, segmentation_maps, depth_maps)
 
@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from enum import Enum
+from typing import Optional, Union
+
+import torch
+
+from .precision import InferenceOptions, prepare_model
+
+MODEL_DIR_ENV = "SAPIENS_MODEL_DIR"
+OFFLINE_ENV = "SAPIENS_OFFLINE"
+# <repo>/Sapiens-Pytorch-Inference/models, where the relative 'models' path used to point to
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+REGISTRY_FILE = "registry.json"
+
+
+def default_model_dir() -> str:
+    return os.path.abspath(os.environ.get(MODEL_DIR_ENV, DEFAULT_MODEL_DIR))
+
+
+def is_offline() -> bool:
+    return any(os.environ.get(name, "").lower() in ("1", "true", "yes") for name in (OFFLINE_ENV, "HF_HUB_OFFLINE"))
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 23) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _model_name(model: Union[str, Enum]) -> str:
+    return model.value if isinstance(model, Enum) else model
+
+
+def _expected_sha256(url: str) -> Optional[str]:
+    """sha256 of an LFS file on the Hugging Face Hub (its etag), None if the Hub does not tell."""
+    try:
+        from huggingface_hub import get_hf_file_metadata
+        etag = (get_hf_file_metadata(url).etag or "").strip('"')
+    except Exception:
+        return None
+    return etag if re.fullmatch(r"[0-9a-f]{64}", etag) else None
+
+
+class ModelRegistry:
+    """
+    Checkpoints in an absolute cache directory, indexed in registry.json with
+    their sha256, size and modification time. A file is hashed when it is
+    downloaded or added; later lookups only compare size and mtime and
+    re-hash a file that changed (or on verify(full=True)). Offline, only
+    files already in the directory are used.
+    """
+
+    def __init__(self, root: Optional[str] = None, offline: Optional[bool] = None):
+        self.root = os.path.abspath(root) if root else default_model_dir()
+        self.offline = is_offline() if offline is None else offline
+        self.lock = threading.Lock()
+        self.entries = {}
+        index = os.path.join(self.root, REGISTRY_FILE)
+        if os.path.exists(index):
+            with open(index) as f:
+                self.entries = json.load(f)
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, REGISTRY_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, os.path.join(self.root, REGISTRY_FILE))
+
+    def path(self, model: Union[str, Enum]) -> str:
+        return os.path.join(self.root, os.path.basename(_model_name(model)))
+
+    def _record(self, filename: str, sha256: str, source: str):
+        stat = os.stat(os.path.join(self.root, filename))
+        self.entries[filename] = {"sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime, "source": source}
+        self._save()
+
+    def resolve(self, model: Union[str, Enum], verify: bool = False) -> str:
+        """Absolute path of a checked checkpoint, downloaded first unless offline."""
+        path = self.path(model)
+        with self.lock:
+            if not os.path.exists(path):
+                if self.offline:
+                    raise FileNotFoundError(
+                        f"{os.path.basename(path)} is not in {self.root} and downloads are disabled "
+                        f"({OFFLINE_ENV}/HF_HUB_OFFLINE). Copy it there or register it with "
+                        f"'python -m sapiens_inference.registry add {_model_name(model)} <file>'")
+                self._download(_model_name(model), path)
+            self._verify(path, full=verify)
+        return path
+
+    def _download(self, model_name: str, path: str):
+        from huggingface_hub import hf_hub_url
+        from .common import download
+
+        repo_name, filename = model_name.split("/")
+        url = hf_hub_url(repo_id=f"facebook/{repo_name}", filename=filename)
+        print(f"Model {filename} not found, downloading from Hugging Face Hub...")
+        os.makedirs(self.root, exist_ok=True)
+        partial = path + ".part"
+        download(url, partial)
+        sha256 = sha256_file(partial)
+        expected = _expected_sha256(url)
+        if expected is not None and expected != sha256:
+            os.remove(partial)
+            raise ValueError(f"Checksum mismatch for {filename}: expected {expected}, got {sha256}")
+        os.replace(partial, path)
+        self._record(filename, sha256, url)
+        print("Model downloaded successfully to", path)
+
+    def _verify(self, path: str, full: bool = False):
+        filename = os.path.basename(path)
+        entry = self.entries.get(filename)
+        stat = os.stat(path)
+        if entry is None:
+            # Placed by hand or by an older version: trust it once and remember its hash
+            self._record(filename, sha256_file(path), "local")
+            return
+        if full or stat.st_size != entry["size"] or stat.st_mtime != entry["mtime"]:
+            sha256 = sha256_file(path)
+            if sha256 != entry["sha256"]:
+                raise ValueError(f"Checksum mismatch for {path}: registry has {entry['sha256']}, file has {sha256}")
+            self._record(filename, sha256, entry["source"])
+
+    def verify(self, model: Union[str, Enum], full: bool = True):
+        with self.lock:
+            self._verify(self.path(model), full=full)
+
+    def add(self, model: Union[str, Enum], source_path: str, sha256: Optional[str] = None) -> str:
+        """Copies a local checkpoint into the cache, e.g. to provision an offline machine."""
+        path = self.path(model)
+        actual = sha256_file(source_path)
+        if sha256 is not None and sha256 != actual:
+            raise ValueError(f"Checksum mismatch for {source_path}: expected {sha256}, got {actual}")
+        with self.lock:
+            os.makedirs(self.root, exist_ok=True)
+            if os.path.abspath(source_path) != path:
+                shutil.copyfile(source_path, path)
+            self._record(os.path.basename(path), actual, os.path.abspath(source_path))
+        return path
+
+    def converted_path(self, model: Union[str, Enum], precision: str) -> str:
+        root, ext = os.path.splitext(self.path(model))
+        return f"{root}.{precision}{ext}"
+
+
+_registry = None
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None or _registry.root != default_model_dir():
+        _registry = ModelRegistry()
+    return _registry
+
+
+def load_model(model: Union[str, Enum], device: Union[str, torch.device], options: Optional[InferenceOptions] = None,
+               registry: Optional[ModelRegistry] = None):
+    """
+    TorchScript model ready for inference, shared process-wide per (model,
+    device, options). With options.cache_converted, fp16/bf16 weights are
+    stored next to the checkpoint once and loaded directly on later cold starts.
+    """
+    options = options or InferenceOptions()
+    device = torch.device(device)
+    key = (_model_name(model), str(device), str(options))
+    with _model_cache_lock:
+        if key in _model_cache:
+            return _model_cache[key]
+
+        registry = registry or get_registry()
+        path = registry.resolve(model)
+        converted = registry.converted_path(model, options.precision)
+        if options.dtype != torch.float32 and os.path.exists(converted):
+            registry.verify(converted, full=False)
+            base = torch.jit.load(converted, map_location="cpu")
+        else:
+            base = torch.jit.load(path, map_location="cpu")
+            if options.cache_converted and options.dtype != torch.float32:
+                base = base.eval().to(options.dtype)
+                torch.jit.save(base, converted)
+                registry.add(converted, converted)
+        model = prepare_model(base, device, options)
+        _model_cache[key] = model
+        return model
+
+
+def clear_model_cache():
+    with _model_cache_lock:
+        _model_cache.clear()
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Manage the local Sapiens model cache")
+    parser.add_argument("--model_dir", default=None, help=f"Cache directory (default: ${MODEL_DIR_ENV} or {DEFAULT_MODEL_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="Show registered checkpoints")
+    verify = sub.add_parser("verify", help="Re-hash all registered checkpoints")
+    verify.add_argument("names", nargs="*")
+    add = sub.add_parser("add", help="Copy a local checkpoint into the cache")
+    add.add_argument("name", help="Model name as in the type enums, e.g. sapiens-seg-1b-torchscript/<file>.pt2")
+    add.add_argument("path")
+    add.add_argument("--sha256", default=None)
+    download = sub.add_parser("download", help="Fetch checkpoints for later offline use")
+    download.add_argument("names", nargs="+")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    registry = ModelRegistry(args.model_dir)
+    if args.command == "list":
+        for filename, entry in sorted(registry.entries.items()):
+            print(f"{filename:<90} {entry['size'] / 2 ** 30:6.2f} GB  {entry['sha256'][:12]}  {entry['source']}")
+    elif args.command == "verify":
+        for name in args.names or sorted(registry.entries):
+            registry.verify(name, full=True)
+            print(f"ok  {name}")
+    elif args.command == "add":
+        print(registry.add(args.name, args.path, args.sha256))
+    elif args.command == "download":
+        for name in args.names:
+            print(registry.resolve(name))
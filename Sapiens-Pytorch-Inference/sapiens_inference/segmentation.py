@@ -1,4 +1,5 @@
 import time
+from typing import Optional
 from enum import Enum
 
 import cv2
@@ -6,7 +7,9 @@ import numpy as np
 import torch
 import torch.nn.functional as F
 
-from .common import create_preprocessor, TaskType, download_hf_model
+from .common import create_preprocessor, TaskType, InferenceTimings
+from .precision import InferenceOptions, run_model
+from .registry import load_model
 
 
 class SapiensSegmentationType(Enum):
@@ -51,31 +54,43 @@ def postprocess_segmentation(results: torch.Tensor, img_shape: tuple[int, int])
     return segmentation_map
 
 
+def postprocess_segmentation_tensor(results: torch.Tensor, img_shape: tuple[int, int]) -> np.ndarray:
+    """Upsample and argmax on the device the results live on; only the uint8 class map is copied back."""
+    logits = F.interpolate(results[:1].float(), size=img_shape, mode="bilinear")
+    return logits[0].argmax(dim=0).to(torch.uint8).cpu().numpy()
+
+
 class SapiensSegmentation():
     def __init__(self,
                  type: SapiensSegmentationType = SapiensSegmentationType.SEGMENTATION_1B,
                  device: torch.device = torch.device("cuda" if torch.cuda.is_available() else "cpu"),
-                 dtype: torch.dtype = torch.float32):
-        path = download_hf_model(type.value)
-        model = torch.jit.load(path)
-        model = model.eval()
-        self.model = model.to(device).to(dtype)
+                 dtype: torch.dtype = torch.float32,
+                 options: Optional[InferenceOptions] = None):
+        self.options = options or InferenceOptions.from_dtype(dtype)
+        # Shared with every other instance using the same model, device and options
+        self.model = load_model(type, device, self.options)
         self.device = device
-        self.dtype = dtype
+        self.dtype = self.options.dtype
         self.preprocessor = create_preprocessor(input_size=(1024, 768))  # Only these values seem to work well
+        self.timings = None
 
-    def __call__(self, img: np.ndarray) -> np.ndarray:
-        start = time.perf_counter()
-
-        # Model expects BGR, but we change to RGB here because the preprocessor will switch the channels also
-        input = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        tensor = self.preprocessor(input).to(self.device).to(self.dtype)
-
-        with torch.inference_mode():
-            results = self.model(tensor)
-        segmentation_map = postprocess_segmentation(results, img.shape[:2])
+    def infer(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Raw float32 model output for a preprocessed batch."""
+        return run_model(self.model, tensor, self.options)
 
-        print(f"Segmentation inference took: {time.perf_counter() - start:.4f} seconds")
+    def __call__(self, img: np.ndarray) -> np.ndarray:
+        timings = InferenceTimings()
+        with timings.measure("preprocess"):
+            # Model expects BGR, but we change to RGB here because the preprocessor will switch the channels also
+            input = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            tensor = self.preprocessor(input).to(self.device).to(self.dtype)
+
+        with timings.measure("inference"):
+            results = self.infer(tensor)
+
+        with timings.measure("postprocess"):
+            segmentation_map = postprocess_segmentation(results, img.shape[:2])
+        self.timings = timings
         return segmentation_map
 
 
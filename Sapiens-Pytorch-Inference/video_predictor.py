@@ -24,6 +24,8 @@ while True:
         break
 
     results = predictor(frame)
+    for timings in predictor.timings:
+        print(timings)
 
     cv2.imshow("Predicted Map", results)
     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -18,6 +18,8 @@ while True:
         break
 
     results = predictor(frame)
+    for timings in predictor.timings:
+        print(timings)
 
     cv2.imshow("Normal Map", results)
     if cv2.waitKey(1) & 0xFF == ord('q'):
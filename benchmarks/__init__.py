@@ -0,0 +1,8 @@
+"""
+Benchmarks for the Gaussian splatting hot paths on synthetic models.
+
+Run from the repository root:
+
+    python -m benchmarks --device cpu --preset small
+    python -m benchmarks --device cuda --preset large --update_baseline
+"""
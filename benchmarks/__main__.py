@@ -0,0 +1,62 @@
+import sys
+from argparse import ArgumentParser
+
+import torch
+
+from benchmarks.cases import BENCHMARKS
+from benchmarks.runner import SIZES, run_benchmarks, environment_info, append_history, load_baseline, save_baseline, compare_to_baseline
+
+
+def main():
+    parser = ArgumentParser(description="Benchmarks for the Gaussian splatting hot paths")
+    parser.add_argument("--device", choices=["cpu", "cuda"], default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--preset", choices=list(SIZES["points"]), default="small",
+                        help="Problem sizes: small (CI), medium, large (up to 5M splats, SH 0-4, 2048px)")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None,
+                        help="Run only these benchmarks")
+    parser.add_argument("--max_points", type=int, default=None,
+                        help="Skip cases with more splats than this")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--history", type=str, default="benchmarks/history.json",
+                        help="JSON file every run is appended to")
+    parser.add_argument("--baseline", type=str, default="benchmarks/baseline_{device}.json",
+                        help="Stored baseline to compare against")
+    parser.add_argument("--update_baseline", action="store_true",
+                        help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative slowdown that counts as a regression")
+    parser.add_argument("--fail_on_regression", action="store_true",
+                        help="Exit with status 1 if a regression is found")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    print("Running {} benchmarks on {}".format(args.preset, args.device))
+    results = run_benchmarks(args.only, args.device, args.preset, args.warmup, args.repeat, args.max_points)
+
+    entry = environment_info(args.device)
+    entry["preset"] = args.preset
+    entry["results"] = results
+    append_history(args.history, entry)
+
+    baseline_path = args.baseline.format(device=args.device)
+    baseline = load_baseline(baseline_path)
+    regressions = []
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        print("\nCompared against baseline {} ({})".format(baseline_path, baseline.get("commit", "")))
+        for key, base_ms, cur_ms, ratio in regressions:
+            print("  REGRESSION {:<60} {:>10.3f} -> {:>10.3f} ms ({:+.1f}%)".format(key, base_ms, cur_ms, 100.0 * (ratio - 1.0)))
+        if not regressions:
+            print("  no regressions above {:.0f}%".format(100.0 * args.tolerance))
+
+    if args.update_baseline:
+        save_baseline(baseline_path, entry)
+        print("Baseline written to {}".format(baseline_path))
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+import torch
+
+from benchmarks.synthetic import make_gaussians, make_cameras, make_image_files
+from utils.sh_utils import eval_sh
+from utils.loss_utils import ssim
+from utils.general_utils import PILtoTorch
+from utils.graphics_utils import getWorld2View2, getProjectionMatrix
+
+# Each case is setup(params, device) -> (run, mode[, prepare]); run is what gets
+# timed. If prepare is given it is called untimed before every repeat and its
+# result is passed to run.
+# Cases that need a CUDA extension time the equivalent pure PyTorch work in
+# CPU mode (marked with "mode": "python" in the results) so that every
+# benchmark also runs on GPU-less CI.
+
+BENCHMARKS = {}
+
+
+def benchmark(name, axes):
+    def register(fn):
+        BENCHMARKS[name] = SimpleNamespace(name=name, setup=fn, axes=axes)
+        return fn
+    return register
+
+
+def rasterizer_available(device):
+    if device != "cuda":
+        return False
+    try:
+        import diff_gaussian_rasterization
+        return True
+    except ImportError:
+        return False
+
+
+def pipeline_params(convert_SHs_python=False, compute_cov3D_python=False):
+    return SimpleNamespace(convert_SHs_python=convert_SHs_python, compute_cov3D_python=compute_cov3D_python,
+                           debug=False, antialiasing=False)
+
+
+def python_preprocess(pc, camera):
+    """The per-Gaussian work render() does in PyTorch before rasterization."""
+    opacity = pc.get_opacity
+    cov3D = pc.get_covariance(1.0)
+    shs_view = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree + 1) ** 2)
+    dir_pp = pc.get_xyz - camera.camera_center.repeat(pc.get_features.shape[0], 1)
+    dir_pp_normalized = dir_pp / dir_pp.norm(dim=1, keepdim=True)
+    colors = torch.clamp_min(eval_sh(pc.active_sh_degree, shs_view, dir_pp_normalized) + 0.5, 0.0)
+    return opacity, cov3D, colors
+
+
+@benchmark("render", axes=("points", "sh_degree", "resolution"))
+def setup_render(params, device):
+    gaussians = make_gaussians(params["points"], params["sh_degree"], device)
+    camera = make_cameras(1, params["resolution"], device=device)[0]
+    if rasterizer_available(device):
+        from gaussian_renderer import render
+        background = torch.zeros(3, device=device)
+        pipe = pipeline_params()
+
+        @torch.no_grad()
+        def run():
+            return render(camera, gaussians, pipe, background)["render"]
+        return run, "rasterizer"
+
+    @torch.no_grad()
+    def run():
+        return python_preprocess(gaussians, camera)
+    return run, "python"
+
+
+@benchmark("render_backward", axes=("points", "sh_degree", "resolution"))
+def setup_render_backward(params, device):
+    gaussians = make_gaussians(params["points"], params["sh_degree"], device)
+    camera = make_cameras(1, params["resolution"], device=device)[0]
+    if rasterizer_available(device):
+        from gaussian_renderer import render
+        background = torch.zeros(3, device=device)
+        pipe = pipeline_params()
+
+        def run():
+            image = render(camera, gaussians, pipe, background)["render"]
+            image.mean().backward()
+        return run, "rasterizer"
+
+    def run():
+        opacity, cov3D, colors = python_preprocess(gaussians, camera)
+        (opacity.sum() + cov3D.sum() + colors.sum()).backward()
+    return run, "python"
+
+
+@benchmark("densify_and_prune", axes=("points",))
+def setup_densify_and_prune(params, device):
+    training_args = SimpleNamespace(percent_dense=0.01, position_lr_init=0.00016, position_lr_final=0.0000016,
+                                    position_lr_delay_mult=0.01, position_lr_max_steps=30_000, feature_lr=0.0025,
+                                    opacity_lr=0.025, scaling_lr=0.005, rotation_lr=0.001, exposure_lr_init=0.01,
+                                    exposure_lr_final=0.001, exposure_lr_delay_steps=0, exposure_lr_delay_mult=0.0,
+                                    iterations=30_000)
+    n = params["points"]
+
+    def prepare():
+        # densify_and_prune mutates the model, so every repeat starts from a fresh copy
+        gaussians = make_gaussians(n, 3, device)
+        gaussians.spatial_lr_scale = 1.0
+        gaussians.training_setup(training_args)
+        gaussians.xyz_gradient_accum = torch.rand((n, 1), device=device) * 0.0004
+        gaussians.denom = torch.ones((n, 1), device=device)
+        radii = torch.randint(0, 30, (n,), device=device)
+        gaussians.max_radii2D = radii.float()
+        return gaussians, radii
+
+    def run(state):
+        gaussians, radii = state
+        gaussians.densify_and_prune(0.0002, 0.005, 1.0, 20, radii)
+    return run, "python", prepare
+
+
+@benchmark("save_ply", axes=("points", "sh_degree"))
+def setup_save_ply(params, device):
+    gaussians = make_gaussians(params["points"], params["sh_degree"], device)
+    folder = tempfile.mkdtemp(prefix="bench_ply_")
+    path = os.path.join(folder, "point_cloud.ply")
+
+    def run():
+        gaussians.save_ply(path)
+    return run, "python"
+
+
+@benchmark("load_ply", axes=("points", "sh_degree"))
+def setup_load_ply(params, device):
+    from scene.gaussian_model import GaussianModel
+    folder = tempfile.mkdtemp(prefix="bench_ply_")
+    path = os.path.join(folder, "point_cloud.ply")
+    make_gaussians(params["points"], params["sh_degree"], "cpu").save_ply(path)
+
+    def run():
+        GaussianModel(params["sh_degree"]).load_ply(path, device=device)
+    return run, "python"
+
+
+@benchmark("ssim", axes=("resolution",))
+def setup_ssim(params, device):
+    res = params["resolution"]
+    img1 = torch.rand((3, res, res), device=device)
+    img2 = torch.rand((3, res, res), device=device)
+
+    @torch.no_grad()
+    def run():
+        return ssim(img1, img2)
+    return run, "python"
+
+
+@benchmark("fused_ssim", axes=("resolution",))
+def setup_fused_ssim(params, device):
+    res = params["resolution"]
+    img1 = torch.rand((1, 3, res, res), device=device)
+    img2 = torch.rand((1, 3, res, res), device=device)
+    try:
+        if device != "cuda":
+            raise ImportError
+        from fused_ssim import fused_ssim
+    except ImportError:
+        # Reference implementation that fused_ssim replaces
+        @torch.no_grad()
+        def run():
+            return ssim(img1, img2)
+        return run, "python"
+
+    @torch.no_grad()
+    def run():
+        return fused_ssim(img1, img2)
+    return run, "cuda"
+
+
+@benchmark("eval_sh", axes=("points", "sh_degree"))
+def setup_eval_sh(params, device):
+    n, deg = params["points"], params["sh_degree"]
+    shs = torch.randn((n, 3, (deg + 1) ** 2), device=device)
+    dirs = torch.nn.functional.normalize(torch.randn((n, 3), device=device), dim=1)
+
+    @torch.no_grad()
+    def run():
+        return eval_sh(deg, shs, dirs)
+    return run, "python"
+
+
+@benchmark("camera_loading", axes=("resolution",))
+def setup_camera_loading(params, device, num_images=4):
+    res = params["resolution"]
+    folder = os.path.join(tempfile.gettempdir(), "bench_images_{}".format(res))
+    paths = make_image_files(folder, num_images, res)
+    poses = [(cam.R, cam.T, cam.FoVx, cam.FoVy) for cam in make_cameras(num_images, res, device="cpu")]
+
+    if device == "cuda":
+        from scene.dataset_readers import CameraInfo
+        from utils.camera_utils import cameraList_from_camInfos
+        cam_infos = [CameraInfo(uid=idx, R=R, T=T, FovY=fovy, FovX=fovx, depth_params=None, image_path=path,
+                                image_name=os.path.basename(path), depth_path="", width=res, height=res, is_test=False)
+                     for idx, (path, (R, T, fovx, fovy)) in enumerate(zip(paths, poses))]
+        args = SimpleNamespace(resolution=-1, data_device="cuda", train_test_exp=False)
+
+        def run():
+            return cameraList_from_camInfos(cam_infos, 1.0, args, False, False)
+        return run, "camera"
+
+    from PIL import Image
+
+    def run():
+        out = []
+        for path, (R, T, fovx, fovy) in zip(paths, poses):
+            image = PILtoTorch(Image.open(path), (res, res))
+            world_view = torch.tensor(getWorld2View2(R, T)).transpose(0, 1)
+            projection = getProjectionMatrix(znear=0.01, zfar=100.0, fovX=fovx, fovY=fovy).transpose(0, 1)
+            out.append((image, world_view.inverse(), world_view @ projection))
+        return out
+    return run, "python"
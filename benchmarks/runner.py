@@ -0,0 +1,129 @@
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from benchmarks.cases import BENCHMARKS
+
+SIZES = {
+    "points": {"small": [10_000], "medium": [10_000, 100_000, 500_000], "large": [10_000, 100_000, 1_000_000, 5_000_000]},
+    "sh_degree": {"small": [3], "medium": [0, 3], "large": [0, 1, 2, 3, 4]},
+    "resolution": {"small": [256], "medium": [256, 1024], "large": [256, 512, 1024, 2048]},
+}
+
+
+def case_key(name, params):
+    return "{}[{}]".format(name, ",".join("{}={}".format(k, params[k]) for k in sorted(params)))
+
+
+def parameter_grid(axes, preset):
+    values = [SIZES[axis][preset] for axis in axes]
+    for combo in itertools.product(*values):
+        yield dict(zip(axes, combo))
+
+
+def _sync(device):
+    if device == "cuda":
+        torch.cuda.synchronize()
+
+
+def time_case(run, device, prepare=None, warmup=2, repeat=10):
+    """Median/mean/min/max wall time in ms of run() over repeat calls, after warmup calls."""
+    times = []
+    for i in range(warmup + repeat):
+        state = prepare() if prepare else None
+        _sync(device)
+        start = time.perf_counter()
+        run(state) if prepare else run()
+        _sync(device)
+        if i >= warmup:
+            times.append((time.perf_counter() - start) * 1000.0)
+    times = np.asarray(times)
+    return {"median_ms": float(np.median(times)), "mean_ms": float(times.mean()),
+            "min_ms": float(times.min()), "max_ms": float(times.max()), "repeat": int(repeat)}
+
+
+def run_benchmarks(names=None, device="cpu", preset="small", warmup=2, repeat=10, max_points=None):
+    results = {}
+    for name in (names or list(BENCHMARKS)):
+        bench = BENCHMARKS[name]
+        for params in parameter_grid(bench.axes, preset):
+            if max_points and params.get("points", 0) > max_points:
+                continue
+            key = case_key(name, params)
+            try:
+                setup = bench.setup(params, device)
+                run, mode = setup[0], setup[1]
+                prepare = setup[2] if len(setup) > 2 else None
+                result = time_case(run, device, prepare, warmup, repeat)
+                result["mode"] = mode
+            except (RuntimeError, MemoryError) as e:
+                result = {"error": str(e).splitlines()[0]}
+            finally:
+                if device == "cuda":
+                    torch.cuda.empty_cache()
+            results[key] = result
+            if "error" in result:
+                print("{:<60} failed: {}".format(key, result["error"]))
+            else:
+                print("{:<60} {:>10.3f} ms  ({})".format(key, result["median_ms"], result["mode"]))
+    return results
+
+
+def environment_info(device):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    info = {"timestamp": datetime.now().isoformat(timespec="seconds"), "commit": commit, "device": device,
+            "torch": torch.__version__, "python": platform.python_version(), "host": platform.node()}
+    if device == "cuda":
+        info["gpu"] = torch.cuda.get_device_name()
+    return info
+
+
+def append_history(path, entry):
+    history = []
+    if os.path.exists(path):
+        with open(path) as f:
+            history = json.load(f)
+    history.append(entry)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(history, f, indent=2)
+
+
+def load_baseline(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, entry):
+    with open(path, "w") as f:
+        json.dump(entry, f, indent=2)
+
+
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    """
+    Returns a list of (key, baseline_ms, current_ms, ratio) for every case
+    whose median time grew by more than tolerance relative to the baseline.
+    Cases measured in a different mode (e.g. python vs rasterizer) are skipped.
+    """
+    regressions = []
+    base_results = baseline.get("results", {})
+    for key, result in results.items():
+        base = base_results.get(key)
+        if not base or "median_ms" not in base or "median_ms" not in result or base.get("mode") != result.get("mode"):
+            continue
+        ratio = result["median_ms"] / max(base["median_ms"], 1e-9)
+        if ratio > 1.0 + tolerance:
+            regressions.append((key, base["median_ms"], result["median_ms"], ratio))
+    return regressions
@@ -0,0 +1,96 @@
+import math
+import os
+
+import numpy as np
+import torch
+from torch import nn
+from PIL import Image
+
+from scene.gaussian_model import GaussianModel
+from scene.cameras import MiniCam
+from utils.graphics_utils import getWorld2View2, getProjectionMatrix, focal2fov
+from utils.general_utils import inverse_sigmoid
+
+
+def make_gaussians(num_points, sh_degree=3, device="cuda", seed=0, radius=1.0):
+    """
+    GaussianModel with num_points random splats inside a sphere of the given
+    radius. All SH bands up to sh_degree are filled and active, so render and
+    save_ply see the full attribute layout of a trained model.
+    """
+    g = torch.Generator(device="cpu").manual_seed(seed)
+    n_coeffs = (sh_degree + 1) ** 2
+
+    directions = torch.nn.functional.normalize(torch.randn((num_points, 3), generator=g), dim=1)
+    xyz = directions * radius * torch.rand((num_points, 1), generator=g).pow(1.0 / 3.0)
+    features_dc = torch.randn((num_points, 1, 3), generator=g) * 0.5
+    features_rest = torch.randn((num_points, n_coeffs - 1, 3), generator=g) * 0.05
+    scales = torch.log(torch.rand((num_points, 3), generator=g) * 0.02 * radius + 1e-4)
+    rots = torch.nn.functional.normalize(torch.randn((num_points, 4), generator=g), dim=1)
+    opacities = inverse_sigmoid(torch.rand((num_points, 1), generator=g) * 0.98 + 0.01)
+
+    gaussians = GaussianModel(sh_degree)
+    gaussians._xyz = nn.Parameter(xyz.to(device).requires_grad_(True))
+    gaussians._features_dc = nn.Parameter(features_dc.to(device).contiguous().requires_grad_(True))
+    gaussians._features_rest = nn.Parameter(features_rest.to(device).contiguous().requires_grad_(True))
+    gaussians._scaling = nn.Parameter(scales.to(device).requires_grad_(True))
+    gaussians._rotation = nn.Parameter(rots.to(device).requires_grad_(True))
+    gaussians._opacity = nn.Parameter(opacities.to(device).requires_grad_(True))
+    gaussians.max_radii2D = torch.zeros((num_points), device=device)
+    gaussians.active_sh_degree = sh_degree
+    gaussians.exposure_mapping = {}
+    gaussians.pretrained_exposures = None
+    gaussians._exposure = nn.Parameter(torch.eye(3, 4, device=device)[None].requires_grad_(True))
+    return gaussians
+
+
+def look_at_pose(camera_center, target=np.zeros(3), up=np.array([0.0, -1.0, 0.0])):
+    """(R, T) in the COLMAP convention used by getWorld2View2 (R is camera-to-world, +z forward, +y down)."""
+    forward = target - camera_center
+    forward = forward / np.linalg.norm(forward)
+    right = np.cross(-up, forward)
+    right = right / np.linalg.norm(right)
+    down = np.cross(forward, right)
+    R = np.stack((right, down, forward), axis=1)
+    T = -R.T @ camera_center
+    return R, T
+
+
+def orbit_poses(num_views, distance=3.0, elevation=0.2):
+    poses = []
+    for i in range(num_views):
+        angle = 2.0 * math.pi * i / max(num_views, 1)
+        center = np.array([distance * math.sin(angle), -elevation * distance, -distance * math.cos(angle)])
+        poses.append(look_at_pose(center))
+    return poses
+
+
+def make_cameras(num_views, width, height=None, device="cuda", distance=3.0, fovx=math.radians(50.0)):
+    """MiniCam views on an orbit around the origin, looking at the synthetic splats."""
+    height = height or width
+    focal = width / (2.0 * math.tan(fovx / 2.0))
+    fovy = focal2fov(focal, height)
+    cameras = []
+    for idx, (R, T) in enumerate(orbit_poses(num_views, distance)):
+        world_view_transform = torch.tensor(getWorld2View2(R, T)).transpose(0, 1).to(device)
+        projection_matrix = getProjectionMatrix(znear=0.01, zfar=100.0, fovX=fovx, fovY=fovy).transpose(0, 1).to(device)
+        full_proj_transform = (world_view_transform.unsqueeze(0).bmm(projection_matrix.unsqueeze(0))).squeeze(0)
+        cam = MiniCam(width, height, fovy, fovx, 0.01, 100.0, world_view_transform, full_proj_transform)
+        cam.image_name = "synthetic_{:04d}".format(idx)
+        cam.R, cam.T = R, T
+        cameras.append(cam)
+    return cameras
+
+
+def make_image_files(folder, num_images, width, height=None, seed=0):
+    """Writes num_images random RGB PNGs into folder and returns their paths."""
+    height = height or width
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for idx in range(num_images):
+        path = os.path.join(folder, "{:04d}.png".format(idx))
+        if not os.path.exists(path):
+            Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
@@ -15,15 +15,47 @@ from diff_gaussian_rasterization import GaussianRasterizationSettings, GaussianR
 from scene.gaussian_model import GaussianModel
 from utils.sh_utils import eval_sh
 
-def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor, scaling_modifier = 1.0, separate_sh = False, override_color = None, use_trained_exp=False):
+def prepare_gaussians(pc : GaussianModel, pipe, scaling_modifier = 1.0, separate_sh = False):
+    """
+    View-independent inputs of the rasterizer: activated opacities, scales and
+    rotations (or the 3D covariance when pipe.compute_cov3D_python is set) and
+    the SH coefficients in the layout the rasterizer expects. render() computes
+    these on every call; render_views() computes them once for all views.
+    """
+    prepared = {"means3D": pc.get_xyz, "opacity": pc.get_opacity,
+                "scales": None, "rotations": None, "cov3D_precomp": None,
+                "dc": None, "shs": None, "shs_view": None}
+    if pipe.compute_cov3D_python:
+        prepared["cov3D_precomp"] = pc.get_covariance(scaling_modifier)
+    else:
+        prepared["scales"] = pc.get_scaling
+        prepared["rotations"] = pc.get_rotation
+    if pipe.convert_SHs_python:
+        prepared["shs_view"] = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree+1)**2)
+    elif separate_sh:
+        prepared["dc"], prepared["shs"] = pc.get_features_dc, pc.get_features_rest
+    else:
+        prepared["shs"] = pc.get_features
+    return prepared
+
+def select_prepared(prepared, index):
+    """The prepared inputs of only the Gaussians in index, e.g. a frustum query result."""
+    return {key: (value[index] if value is not None else None) for key, value in prepared.items()}
+
+def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor, scaling_modifier = 1.0, separate_sh = False, override_color = None, use_trained_exp=False, prepared = None):
     """
     Render the scene. 
     
     Background tensor (bg_color) must be on GPU!
+    prepared: optional output of prepare_gaussians for this model, pipe and scaling_modifier,
+    or a subset of it (see select_prepared).
     """
  
+    if prepared is None:
+        prepared = prepare_gaussians(pc, pipe, scaling_modifier, separate_sh)
+
     # Create zero tensor. We will use it to make pytorch return gradients of the 2D (screen-space) means
-    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device="cuda") + 0
+    screenspace_points = torch.zeros_like(prepared["means3D"], dtype=prepared["means3D"].dtype, requires_grad=True, device="cuda") + 0
     try:
         screenspace_points.retain_grad()
     except:
@@ -51,38 +83,30 @@ def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor,
 
     rasterizer = GaussianRasterizer(raster_settings=raster_settings)
 
-    means3D = pc.get_xyz
+    means3D = prepared["means3D"]
     means2D = screenspace_points
-    opacity = pc.get_opacity
+    opacity = prepared["opacity"]
 
     # If precomputed 3d covariance is provided, use it. If not, then it will be computed from
     # scaling / rotation by the rasterizer.
-    scales = None
-    rotations = None
-    cov3D_precomp = None
-
-    if pipe.compute_cov3D_python:
-        cov3D_precomp = pc.get_covariance(scaling_modifier)
-    else:
-        scales = pc.get_scaling
-        rotations = pc.get_rotation
+    scales = prepared["scales"]
+    rotations = prepared["rotations"]
+    cov3D_precomp = prepared["cov3D_precomp"]
 
     # If precomputed colors are provided, use them. Otherwise, if it is desired to precompute colors
     # from SHs in Python, do it. If not, then SH -> RGB conversion will be done by rasterizer.
     shs = None
+    dc = None
     colors_precomp = None
     if override_color is None:
         if pipe.convert_SHs_python:
-            shs_view = pc.get_features.transpose(1, 2).view(-1, 3, (pc.max_sh_degree+1)**2)
-            dir_pp = (pc.get_xyz - viewpoint_camera.camera_center.repeat(pc.get_features.shape[0], 1))
+            shs_view = prepared["shs_view"]
+            dir_pp = (means3D - viewpoint_camera.camera_center.repeat(means3D.shape[0], 1))
             dir_pp_normalized = dir_pp/dir_pp.norm(dim=1, keepdim=True)
             sh2rgb = eval_sh(pc.active_sh_degree, shs_view, dir_pp_normalized)
             colors_precomp = torch.clamp_min(sh2rgb + 0.5, 0.0)
         else:
-            if separate_sh:
-                dc, shs = pc.get_features_dc, pc.get_features_rest
-            else:
-                shs = pc.get_features
+            dc, shs = prepared["dc"], prepared["shs"]
     else:
         colors_precomp = override_color
 
@@ -126,3 +150,18 @@ def render(viewpoint_camera, pc : GaussianModel, pipe, bg_color : torch.Tensor,
         }
     
     return out
+
+
+@torch.no_grad()
+def render_views(views, pc : GaussianModel, pipe, bg_color : torch.Tensor, scaling_modifier = 1.0, separate_sh = False, use_trained_exp = False, spatial_index = None):
+    """
+    Renders a list of cameras with the per-model preprocessing done once and
+    yields (index, render package) for each view. Intended for inference, so
+    it runs under no_grad. With a spatial_index (gaussians.spatial_index) only the
+    Gaussians in cells touching each view's frustum are sent to the rasterizer.
+    """
+    prepared = prepare_gaussians(pc, pipe, scaling_modifier, separate_sh)
+    for idx, view in enumerate(views):
+        view_prepared = prepared if spatial_index is None else select_prepared(prepared, spatial_index.frustum_query(view))
+        yield idx, render(view, pc, pipe, bg_color, scaling_modifier=scaling_modifier, separate_sh=separate_sh,
+                          use_trained_exp=use_trained_exp, prepared=view_prepared)
@@ -0,0 +1,123 @@
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+# Encodings a viewer can ask for with the optional "encoding" key of its
+# request. "raw" is the original network_gui format (W*H*3 bytes, no header)
+# and the default when the key is missing. Every other encoding is sent as a
+# 4 byte little-endian length followed by the payload.
+ENCODINGS = ["raw", "jpeg", "webp", "delta"]
+
+
+def negotiate(requested):
+    """Picks the requested encoding if this process can produce it, else raw."""
+    requested = (requested or "raw").lower()
+    if requested in ("jpeg", "webp") and not CV2_AVAILABLE:
+        return "raw"
+    return requested if requested in ENCODINGS else "raw"
+
+
+class FrameEncoder:
+    """
+    Per-client frame encoder.
+
+    jpeg/webp use OpenCV's codecs. delta sends the byte-wise difference to the
+    previous frame of the same client, zlib compressed, which collapses the
+    static background to almost nothing; a keyframe (flag byte 1) is sent
+    whenever the size changes or every keyframe_interval frames.
+    """
+
+    def __init__(self, encoding="raw", quality=80, keyframe_interval=60):
+        self.encoding = negotiate(encoding)
+        self.quality = int(quality)
+        self.keyframe_interval = keyframe_interval
+        self.previous = None
+        self.frames_since_key = 0
+
+    def encode(self, rgb):
+        """rgb: HxWx3 uint8 numpy array."""
+        if self.encoding == "raw":
+            return memoryview(np.ascontiguousarray(rgb)).tobytes()
+        if self.encoding in ("jpeg", "webp"):
+            bgr = np.ascontiguousarray(rgb[..., ::-1])
+            if self.encoding == "jpeg":
+                ok, buf = cv2.imencode(".jpg", bgr, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            else:
+                ok, buf = cv2.imencode(".webp", bgr, [int(cv2.IMWRITE_WEBP_QUALITY), self.quality])
+            if not ok:
+                raise RuntimeError("Could not encode frame as {}".format(self.encoding))
+            payload = buf.tobytes()
+        else:
+            payload = self._encode_delta(rgb)
+        return len(payload).to_bytes(4, 'little') + payload
+
+    def _encode_delta(self, rgb):
+        h, w = rgb.shape[:2]
+        header = h.to_bytes(2, 'little') + w.to_bytes(2, 'little')
+        keyframe = self.previous is None or self.previous.shape != rgb.shape or self.frames_since_key >= self.keyframe_interval
+        if keyframe:
+            data = rgb
+            self.frames_since_key = 0
+        else:
+            data = rgb - self.previous  # uint8 wraps around, the client adds it back modulo 256
+            self.frames_since_key += 1
+        self.previous = rgb.copy()
+        return bytes([1 if keyframe else 0]) + header + zlib.compress(np.ascontiguousarray(data).tobytes(), 1)
+
+
+class AdaptiveResolution:
+    """
+    Lowers the render resolution while the camera moves and refines it once
+    the camera has been still for still_time seconds.
+    """
+
+    def __init__(self, motion_scale=0.5, still_time=0.25, motion_threshold=1e-4):
+        self.motion_scale = motion_scale
+        self.still_time = still_time
+        self.motion_threshold = motion_threshold
+        self.last_view = None
+        self.last_motion = 0.0
+
+    def scale(self, view_matrix):
+        view = np.asarray(view_matrix, dtype=np.float64)
+        now = time.perf_counter()
+        if self.last_view is not None and np.abs(view - self.last_view).max() > self.motion_threshold:
+            self.last_motion = now
+        self.last_view = view
+        return self.motion_scale if now - self.last_motion < self.still_time else 1.0
+
+
+class FramePacer:
+    """Rolling frame statistics: render/encode time, payload size, frame interval."""
+
+    def __init__(self, window=120):
+        self.samples = deque(maxlen=window)
+        self.last_sent = None
+
+    def record(self, render_ms, encode_ms, num_bytes, scale):
+        now = time.perf_counter()
+        interval_ms = (now - self.last_sent) * 1000.0 if self.last_sent is not None else 0.0
+        self.last_sent = now
+        self.samples.append((render_ms, encode_ms, num_bytes, interval_ms, scale))
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        s = np.asarray(self.samples)
+        intervals = s[1:, 3] if len(s) > 1 else s[:, 3]
+        mean_interval = float(intervals.mean())
+        return {"fps": 1000.0 / mean_interval if mean_interval > 0 else 0.0,
+                "interval_p90_ms": float(np.percentile(intervals, 90)),
+                "render_ms": float(s[:, 0].mean()),
+                "encode_ms": float(s[:, 1].mean()),
+                "kbytes_per_frame": float(s[:, 2].mean()) / 1024.0,
+                "mbit_per_s": float(s[:, 2].sum()) * 8.0 / 1e6 / max(float(intervals.sum()) / 1000.0, 1e-6),
+                "reduced_frames": float((s[:, 4] < 1.0).mean())}
@@ -56,7 +56,9 @@ def send(message_bytes, verify):
 
 def receive():
     message = read()
+    return parse_message(message)
 
+def parse_message(message):
     width = message["resolution_x"]
     height = message["resolution_y"]
 
@@ -0,0 +1,327 @@
+import json
+import selectors
+import socket
+import threading
+import time
+import traceback
+from copy import copy
+
+import torch
+
+from gaussian_renderer.network_gui import parse_message
+from gaussian_renderer.frame_codec import FrameEncoder, AdaptiveResolution, FramePacer, negotiate
+from utils.lod_utils import contribution_scores, build_lod, ordered_model, LodController
+
+
+class ViewerClient:
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.request = None
+        self.train = True
+        self.keep_alive = False
+        self.closed = False
+        self.encoder = FrameEncoder("raw")
+        self.adaptive = AdaptiveResolution()
+        self.pacer = FramePacer()
+        self.lod = None
+
+
+class ViewerServer:
+    """
+    Threaded viewer server speaking the network_gui protocol.
+
+    A network thread accepts any number of clients and does all socket IO
+    non-blocking, so training never waits on a viewer. A render thread
+    answers the latest request of every client from a snapshot of the model
+    on its own CUDA stream, at most max_fps times per second. The training
+    loop only calls update_snapshot(), which copies the model at most every
+    snapshot_interval seconds and only while a client is connected.
+
+    Each request is answered exactly once with the frame bytes (if a
+    resolution was requested) followed by the length-prefixed verify string,
+    as in network_gui.send. A viewer may add "encoding" ("jpeg", "webp" or
+    "delta", see frame_codec) and "quality" to its request to get compressed,
+    length-prefixed frames instead of raw RGB; compressed streams also drop
+    to a lower resolution while the camera moves unless "adaptive" is false.
+
+    With lod_cameras and target_ms, every snapshot is split into nested LOD
+    levels ranked over lod_cameras and each client gets the level that keeps
+    its render time near target_ms; a request may pin a level with "lod".
+    """
+
+    def __init__(self, host, port, render_fn, pipe, background, verify, max_fps=15.0, snapshot_interval=0.5, stats_interval=10.0,
+                 lod_cameras=None, target_ms=0.0, separate_sh=False, use_trained_exp=False):
+        self.render_fn = render_fn
+        self.separate_sh = separate_sh
+        self.use_trained_exp = use_trained_exp
+        self.pipe = pipe
+        self.background = background
+        self.verify = bytes(verify, 'ascii')
+        self.min_frame_time = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.snapshot_interval = snapshot_interval
+        self.stats_interval = stats_interval
+        self.last_stats = time.perf_counter()
+        self.lod_cameras = lod_cameras if target_ms > 0 else None
+        self.target_ms = target_ms
+        self.lod_cache = None
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen()
+        self.listener.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ, None)
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.requests_ready = threading.Condition(self.lock)
+
+        self.snapshot = None
+        self.snapshot_event = None
+        self.last_snapshot_time = 0.0
+        self.stream = torch.cuda.Stream() if torch.cuda.is_available() else None
+
+        self.running = True
+        self.network_thread = threading.Thread(target=self._network_loop, name="viewer-network", daemon=True)
+        self.render_thread = threading.Thread(target=self._render_loop, name="viewer-render", daemon=True)
+        self.network_thread.start()
+        self.render_thread.start()
+
+    @property
+    def has_clients(self):
+        return len(self.clients) > 0
+
+    @property
+    def training_paused(self):
+        """True while a connected viewer has training switched off."""
+        with self.lock:
+            return any(not client.train for client in self.clients.values())
+
+    @property
+    def keep_alive(self):
+        with self.lock:
+            return any(client.keep_alive for client in self.clients.values())
+
+    def update_snapshot(self, gaussians, force=False):
+        """Called from the training loop; cheap no-op unless a viewer is connected and the interval elapsed."""
+        if not self.clients:
+            return
+        now = time.perf_counter()
+        if not force and now - self.last_snapshot_time < self.snapshot_interval:
+            return
+        with torch.no_grad():
+            snapshot = gaussians.snapshot()
+        event = torch.cuda.Event() if self.stream is not None else None
+        if event is not None:
+            event.record()
+        with self.lock:
+            self.snapshot = snapshot
+            self.snapshot_event = event
+        self.last_snapshot_time = now
+
+    def wait_while_paused(self, gaussians, poll=0.01):
+        if not (self.running and self.training_paused):
+            return
+        # The model does not change while paused, one up-to-date snapshot is enough
+        self.update_snapshot(gaussians, force=True)
+        while self.running and self.training_paused:
+            time.sleep(poll)
+
+    def close(self):
+        self.running = False
+        with self.requests_ready:
+            self.requests_ready.notify_all()
+        self.network_thread.join(timeout=1.0)
+        self.render_thread.join(timeout=1.0)
+        for client in list(self.clients.values()):
+            client.sock.close()
+        self.listener.close()
+
+    # Network thread
+
+    def _network_loop(self):
+        while self.running:
+            for key, mask in self.selector.select(timeout=0.01):
+                if key.data is None:
+                    self._accept()
+                    continue
+                client = key.data
+                try:
+                    if mask & selectors.EVENT_READ:
+                        self._read(client)
+                    if mask & selectors.EVENT_WRITE:
+                        self._write(client)
+                except (ConnectionError, OSError, ValueError):
+                    self._drop(client)
+            for client in [c for c in list(self.clients.values()) if c.closed]:
+                self._drop(client)
+            with self.lock:
+                for client in list(self.clients.values()):
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.outbuf else 0)
+                    try:
+                        self.selector.modify(client.sock, events, client)
+                    except (KeyError, ValueError):
+                        pass
+
+    def _accept(self):
+        try:
+            sock, addr = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        client = ViewerClient(sock, addr)
+        with self.lock:
+            self.clients[sock.fileno()] = client
+        self.selector.register(sock, selectors.EVENT_READ, client)
+        print(f"\nViewer connected by {addr}")
+
+    def _drop(self, client):
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        with self.lock:
+            self.clients = {k: c for k, c in self.clients.items() if c is not client}
+        client.sock.close()
+        print(f"\nViewer {client.addr} disconnected")
+
+    def _read(self, client):
+        data = client.sock.recv(65536)
+        if not data:
+            raise ConnectionError("closed")
+        client.inbuf += data
+        while len(client.inbuf) >= 4:
+            length = int.from_bytes(client.inbuf[:4], 'little')
+            if len(client.inbuf) < 4 + length:
+                break
+            message = json.loads(client.inbuf[4:4 + length].decode("utf-8"))
+            del client.inbuf[:4 + length]
+            with self.requests_ready:
+                # The viewer waits for each reply before sending again, so there is at most one open request
+                client.request = message
+                client.train = bool(message.get("train", True))
+                client.keep_alive = bool(message.get("keep_alive", False))
+                self.requests_ready.notify()
+
+    def _write(self, client):
+        with self.lock:
+            if not client.outbuf:
+                return
+            sent = client.sock.send(client.outbuf)
+            del client.outbuf[:sent]
+
+    # Render thread
+
+    def _render_loop(self):
+        last_frame = 0.0
+        while self.running:
+            with self.requests_ready:
+                while self.running and (self.snapshot is None or not any(c.request is not None for c in self.clients.values())):
+                    self.requests_ready.wait(timeout=0.1)
+                pending = [(c, c.request) for c in self.clients.values() if c.request is not None]
+                for client, _ in pending:
+                    client.request = None
+                snapshot, event = self.snapshot, self.snapshot_event
+
+            wait = self.min_frame_time - (time.perf_counter() - last_frame)
+            if wait > 0:
+                time.sleep(wait)
+            last_frame = time.perf_counter()
+
+            for client, message in pending:
+                try:
+                    frame = self._render(client, snapshot, event, message)
+                except Exception:
+                    traceback.print_exc()
+                    # Sockets are only touched by the network thread, which drops the client
+                    client.closed = True
+                    continue
+                self._queue_reply(client, frame)
+
+            if self.stats_interval and time.perf_counter() - self.last_stats > self.stats_interval:
+                self.last_stats = time.perf_counter()
+                for addr, stats in self.frame_stats().items():
+                    if stats:
+                        print("\n[Viewer {}] {:.1f} fps, {:.1f} kB/frame, {:.2f} Mbit/s, render {:.1f} ms, encode {:.1f} ms".format(
+                            addr, stats["fps"], stats["kbytes_per_frame"], stats["mbit_per_s"], stats["render_ms"], stats["encode_ms"]))
+
+    def frame_stats(self):
+        """Frame pacing statistics of every connected viewer, keyed by address."""
+        with self.lock:
+            return {client.addr: client.pacer.summary() for client in self.clients.values()}
+
+    def _render(self, client, snapshot, event, message):
+        custom_cam, _, convert_SHs_python, compute_cov3D_python, _, scaling_modifier = parse_message(message)
+        if custom_cam is None:
+            return None
+        pipe = copy(self.pipe)
+        pipe.convert_SHs_python = convert_SHs_python
+        pipe.compute_cov3D_python = compute_cov3D_python
+
+        encoding = negotiate(message.get("encoding"))
+        quality = message.get("quality", 80)
+        if encoding != client.encoder.encoding or quality != client.encoder.quality:
+            client.encoder = FrameEncoder(encoding, quality)
+        scale = 1.0
+        if encoding != "raw" and message.get("adaptive", True):
+            # Raw frames carry no size, so only self-describing encodings may change resolution
+            scale = client.adaptive.scale(message["view_matrix"])
+            custom_cam.image_width = max(1, int(custom_cam.image_width * scale))
+            custom_cam.image_height = max(1, int(custom_cam.image_height * scale))
+
+        start = time.perf_counter()
+        if self.stream is None:
+            with torch.no_grad():
+                rgb = self._draw(client, snapshot, custom_cam, pipe, scaling_modifier, message)
+        else:
+            with torch.cuda.stream(self.stream), torch.no_grad():
+                if event is not None:
+                    self.stream.wait_event(event)
+                # The training thread may drop this snapshot while the stream still reads it
+                for tensor in (snapshot._xyz, snapshot._features_dc, snapshot._features_rest, snapshot._scaling, snapshot._rotation, snapshot._opacity):
+                    tensor.record_stream(self.stream)
+                if isinstance(getattr(snapshot, "_exposure", None), torch.Tensor) and snapshot._exposure.is_cuda:
+                    snapshot._exposure.record_stream(self.stream)
+                rgb = self._draw(client, snapshot, custom_cam, pipe, scaling_modifier, message)
+        rendered = time.perf_counter()
+        if client.lod is not None and "lod" not in message:
+            client.lod.update((rendered - start) * 1000.0)
+        frame = client.encoder.encode(rgb)
+        client.pacer.record((rendered - start) * 1000.0, (time.perf_counter() - rendered) * 1000.0, len(frame), scale)
+        return frame
+
+    def _draw(self, client, snapshot, custom_cam, pipe, scaling_modifier, message):
+        model = snapshot
+        levels = self._lod_levels(snapshot)
+        if levels is not None:
+            if client.lod is None or client.lod.num_levels != len(levels):
+                client.lod = LodController(len(levels), self.target_ms)
+            level = min(max(int(message["lod"]), 0), len(levels) - 1) if "lod" in message else client.lod.level
+            model = levels[level]
+        image = self.render_fn(custom_cam, model, pipe, self.background, scaling_modifier=scaling_modifier,
+                               separate_sh=self.separate_sh, use_trained_exp=self.use_trained_exp)["render"]
+        return self.to_rgb(image)
+
+    def _lod_levels(self, snapshot):
+        """LOD levels of the current snapshot, built once per snapshot on the render thread."""
+        if self.lod_cameras is None:
+            return None
+        if self.lod_cache is None or self.lod_cache[0] is not snapshot:
+            lod = build_lod(contribution_scores(snapshot, self.lod_cameras), snapshot.get_opacity)
+            ordered = ordered_model(snapshot, lod)
+            self.lod_cache = (snapshot, [ordered.subset(count) for count in lod["counts"]])
+        return self.lod_cache[1]
+
+    def to_rgb(self, image):
+        return (torch.clamp(image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy()
+
+    def _queue_reply(self, client, frame):
+        with self.lock:
+            if frame is not None:
+                client.outbuf += frame
+            client.outbuf += len(self.verify).to_bytes(4, 'little')
+            client.outbuf += self.verify
@@ -95,10 +95,14 @@ class Scene:
             self.test_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.test_cameras, resolution_scale, args, scene_info.is_nerf_synthetic, True)
 
         if self.loaded_iter:
-            self.gaussians.load_ply(os.path.join(self.model_path,
-                                                           "point_cloud",
-                                                           "iteration_" + str(self.loaded_iter),
-                                                           "point_cloud.ply"), args.train_test_exp)
+            iteration_path = os.path.join(self.model_path, "point_cloud", "iteration_" + str(self.loaded_iter))
+            if not os.path.exists(os.path.join(iteration_path, "point_cloud.ply")) and os.path.exists(os.path.join(iteration_path, "point_cloud.gsz")):
+                self.gaussians.load_compressed(os.path.join(iteration_path, "point_cloud.gsz"))
+            else:
+                self.gaussians.load_ply(os.path.join(self.model_path,
+                                                               "point_cloud",
+                                                               "iteration_" + str(self.loaded_iter),
+                                                               "point_cloud.ply"), args.train_test_exp)
         else:
             self.gaussians.create_from_pcd(scene_info.point_cloud, scene_info.train_cameras, self.cameras_extent)
 
@@ -15,10 +15,14 @@ from utils.general_utils import inverse_sigmoid, get_expon_lr_func, build_rotati
 from torch import nn
 import os
 import json
+import weakref
 from utils.system_utils import mkdir_p
 from plyfile import PlyData, PlyElement
 from utils.sh_utils import RGB2SH
-from simple_knn._C import distCUDA2
+from utils.compression import load_compressed
+from utils.vq_utils import kmeans
+from scene.spatial_index import SpatialIndex
+from utils.knn import mean_sq_knn_distance
 from utils.graphics_utils import BasicPointCloud
 from utils.general_utils import strip_symmetric, build_scaling_rotation
 
@@ -63,6 +67,12 @@ class GaussianModel:
         self.optimizer = None
         self.percent_dense = 0
         self.spatial_lr_scale = 0
+        self.frozen = False
+        self._activation_cache = {}
+        self.sh_degrees = None
+        self.sh_codebook = None
+        self.sh_indices = None
+        self.spatial_index = None
         self.setup_functions()
 
     def capture(self):
@@ -99,13 +109,44 @@ class GaussianModel:
         self.denom = denom
         self.optimizer.load_state_dict(opt_dict)
 
+    def freeze(self):
+        """
+        Inference mode: the activated scaling, rotation, opacity and the
+        concatenated features are computed once and reused by every render.
+        A cached tensor is recomputed when one of its inputs is replaced or
+        modified in place, so pruning or loading a ply keeps working.
+        """
+        self.frozen = True
+        self._activation_cache = {}
+
+    def unfreeze(self):
+        self.frozen = False
+        self._activation_cache = {}
+
+    def _cached(self, key, inputs, compute, params=()):
+        """
+        One entry per key, valid while the inputs are the same tensor objects
+        at the same version and params are equal; otherwise it is replaced.
+        """
+        if not self.frozen:
+            return compute()
+        entry = self._activation_cache.get(key)
+        # Tensor._version is bumped by every in-place op. The weakrefs detect a replaced tensor
+        # without keeping the old one alive (its id() may be reused by the replacement)
+        if (entry is None or entry[1] != params or len(entry[0]) != len(inputs)
+                or any(ref() is not t or version != t._version for (ref, version), t in zip(entry[0], inputs))):
+            with torch.no_grad():
+                entry = (tuple((weakref.ref(t), t._version) for t in inputs), params, compute())
+            self._activation_cache[key] = entry
+        return entry[2]
+
     @property
     def get_scaling(self):
-        return self.scaling_activation(self._scaling)
+        return self._cached("scaling", (self._scaling,), lambda: self.scaling_activation(self._scaling))
     
     @property
     def get_rotation(self):
-        return self.rotation_activation(self._rotation)
+        return self._cached("rotation", (self._rotation,), lambda: self.rotation_activation(self._rotation))
     
     @property
     def get_xyz(self):
@@ -114,8 +155,8 @@ class GaussianModel:
     @property
     def get_features(self):
         features_dc = self._features_dc
-        features_rest = self._features_rest
-        return torch.cat((features_dc, features_rest), dim=1)
+        features_rest = self.get_features_rest
+        return self._cached("features", (features_dc, features_rest), lambda: torch.cat((features_dc, features_rest), dim=1))
     
     @property
     def get_features_dc(self):
@@ -123,11 +164,14 @@ class GaussianModel:
     
     @property
     def get_features_rest(self):
+        if self.sh_codebook is not None:
+            return self._cached("features_rest", (self.sh_codebook, self.sh_indices),
+                                lambda: torch.index_select(self.sh_codebook, 0, self.sh_indices))
         return self._features_rest
     
     @property
     def get_opacity(self):
-        return self.opacity_activation(self._opacity)
+        return self._cached("opacity", (self._opacity,), lambda: self.opacity_activation(self._opacity))
     
     @property
     def get_exposure(self):
@@ -139,29 +183,131 @@ class GaussianModel:
         else:
             return self.pretrained_exposures[image_name]
     
+    def snapshot(self):
+        """Detached copy of the renderable state, safe to read while training continues."""
+        snap = GaussianModel(self.max_sh_degree, self.optimizer_type)
+        snap.active_sh_degree = self.active_sh_degree
+        snap._xyz = self._xyz.detach().clone()
+        snap._features_dc = self._features_dc.detach().clone()
+        snap._features_rest = self._features_rest.detach().clone()
+        snap._scaling = self._scaling.detach().clone()
+        snap._rotation = self._rotation.detach().clone()
+        snap._opacity = self._opacity.detach().clone()
+        snap.sh_degrees = self.sh_degrees
+        if self.sh_codebook is not None:
+            snap.sh_codebook = self.sh_codebook.detach().clone()
+            snap.sh_indices = self.sh_indices
+        # Exposure is trained too, so it is copied like the other parameters
+        for name in ("pretrained_exposures", "exposure_mapping"):
+            if hasattr(self, name):
+                setattr(snap, name, getattr(self, name))
+        if hasattr(self, "_exposure"):
+            snap._exposure = self._exposure.detach().clone()
+        # A snapshot is rendered for several viewer frames, so keep its activations
+        snap.freeze()
+        return snap
+
+    def subset(self, index):
+        """
+        Detached model with only the selected Gaussians, for rendering.
+        index is a boolean mask, an index tensor, or an int to keep the first
+        index Gaussians, which takes views and copies nothing.
+        """
+        sub = GaussianModel(self.max_sh_degree, self.optimizer_type)
+        sub.active_sh_degree = self.active_sh_degree
+        select = slice(0, index) if isinstance(index, int) else index
+        for name in ("_xyz", "_features_dc", "_features_rest", "_scaling", "_rotation", "_opacity"):
+            setattr(sub, name, getattr(self, name).detach()[select])
+        if self.sh_degrees is not None:
+            sub.sh_degrees = self.sh_degrees[select]
+        if self.sh_codebook is not None:
+            sub.sh_codebook = self.sh_codebook.detach()
+            sub.sh_indices = self.sh_indices[select]
+        for name in ("pretrained_exposures", "exposure_mapping", "_exposure"):
+            if hasattr(self, name):
+                setattr(sub, name, getattr(self, name))
+        if self.frozen:
+            sub.freeze()
+        return sub
+
+    def sh_rest_mask(self):
+        """(N, rest coefficients, 1) mask of the coefficients within each Gaussian's own SH degree."""
+        num_rest = self._features_rest.shape[1]
+        band = torch.arange(1, num_rest + 1, device=self._features_rest.device).float().sqrt().floor()
+        return (band[None, :] <= self.sh_degrees[:, None].float()).float()[:, :, None]
+
+    def set_sh_degrees(self, degrees):
+        """
+        Gives every Gaussian its own SH degree. Coefficients above it are zeroed,
+        so the rasterizer, which evaluates one degree for all, renders the same.
+        """
+        self.sh_degrees = degrees.to(device=self._features_rest.device, dtype=torch.uint8)
+        with torch.no_grad():
+            self._features_rest.mul_(self.sh_rest_mask())
+
+    def quantize_sh(self, codebook_size, iterations=20, device=None):
+        """
+        Codebook mode: the SH rest coefficients are replaced by a k-means
+        codebook (a trainable parameter) and one index per Gaussian.
+        get_features_rest gathers from the codebook, so rendering and its
+        gradients work unchanged. Clustering runs on device (default: where the
+        features are), CPU or GPU. The codebook is shared by all Gaussians and
+        is not part of self.optimizer; densification gives new Gaussians the
+        index of their source, and the codebook itself is trained by
+        utils.compact.finetune.
+        """
+        num_rest = self._features_rest.shape[1]
+        features = self._features_rest.detach().flatten(start_dim=1)
+        centers, labels = kmeans(features.to(device or features.device), codebook_size, iterations)
+        self.sh_codebook = nn.Parameter(centers.to(features.device).view(-1, num_rest, 3).contiguous().requires_grad_(True))
+        # Indices are uint16 on disk; index_select needs int32 or int64
+        self.sh_indices = labels.to(device=features.device, dtype=torch.int32)
+        self._features_rest = nn.Parameter(self._features_rest.detach()[:, :0].contiguous().requires_grad_(True))
+        if self.optimizer is not None:
+            # The f_rest group must not keep training (and densifying) the full-width coefficients
+            for group in self.optimizer.param_groups:
+                if group["name"] == "f_rest":
+                    self.optimizer.state.pop(group["params"][0], None)
+                    group["params"][0] = self._features_rest
+        self._activation_cache = {}
+
+    def spatial_extents(self):
+        return 3.0 * self.get_scaling.detach().max(dim=1).values
+
+    def build_spatial_index(self, **kwargs):
+        """
+        Builds a SpatialIndex over the centers and 3 sigma extents. Once built,
+        pruning and densification update it incrementally.
+        """
+        self.spatial_index = SpatialIndex(self._xyz, self.spatial_extents(), **kwargs)
+        return self.spatial_index
+
     def get_covariance(self, scaling_modifier = 1):
-        return self.covariance_activation(self.get_scaling, scaling_modifier, self._rotation)
+        # The modifier is a parameter rather than part of the key, so a viewer slider keeps a single entry
+        return self._cached("covariance", (self._scaling, self._rotation),
+                            lambda: self.covariance_activation(self.get_scaling, scaling_modifier, self._rotation),
+                            params=(scaling_modifier,))
 
     def oneupSHdegree(self):
         if self.active_sh_degree < self.max_sh_degree:
             self.active_sh_degree += 1
 
-    def create_from_pcd(self, pcd : BasicPointCloud, cam_infos : int, spatial_lr_scale : float):
+    def create_from_pcd(self, pcd : BasicPointCloud, cam_infos : int, spatial_lr_scale : float, device = "cuda", knn_backend = "auto"):
         self.spatial_lr_scale = spatial_lr_scale
-        fused_point_cloud = torch.tensor(np.asarray(pcd.points)).float().cuda()
-        fused_color = RGB2SH(torch.tensor(np.asarray(pcd.colors)).float().cuda())
-        features = torch.zeros((fused_color.shape[0], 3, (self.max_sh_degree + 1) ** 2)).float().cuda()
+        fused_point_cloud = torch.tensor(np.asarray(pcd.points)).float().to(device)
+        fused_color = RGB2SH(torch.tensor(np.asarray(pcd.colors)).float().to(device))
+        features = torch.zeros((fused_color.shape[0], 3, (self.max_sh_degree + 1) ** 2), device=device).float()
         features[:, :3, 0 ] = fused_color
         features[:, 3:, 1:] = 0.0
 
         print("Number of points at initialisation : ", fused_point_cloud.shape[0])
 
-        dist2 = torch.clamp_min(distCUDA2(torch.from_numpy(np.asarray(pcd.points)).float().cuda()), 0.0000001)
+        dist2 = torch.clamp_min(mean_sq_knn_distance(fused_point_cloud, 3, knn_backend), 0.0000001)
         scales = torch.log(torch.sqrt(dist2))[...,None].repeat(1, 3)
-        rots = torch.zeros((fused_point_cloud.shape[0], 4), device="cuda")
+        rots = torch.zeros((fused_point_cloud.shape[0], 4), device=device)
         rots[:, 0] = 1
 
-        opacities = self.inverse_opacity_activation(0.1 * torch.ones((fused_point_cloud.shape[0], 1), dtype=torch.float, device="cuda"))
+        opacities = self.inverse_opacity_activation(0.1 * torch.ones((fused_point_cloud.shape[0], 1), dtype=torch.float, device=device))
 
         self._xyz = nn.Parameter(fused_point_cloud.requires_grad_(True))
         self._features_dc = nn.Parameter(features[:,:,0:1].transpose(1, 2).contiguous().requires_grad_(True))
@@ -169,16 +315,16 @@ class GaussianModel:
         self._scaling = nn.Parameter(scales.requires_grad_(True))
         self._rotation = nn.Parameter(rots.requires_grad_(True))
         self._opacity = nn.Parameter(opacities.requires_grad_(True))
-        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
+        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device=device)
         self.exposure_mapping = {cam_info.image_name: idx for idx, cam_info in enumerate(cam_infos)}
         self.pretrained_exposures = None
-        exposure = torch.eye(3, 4, device="cuda")[None].repeat(len(cam_infos), 1, 1)
+        exposure = torch.eye(3, 4, device=device)[None].repeat(len(cam_infos), 1, 1)
         self._exposure = nn.Parameter(exposure.requires_grad_(True))
 
     def training_setup(self, training_args):
         self.percent_dense = training_args.percent_dense
-        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device=self._xyz.device)
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device=self._xyz.device)
 
         l = [
             {'params': [self._xyz], 'lr': training_args.position_lr_init * self.spatial_lr_scale, "name": "xyz"},
@@ -227,13 +373,15 @@ class GaussianModel:
         # All channels except the 3 DC
         for i in range(self._features_dc.shape[1]*self._features_dc.shape[2]):
             l.append('f_dc_{}'.format(i))
-        for i in range(self._features_rest.shape[1]*self._features_rest.shape[2]):
+        for i in range(self.get_features_rest.shape[1]*self.get_features_rest.shape[2]):
             l.append('f_rest_{}'.format(i))
         l.append('opacity')
         for i in range(self._scaling.shape[1]):
             l.append('scale_{}'.format(i))
         for i in range(self._rotation.shape[1]):
             l.append('rot_{}'.format(i))
+        if self.sh_degrees is not None:
+            l.append('sh_degree')
         return l
 
     def save_ply(self, path):
@@ -242,7 +390,7 @@ class GaussianModel:
         xyz = self._xyz.detach().cpu().numpy()
         normals = np.zeros_like(xyz)
         f_dc = self._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        f_rest = self._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
+        f_rest = self.get_features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
         opacities = self._opacity.detach().cpu().numpy()
         scale = self._scaling.detach().cpu().numpy()
         rotation = self._rotation.detach().cpu().numpy()
@@ -250,7 +398,10 @@ class GaussianModel:
         dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
 
         elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1)
+        columns = [xyz, normals, f_dc, f_rest, opacities, scale, rotation]
+        if self.sh_degrees is not None:
+            columns.append(self.sh_degrees.cpu().numpy().astype(np.float32)[:, None])
+        attributes = np.concatenate(columns, axis=1)
         elements[:] = list(map(tuple, attributes))
         el = PlyElement.describe(elements, 'vertex')
         PlyData([el]).write(path)
@@ -260,14 +411,14 @@ class GaussianModel:
         optimizable_tensors = self.replace_tensor_to_optimizer(opacities_new, "opacity")
         self._opacity = optimizable_tensors["opacity"]
 
-    def load_ply(self, path, use_train_test_exp = False):
+    def load_ply(self, path, use_train_test_exp = False, device = "cuda"):
         plydata = PlyData.read(path)
         if use_train_test_exp:
             exposure_file = os.path.join(os.path.dirname(path), os.pardir, os.pardir, "exposure.json")
             if os.path.exists(exposure_file):
                 with open(exposure_file, "r") as f:
                     exposures = json.load(f)
-                self.pretrained_exposures = {image_name: torch.FloatTensor(exposures[image_name]).requires_grad_(False).cuda() for image_name in exposures}
+                self.pretrained_exposures = {image_name: torch.FloatTensor(exposures[image_name]).requires_grad_(False).to(device) for image_name in exposures}
                 print(f"Pretrained exposures loaded.")
             else:
                 print(f"No exposure to be loaded at {exposure_file}")
@@ -304,14 +455,39 @@ class GaussianModel:
         for idx, attr_name in enumerate(rot_names):
             rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
 
-        self._xyz = nn.Parameter(torch.tensor(xyz, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._features_dc = nn.Parameter(torch.tensor(features_dc, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(True))
-        self._features_rest = nn.Parameter(torch.tensor(features_extra, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(True))
-        self._opacity = nn.Parameter(torch.tensor(opacities, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._scaling = nn.Parameter(torch.tensor(scales, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._rotation = nn.Parameter(torch.tensor(rots, dtype=torch.float, device="cuda").requires_grad_(True))
+        self._xyz = nn.Parameter(torch.tensor(xyz, dtype=torch.float, device=device).requires_grad_(True))
+        self._features_dc = nn.Parameter(torch.tensor(features_dc, dtype=torch.float, device=device).transpose(1, 2).contiguous().requires_grad_(True))
+        self._features_rest = nn.Parameter(torch.tensor(features_extra, dtype=torch.float, device=device).transpose(1, 2).contiguous().requires_grad_(True))
+        self._opacity = nn.Parameter(torch.tensor(opacities, dtype=torch.float, device=device).requires_grad_(True))
+        self._scaling = nn.Parameter(torch.tensor(scales, dtype=torch.float, device=device).requires_grad_(True))
+        self._rotation = nn.Parameter(torch.tensor(rots, dtype=torch.float, device=device).requires_grad_(True))
 
         self.active_sh_degree = self.max_sh_degree
+        self.sh_degrees = None
+        if "sh_degree" in [p.name for p in plydata.elements[0].properties]:
+            self.sh_degrees = torch.tensor(np.asarray(plydata.elements[0]["sh_degree"]), dtype=torch.uint8, device=device)
+
+    def load_compressed(self, path, device = "cuda"):
+        """Loads a model written by utils.compression, decoding straight into the parameter tensors."""
+        header, attributes = load_compressed(path)
+        assert header["max_sh_degree"] == self.max_sh_degree
+
+        self._xyz = nn.Parameter(torch.tensor(attributes["xyz"], dtype=torch.float, device=device).requires_grad_(True))
+        self._features_dc = nn.Parameter(torch.tensor(attributes["f_dc"], dtype=torch.float, device=device).requires_grad_(True))
+        self._features_rest = nn.Parameter(torch.tensor(attributes["f_rest"], dtype=torch.float, device=device).requires_grad_(True))
+        self._opacity = nn.Parameter(torch.tensor(attributes["opacity"], dtype=torch.float, device=device).requires_grad_(True))
+        self._scaling = nn.Parameter(torch.tensor(attributes["scaling"], dtype=torch.float, device=device).requires_grad_(True))
+        self._rotation = nn.Parameter(torch.tensor(attributes["rotation"], dtype=torch.float, device=device).requires_grad_(True))
+        self.sh_codebook = None
+        self.sh_indices = None
+        if attributes["f_rest_codebook"] is not None:
+            self.sh_codebook = nn.Parameter(torch.tensor(attributes["f_rest_codebook"], dtype=torch.float, device=device).requires_grad_(True))
+            self.sh_indices = torch.tensor(attributes["f_rest_index"].astype(np.int32), device=device)
+        self.sh_degrees = None
+        if attributes["sh_degree"] is not None:
+            self.sh_degrees = torch.tensor(attributes["sh_degree"], dtype=torch.uint8, device=device)
+        self.pretrained_exposures = None
+        self.active_sh_degree = self.max_sh_degree
 
     def replace_tensor_to_optimizer(self, tensor, name):
         optimizable_tensors = {}
@@ -362,6 +538,12 @@ class GaussianModel:
         self.denom = self.denom[valid_points_mask]
         self.max_radii2D = self.max_radii2D[valid_points_mask]
         self.tmp_radii = self.tmp_radii[valid_points_mask]
+        if self.sh_degrees is not None:
+            self.sh_degrees = self.sh_degrees[valid_points_mask]
+        if self.sh_indices is not None:
+            self.sh_indices = self.sh_indices[valid_points_mask]
+        if self.spatial_index is not None:
+            self.spatial_index.update(self._xyz, self.spatial_extents(), keep_mask=valid_points_mask)
 
     def cat_tensors_to_optimizer(self, tensors_dict):
         optimizable_tensors = {}
@@ -385,7 +567,7 @@ class GaussianModel:
 
         return optimizable_tensors
 
-    def densification_postfix(self, new_xyz, new_features_dc, new_features_rest, new_opacities, new_scaling, new_rotation, new_tmp_radii):
+    def densification_postfix(self, new_xyz, new_features_dc, new_features_rest, new_opacities, new_scaling, new_rotation, new_tmp_radii, new_sh_degrees=None, new_sh_indices=None):
         d = {"xyz": new_xyz,
         "f_dc": new_features_dc,
         "f_rest": new_features_rest,
@@ -402,21 +584,33 @@ class GaussianModel:
         self._rotation = optimizable_tensors["rotation"]
 
         self.tmp_radii = torch.cat((self.tmp_radii, new_tmp_radii))
-        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
-        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
+        if self.sh_degrees is not None:
+            # New Gaussians keep the SH degree of the one they were split or cloned from
+            if new_sh_degrees is None:
+                new_sh_degrees = torch.full((new_xyz.shape[0],), self.max_sh_degree, dtype=torch.uint8, device=self.sh_degrees.device)
+            self.sh_degrees = torch.cat((self.sh_degrees, new_sh_degrees))
+        if self.sh_indices is not None:
+            # In codebook mode they also keep its codebook entry
+            if new_sh_indices is None:
+                raise ValueError("Densification in codebook mode needs the codebook indices of the new Gaussians")
+            self.sh_indices = torch.cat((self.sh_indices, new_sh_indices))
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device=self._xyz.device)
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device=self._xyz.device)
+        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device=self._xyz.device)
+        if self.spatial_index is not None:
+            self.spatial_index.update(self._xyz, self.spatial_extents())
 
     def densify_and_split(self, grads, grad_threshold, scene_extent, N=2):
         n_init_points = self.get_xyz.shape[0]
         # Extract points that satisfy the gradient condition
-        padded_grad = torch.zeros((n_init_points), device="cuda")
+        padded_grad = torch.zeros((n_init_points), device=self._xyz.device)
         padded_grad[:grads.shape[0]] = grads.squeeze()
         selected_pts_mask = torch.where(padded_grad >= grad_threshold, True, False)
         selected_pts_mask = torch.logical_and(selected_pts_mask,
                                               torch.max(self.get_scaling, dim=1).values > self.percent_dense*scene_extent)
 
         stds = self.get_scaling[selected_pts_mask].repeat(N,1)
-        means =torch.zeros((stds.size(0), 3),device="cuda")
+        means =torch.zeros((stds.size(0), 3),device=self._xyz.device)
         samples = torch.normal(mean=means, std=stds)
         rots = build_rotation(self._rotation[selected_pts_mask]).repeat(N,1,1)
         new_xyz = torch.bmm(rots, samples.unsqueeze(-1)).squeeze(-1) + self.get_xyz[selected_pts_mask].repeat(N, 1)
@@ -426,10 +620,12 @@ class GaussianModel:
         new_features_rest = self._features_rest[selected_pts_mask].repeat(N,1,1)
         new_opacity = self._opacity[selected_pts_mask].repeat(N,1)
         new_tmp_radii = self.tmp_radii[selected_pts_mask].repeat(N)
+        new_sh_degrees = self.sh_degrees[selected_pts_mask].repeat(N) if self.sh_degrees is not None else None
+        new_sh_indices = self.sh_indices[selected_pts_mask].repeat(N) if self.sh_indices is not None else None
 
-        self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacity, new_scaling, new_rotation, new_tmp_radii)
+        self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacity, new_scaling, new_rotation, new_tmp_radii, new_sh_degrees, new_sh_indices)
 
-        prune_filter = torch.cat((selected_pts_mask, torch.zeros(N * selected_pts_mask.sum(), device="cuda", dtype=bool)))
+        prune_filter = torch.cat((selected_pts_mask, torch.zeros(N * selected_pts_mask.sum(), device=self._xyz.device, dtype=bool)))
         self.prune_points(prune_filter)
 
     def densify_and_clone(self, grads, grad_threshold, scene_extent):
@@ -446,8 +642,10 @@ class GaussianModel:
         new_rotation = self._rotation[selected_pts_mask]
 
         new_tmp_radii = self.tmp_radii[selected_pts_mask]
+        new_sh_degrees = self.sh_degrees[selected_pts_mask] if self.sh_degrees is not None else None
+        new_sh_indices = self.sh_indices[selected_pts_mask] if self.sh_indices is not None else None
 
-        self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacities, new_scaling, new_rotation, new_tmp_radii)
+        self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacities, new_scaling, new_rotation, new_tmp_radii, new_sh_degrees, new_sh_indices)
 
     def densify_and_prune(self, max_grad, min_opacity, extent, max_screen_size, radii):
         grads = self.xyz_gradient_accum / self.denom
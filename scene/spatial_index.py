@@ -0,0 +1,220 @@
+import torch
+
+MORTON_BITS = 21
+
+
+def _spread_bits(v):
+    """Inserts two zero bits between each of the lower 21 bits of v (int64)."""
+    v = v & 0x1fffff
+    v = (v | (v << 32)) & 0x1f00000000ffff
+    v = (v | (v << 16)) & 0x1f0000ff0000ff
+    v = (v | (v << 8)) & 0x100f00f00f00f00f
+    v = (v | (v << 4)) & 0x10c30c30c30c30c3
+    v = (v | (v << 2)) & 0x1249249249249249
+    return v
+
+
+def morton_codes(cells):
+    """(N, 3) non-negative int64 cell coordinates -> (N,) interleaved Morton codes."""
+    return _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << 1) | (_spread_bits(cells[:, 2]) << 2)
+
+
+def frustum_planes(camera, margin=1.3):
+    """
+    (6, 4) inward-facing planes of the view frustum from full_proj_transform.
+    margin widens the side planes like the rasterizer's NDC culling.
+    """
+    M = camera.full_proj_transform.T
+    return torch.stack([
+        margin * M[3] + M[0], margin * M[3] - M[0],
+        margin * M[3] + M[1], margin * M[3] - M[1],
+        M[2], M[3] - M[2],
+    ])
+
+
+def _merge_sorted(keys_a, values_a, keys_b, values_b):
+    """Merges two sorted key arrays (and their payloads) without re-sorting the larger one."""
+    rank_a = torch.arange(keys_a.shape[0], device=keys_a.device) + torch.searchsorted(keys_b, keys_a, right=True)
+    rank_b = torch.arange(keys_b.shape[0], device=keys_b.device) + torch.searchsorted(keys_a, keys_b)
+    keys = torch.empty(keys_a.shape[0] + keys_b.shape[0], dtype=keys_a.dtype, device=keys_a.device)
+    values = torch.empty(keys.shape[0], dtype=values_a.dtype, device=values_a.device)
+    keys[rank_a], values[rank_a] = keys_a, values_a
+    keys[rank_b], values[rank_b] = keys_b, values_b
+    return keys, values
+
+
+class SpatialIndex:
+    """
+    Uniform grid over Gaussian centers, stored as a Morton-sorted point list.
+
+    Every occupied cell knows its point range in the sorted list and the
+    bounding box of its Gaussians including their extents, so frustum and box
+    queries test cells first and points only inside overlapping cells. Pure
+    torch, runs wherever xyz lives (CPU or GPU).
+    """
+
+    def __init__(self, xyz, extents=None, cell_size=None, points_per_cell=16):
+        xyz = xyz.detach()
+        self.device = xyz.device
+        lo = xyz.min(dim=0).values
+        hi = xyz.max(dim=0).values
+        if cell_size is None:
+            # Cells of about points_per_cell points if the points filled the bounding box
+            volume = (hi - lo).clamp_min(1e-6).prod().item()
+            cell_size = (volume * points_per_cell / max(xyz.shape[0], 1)) ** (1.0 / 3.0)
+        self.cell_size = float(cell_size)
+        self.origin = lo
+        self.codes = None
+        self.order = None
+        self.rebuild(xyz, extents)
+
+    def cell_coords(self, xyz):
+        cells = torch.floor((xyz - self.origin) / self.cell_size).long()
+        # Points that moved outside the original bounds share the border cells
+        return cells.clamp(0, (1 << MORTON_BITS) - 1)
+
+    def rebuild(self, xyz, extents=None):
+        """Full rebuild: Morton codes of all points and one sort."""
+        xyz = xyz.detach()
+        codes = morton_codes(self.cell_coords(xyz))
+        self.codes, self.order = torch.sort(codes)
+        self._finish(xyz, extents)
+
+    def update(self, xyz, extents=None, keep_mask=None):
+        """
+        Incremental update after densification: keep_mask marks the old points
+        that survived pruning (in their old order), points beyond them in xyz
+        are new. Only new points and points that changed cell are re-inserted
+        into the sorted list; everything else keeps its position.
+        """
+        xyz = xyz.detach()
+        old_count = self.order.shape[0]
+        if keep_mask is None:
+            keep_mask = torch.ones(old_count, dtype=torch.bool, device=self.device)
+        # Old index -> new index of the surviving points
+        remap = torch.full((old_count,), -1, dtype=torch.long, device=self.device)
+        remap[keep_mask] = torch.arange(int(keep_mask.sum()), device=self.device)
+
+        codes = morton_codes(self.cell_coords(xyz))
+        sorted_new_index = remap[self.order]
+        survived = sorted_new_index >= 0
+        sorted_new_index = sorted_new_index[survived]
+        stale = self.codes[survived]
+        unchanged = codes[sorted_new_index] == stale
+        kept_codes, kept_index = stale[unchanged], sorted_new_index[unchanged]
+
+        reinsert = torch.ones(xyz.shape[0], dtype=torch.bool, device=self.device)
+        reinsert[kept_index] = False
+        moved_index = reinsert.nonzero()[:, 0]
+        moved_codes, perm = torch.sort(codes[moved_index])
+        self.codes, self.order = _merge_sorted(kept_codes, kept_index, moved_codes, moved_index[perm])
+        self._finish(xyz, extents)
+        return moved_index.shape[0]
+
+    def _finish(self, xyz, extents):
+        self.num_points = xyz.shape[0]
+        self.cell_codes, self.cell_counts = torch.unique_consecutive(self.codes, return_counts=True)
+        self.cell_starts = torch.cumsum(self.cell_counts, dim=0) - self.cell_counts
+        cell_of_point = torch.repeat_interleave(torch.arange(self.cell_codes.shape[0], device=self.device), self.cell_counts)
+        sorted_xyz = xyz[self.order]
+        pad = extents.detach()[self.order].reshape(-1, 1) if extents is not None else torch.zeros_like(sorted_xyz[:, :1])
+        self.cell_lo = torch.full((self.cell_codes.shape[0], 3), float("inf"), device=self.device)
+        self.cell_hi = torch.full((self.cell_codes.shape[0], 3), float("-inf"), device=self.device)
+        index = cell_of_point[:, None].expand(-1, 3)
+        self.cell_lo.scatter_reduce_(0, index, sorted_xyz - pad, reduce="amin")
+        self.cell_hi.scatter_reduce_(0, index, sorted_xyz + pad, reduce="amax")
+        self.sorted_xyz = sorted_xyz
+        self.xyz = xyz
+
+    def _points_of_cells(self, cell_mask):
+        """Positions in the sorted point list of all points in the selected cells."""
+        counts = self.cell_counts[cell_mask]
+        if counts.numel() == 0:
+            return torch.empty(0, dtype=torch.long, device=self.device)
+        starts = self.cell_starts[cell_mask]
+        offsets = torch.arange(int(counts.sum()), device=self.device) - torch.repeat_interleave(torch.cumsum(counts, 0) - counts, counts)
+        return torch.repeat_interleave(starts, counts) + offsets
+
+    def frustum_query(self, camera, margin=1.3):
+        """Indices of the Gaussians whose cell box intersects the camera frustum."""
+        planes = frustum_planes(camera, margin).to(self.device)
+        # Corner of every cell box furthest along each plane normal
+        corner = torch.where(planes[None, :, :3] >= 0, self.cell_hi[:, None, :], self.cell_lo[:, None, :])
+        inside = ((corner * planes[None, :, :3]).sum(dim=2) + planes[None, :, 3] >= 0).all(dim=1)
+        return self.order[self._points_of_cells(inside)]
+
+    def box_query(self, lo, hi):
+        """Indices of the Gaussian centers inside the axis-aligned box [lo, hi]."""
+        lo = torch.as_tensor(lo, dtype=torch.float32, device=self.device)
+        hi = torch.as_tensor(hi, dtype=torch.float32, device=self.device)
+        overlap = ((self.cell_hi >= lo) & (self.cell_lo <= hi)).all(dim=1)
+        sorted_index = self._points_of_cells(overlap)
+        points = self.sorted_xyz[sorted_index]
+        inside = ((points >= lo) & (points <= hi)).all(dim=1)
+        return self.order[sorted_index[inside]]
+
+    def sphere_query(self, center, radius):
+        """Indices of the Gaussian centers within radius of center."""
+        center = torch.as_tensor(center, dtype=torch.float32, device=self.device)
+        index = self.box_query(center - radius, center + radius)
+        return index[(self.xyz[index] - center).norm(dim=1) <= radius]
+
+    def knn(self, queries, k, max_per_cell=64, chunk_size=16384, exclude_self=False, return_exact=False):
+        """
+        k nearest Gaussian centers of every query among the 27 cells around it.
+        Returns (distances, indices), (Q, k) each, padded with inf / -1 where
+        the neighbourhood holds fewer than k points. Cells with more than
+        max_per_cell points are only partially searched. With exclude_self the
+        queries are assumed to be the indexed points themselves and a zero
+        distance match to itself is skipped. With return_exact a third (Q,)
+        mask tells which rows are guaranteed exact: all k found, no truncated
+        cell, and the k-th distance within the searched block.
+        """
+        queries = queries.detach().to(self.device)
+        # Dense table: the first max_per_cell sorted positions of every cell, -1 padded
+        slots = torch.arange(max_per_cell, device=self.device)
+        table = self.cell_starts[:, None] + slots[None, :]
+        table = torch.where(slots[None, :] < self.cell_counts[:, None], table, torch.full_like(table, -1))
+        offsets = torch.stack(torch.meshgrid(*[torch.arange(-1, 2, device=self.device)] * 3, indexing="ij"), dim=-1).reshape(-1, 3)
+
+        distances = torch.full((queries.shape[0], k), float("inf"), device=self.device)
+        indices = torch.full((queries.shape[0], k), -1, dtype=torch.long, device=self.device)
+        exact = torch.zeros(queries.shape[0], dtype=torch.bool, device=self.device)
+        extra = 1 if exclude_self else 0
+        for start in range(0, queries.shape[0], chunk_size):
+            q = queries[start:start + chunk_size]
+            home = self.cell_coords(q)
+            cells = home[:, None, :] + offsets[None, :, :]
+            in_range = ((cells >= 0) & (cells < (1 << MORTON_BITS))).all(dim=2)
+            codes = morton_codes(cells.clamp(0, (1 << MORTON_BITS) - 1).reshape(-1, 3)).reshape(q.shape[0], -1)
+            slot = torch.searchsorted(self.cell_codes, codes).clamp(max=self.cell_codes.shape[0] - 1)
+            found = (self.cell_codes[slot] == codes) & in_range
+            cell_table = table[slot]
+            candidates = torch.where(found[:, :, None], cell_table, torch.full_like(cell_table, -1)).reshape(q.shape[0], -1)
+            valid = candidates >= 0
+            points = self.sorted_xyz[candidates.clamp_min(0)]
+            d = torch.where(valid, (points - q[:, None, :]).norm(dim=2), torch.full_like(valid, float("inf"), dtype=q.dtype))
+            kk = min(k + extra, d.shape[1])
+            best, arg = torch.topk(d, kk, dim=1, largest=False)
+            best_index = torch.gather(candidates, 1, arg)
+            if exclude_self:
+                best, best_index = best[:, 1:], best_index[:, 1:]
+            n = best.shape[1]
+            distances[start:start + chunk_size, :n] = best
+            indices[start:start + chunk_size, :n] = torch.where(torch.isfinite(best), self.order[best_index.clamp_min(0)], torch.full_like(best_index, -1))
+            if return_exact and n == k:
+                truncated = (found & (self.cell_counts[slot] > max_per_cell)).any(dim=1)
+                # Distance from the query to the outside of its 3x3x3 block of cells
+                frac = (q - self.origin) / self.cell_size - home
+                wall = (torch.minimum(frac, 1.0 - frac).min(dim=1).values + 1.0) * self.cell_size
+                exact[start:start + chunk_size] = ~truncated & (best[:, -1] <= wall)
+        if return_exact:
+            return distances, indices, exact
+        return distances, indices
+
+
+def crop_model(gaussians, lo=None, hi=None, center=None, radius=None, index=None):
+    """The part of a GaussianModel inside a box or sphere, e.g. only the head region."""
+    index = index or SpatialIndex(gaussians.get_xyz)
+    selected = index.sphere_query(center, radius) if center is not None else index.box_query(lo, hi)
+    return gaussians.subset(torch.sort(selected).values)
@@ -11,19 +11,24 @@
 
 import os
 os.environ["TORCHDYNAMO_DISABLE"] = "1"
+import time
 import wandb
 import torch
 import torch.nn.functional as F
 
 from random import randint
+from contextlib import nullcontext
 from utils.loss_utils import l1_loss, ssim
 from gaussian_renderer import render, network_gui
+from gaussian_renderer.viewer_server import ViewerServer
 import sys
 from scene import Scene, GaussianModel
 from utils.general_utils import safe_state, get_expon_lr_func
 import uuid
 from tqdm import tqdm
 from utils.image_utils import psnr
+from utils.eval_utils import EvalScheduler
+from utils.profiling_utils import StageTimer, make_torch_profiler
 from argparse import ArgumentParser, Namespace
 from arguments import ModelParams, PipelineParams, OptimizationParams
 try:
@@ -44,7 +49,7 @@ try:
 except:
     SPARSE_ADAM_AVAILABLE = False
 
-def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from):
+def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, eval_args=None, profile_args=None, viewer_args=None):
 
     if not SPARSE_ADAM_AVAILABLE and opt.optimizer_type == "sparse_adam":
         sys.exit(f"Trying to use sparse adam but it is not installed, please install the correct rasterizer using pip install [3dgs_accel].")
@@ -61,6 +66,26 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
     bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
     background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
 
+    eval_scheduler = EvalScheduler(scene, **(eval_args or {}))
+
+    profile_args = profile_args or {"enabled": False}
+    stage_timer = StageTimer(profile_args["enabled"], chrome_trace_path=profile_args.get("chrome_trace"))
+    torch_profiler = None
+    if profile_args.get("torch_profiler"):
+        torch_profiler = make_torch_profiler(os.path.join(scene.model_path, "torch_profiler"))
+        torch_profiler.start()
+
+    viewer = None
+    if viewer_args is not None:
+        lod_cameras = None
+        if viewer_args.get("target_ms", 0) > 0:
+            # A handful of training views is enough to rank the Gaussians for the viewer's LOD
+            train_cams = scene.getTrainCameras()
+            lod_cameras = train_cams[::max(1, len(train_cams) // 8)][:8]
+        viewer = ViewerServer(viewer_args["ip"], viewer_args["port"], render, pipe, background, dataset.source_path,
+                              max_fps=viewer_args["max_fps"], lod_cameras=lod_cameras, target_ms=viewer_args.get("target_ms", 0),
+                              separate_sh=SPARSE_ADAM_AVAILABLE, use_trained_exp=dataset.train_test_exp)
+
     iter_start = torch.cuda.Event(enable_timing = True)
     iter_end = torch.cuda.Event(enable_timing = True)
 
@@ -75,144 +100,178 @@ def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoi
     progress_bar = tqdm(range(first_iter, opt.iterations), desc="Training progress")
     first_iter += 1
     for iteration in range(first_iter, opt.iterations + 1):
-        if network_gui.conn == None:
-            network_gui.try_connect()
-        while network_gui.conn != None:
-            try:
-                net_image_bytes = None
-                custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
-                if custom_cam != None:
-                    net_image = render(custom_cam, gaussians, pipe, background, scaling_modifier=scaling_modifer, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)["render"]
-                    net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
-                network_gui.send(net_image_bytes, dataset.source_path)
-                if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
-                    break
-            except Exception as e:
-                network_gui.conn = None
+        with stage_timer.scope("viewer"):
+            if viewer is not None:
+                viewer.update_snapshot(gaussians)
+                viewer.wait_while_paused(gaussians)
+            else:
+                if network_gui.conn == None:
+                    network_gui.try_connect()
+                while network_gui.conn != None:
+                    try:
+                        net_image_bytes = None
+                        custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
+                        if custom_cam != None:
+                            net_image = render(custom_cam, gaussians, pipe, background, scaling_modifier=scaling_modifer, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)["render"]
+                            net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
+                        network_gui.send(net_image_bytes, dataset.source_path)
+                        if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
+                            break
+                    except Exception as e:
+                        network_gui.conn = None
 
         iter_start.record()
 
-        gaussians.update_learning_rate(iteration)
+        with stage_timer.scope("data"):
+            gaussians.update_learning_rate(iteration)
 
-        # Every 1000 its we increase the levels of SH up to a maximum degree
-        if iteration % 1000 == 0:
-            gaussians.oneupSHdegree()
+            # Every 1000 its we increase the levels of SH up to a maximum degree
+            if iteration % 1000 == 0:
+                gaussians.oneupSHdegree()
 
-        # Pick a random Camera
-        if not viewpoint_stack:
-            viewpoint_stack = scene.getTrainCameras().copy()
-            viewpoint_indices = list(range(len(viewpoint_stack)))
-        rand_idx = randint(0, len(viewpoint_indices) - 1)
-        viewpoint_cam = viewpoint_stack.pop(rand_idx)
-        vind = viewpoint_indices.pop(rand_idx)
+            # Pick a random Camera
+            if not viewpoint_stack:
+                viewpoint_stack = scene.getTrainCameras().copy()
+                viewpoint_indices = list(range(len(viewpoint_stack)))
+            rand_idx = randint(0, len(viewpoint_indices) - 1)
+            viewpoint_cam = viewpoint_stack.pop(rand_idx)
+            vind = viewpoint_indices.pop(rand_idx)
 
         # Render
         if (iteration - 1) == debug_from:
             pipe.debug = True
 
-        bg = torch.rand((3), device="cuda") if opt.random_background else background
+        with stage_timer.scope("render"):
+            bg = torch.rand((3), device="cuda") if opt.random_background else background
 
-        render_pkg = render(viewpoint_cam, gaussians, pipe, bg, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)
-        image, viewspace_point_tensor, visibility_filter, radii = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"]
+            render_pkg = render(viewpoint_cam, gaussians, pipe, bg, use_trained_exp=dataset.train_test_exp, separate_sh=SPARSE_ADAM_AVAILABLE)
+            image, viewspace_point_tensor, visibility_filter, radii = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"]
 
-        if viewpoint_cam.alpha_mask is not None:
-            alpha_mask = viewpoint_cam.alpha_mask.cuda()
-            image *= alpha_mask
+            if viewpoint_cam.alpha_mask is not None:
+                alpha_mask = viewpoint_cam.alpha_mask.cuda()
+                image *= alpha_mask
 
-        if hasattr(viewpoint_cam, "face_mask") and viewpoint_cam.face_mask is not None:
-            mask = viewpoint_cam.face_mask.to(image.device)
-            mask = mask.unsqueeze(0).unsqueeze(0)
-            mask = F.interpolate(mask, size=image.shape[-2:], mode="nearest")
-            weight_map = 1.0 + mask * (args.face_weight - 1.0)
-        else:
-            weight_map = None
+        with stage_timer.scope("loss"):
+            if hasattr(viewpoint_cam, "face_mask") and viewpoint_cam.face_mask is not None:
+                mask = viewpoint_cam.face_mask.to(image.device)
+                mask = mask.unsqueeze(0).unsqueeze(0)
+                mask = F.interpolate(mask, size=image.shape[-2:], mode="nearest")
+                weight_map = 1.0 + mask * (args.face_weight - 1.0)
+            else:
+                weight_map = None
 
-        # Loss
-        gt_image = viewpoint_cam.original_image.cuda()
+            # Loss
+            gt_image = viewpoint_cam.original_image.cuda()
 
-        if weight_map is not None:
-            Ll1 = (torch.abs(image - gt_image) * weight_map.repeat(1, 3, 1, 1)).mean()
-        else:
-            Ll1 = l1_loss(image, gt_image)
+            if weight_map is not None:
+                Ll1 = (torch.abs(image - gt_image) * weight_map.repeat(1, 3, 1, 1)).mean()
+            else:
+                Ll1 = l1_loss(image, gt_image)
 
-        if FUSED_SSIM_AVAILABLE:
-            ssim_value = fused_ssim(image.unsqueeze(0), gt_image.unsqueeze(0))
-        else:
-            ssim_value = ssim(image, gt_image)
+            if FUSED_SSIM_AVAILABLE:
+                ssim_value = fused_ssim(image.unsqueeze(0), gt_image.unsqueeze(0))
+            else:
+                ssim_value = ssim(image, gt_image)
 
-        loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim_value)
+            loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim_value)
 
         # wandb log
-        wandb.log({"total_loss": loss.item(),
-                   "rgb_l1": Ll1.item(),
-                   "ssim_loss": (1.0 - ssim_value).item() if torch.is_tensor(ssim_value) else float(1.0 - ssim_value),
-                   "depth_l1": Ll1depth_pure if 'Ll1depth_pure' in locals() else 0.0
-                   })
+        with stage_timer.scope("wandb"):
+            wandb.log({"total_loss": loss.item(),
+                       "rgb_l1": Ll1.item(),
+                       "ssim_loss": (1.0 - ssim_value).item() if torch.is_tensor(ssim_value) else float(1.0 - ssim_value),
+                       "depth_l1": Ll1depth_pure if 'Ll1depth_pure' in locals() else 0.0
+                       })
 
 
         # Depth regularization
-        Ll1depth_pure = 0.0
-        if depth_l1_weight(iteration) > 0 and viewpoint_cam.depth_reliable:
-            invDepth = render_pkg["depth"]
-            mono_invdepth = viewpoint_cam.invdepthmap.cuda()
-            depth_mask = viewpoint_cam.depth_mask.cuda()
-
-            Ll1depth_pure = torch.abs((invDepth  - mono_invdepth) * depth_mask).mean()
-            Ll1depth = depth_l1_weight(iteration) * Ll1depth_pure 
-            loss += Ll1depth
-            Ll1depth = Ll1depth.item()
-        else:
-            Ll1depth = 0
-
-        loss.backward()
+        with stage_timer.scope("depth_loss"):
+            Ll1depth_pure = 0.0
+            if depth_l1_weight(iteration) > 0 and viewpoint_cam.depth_reliable:
+                invDepth = render_pkg["depth"]
+                mono_invdepth = viewpoint_cam.invdepthmap.cuda()
+                depth_mask = viewpoint_cam.depth_mask.cuda()
+
+                Ll1depth_pure = torch.abs((invDepth  - mono_invdepth) * depth_mask).mean()
+                Ll1depth = depth_l1_weight(iteration) * Ll1depth_pure 
+                loss += Ll1depth
+                Ll1depth = Ll1depth.item()
+            else:
+                Ll1depth = 0
+
+        with stage_timer.scope("backward"):
+            loss.backward()
 
         iter_end.record()
 
         with torch.no_grad():
-            # Progress bar
-            ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log
-            ema_Ll1depth_for_log = 0.4 * Ll1depth + 0.6 * ema_Ll1depth_for_log
-
-            if iteration % 10 == 0:
-                progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}", "Depth Loss": f"{ema_Ll1depth_for_log:.{7}f}"})
-                progress_bar.update(10)
-            if iteration == opt.iterations:
-                progress_bar.close()
-
-            # Log and save
-            training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render, (pipe, background, 1., SPARSE_ADAM_AVAILABLE, None, dataset.train_test_exp), dataset.train_test_exp)
-            if (iteration in saving_iterations):
-                print("\n[ITER {}] Saving Gaussians".format(iteration))
-                scene.save(iteration)
+            with stage_timer.scope("logging"):
+                # Progress bar
+                ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log
+                ema_Ll1depth_for_log = 0.4 * Ll1depth + 0.6 * ema_Ll1depth_for_log
+
+                if iteration % 10 == 0:
+                    progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}", "Depth Loss": f"{ema_Ll1depth_for_log:.{7}f}"})
+                    progress_bar.update(10)
+                if iteration == opt.iterations:
+                    progress_bar.close()
+
+                # Log and save
+                training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render, (pipe, background, 1., SPARSE_ADAM_AVAILABLE, None, dataset.train_test_exp), dataset.train_test_exp, eval_scheduler, stage_timer)
+
+            with stage_timer.scope("saving"):
+                if (iteration in saving_iterations):
+                    print("\n[ITER {}] Saving Gaussians".format(iteration))
+                    scene.save(iteration)
 
             # Densification
             if iteration < opt.densify_until_iter:
-                # Keep track of max radii in image-space for pruning
-                gaussians.max_radii2D[visibility_filter] = torch.max(gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
-                gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
-
-                if iteration > opt.densify_from_iter and iteration % opt.densification_interval == 0:
-                    size_threshold = 20 if iteration > opt.opacity_reset_interval else None
-                    gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold, radii)
-                
-                if iteration % opt.opacity_reset_interval == 0 or (dataset.white_background and iteration == opt.densify_from_iter):
-                    gaussians.reset_opacity()
+                with stage_timer.scope("densify_stats"):
+                    # Keep track of max radii in image-space for pruning
+                    gaussians.max_radii2D[visibility_filter] = torch.max(gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
+                    gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
+
+                with stage_timer.scope("densify_prune"):
+                    if iteration > opt.densify_from_iter and iteration % opt.densification_interval == 0:
+                        size_threshold = 20 if iteration > opt.opacity_reset_interval else None
+                        gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold, radii)
+                    
+                    if iteration % opt.opacity_reset_interval == 0 or (dataset.white_background and iteration == opt.densify_from_iter):
+                        gaussians.reset_opacity()
 
             # Optimizer step
-            if iteration < opt.iterations:
-                gaussians.exposure_optimizer.step()
-                gaussians.exposure_optimizer.zero_grad(set_to_none = True)
-                if use_sparse_adam:
-                    visible = radii > 0
-                    gaussians.optimizer.step(visible, radii.shape[0])
-                    gaussians.optimizer.zero_grad(set_to_none = True)
-                else:
-                    gaussians.optimizer.step()
-                    gaussians.optimizer.zero_grad(set_to_none = True)
-
-            if (iteration in checkpoint_iterations):
-                print("\n[ITER {}] Saving Checkpoint".format(iteration))
-                torch.save((gaussians.capture(), iteration), scene.model_path + "/chkpnt" + str(iteration) + ".pth")
+            with stage_timer.scope("optimizer"):
+                if iteration < opt.iterations:
+                    gaussians.exposure_optimizer.step()
+                    gaussians.exposure_optimizer.zero_grad(set_to_none = True)
+                    if use_sparse_adam:
+                        visible = radii > 0
+                        gaussians.optimizer.step(visible, radii.shape[0])
+                        gaussians.optimizer.zero_grad(set_to_none = True)
+                    else:
+                        gaussians.optimizer.step()
+                        gaussians.optimizer.zero_grad(set_to_none = True)
+
+            with stage_timer.scope("checkpoint"):
+                if (iteration in checkpoint_iterations):
+                    print("\n[ITER {}] Saving Checkpoint".format(iteration))
+                    torch.save((gaussians.capture(), iteration), scene.model_path + "/chkpnt" + str(iteration) + ".pth")
+
+        if torch_profiler is not None:
+            torch_profiler.step()
+        if stage_timer.enabled and (iteration % profile_args["interval"] == 0 or iteration == opt.iterations):
+            stage_timer.report(iteration, tb_writer, wandb.run, print_summary=True)
+
+    if torch_profiler is not None:
+        torch_profiler.stop()
+    stage_timer.export_chrome_trace()
+
+    if viewer is not None:
+        # Keep serving the final model while a viewer asks for it
+        viewer.update_snapshot(gaussians, force=True)
+        while viewer.has_clients and viewer.keep_alive:
+            time.sleep(0.1)
+        viewer.close()
 
 def prepare_output_and_logger(args):    
     if not args.model_path:
@@ -236,7 +295,7 @@ def prepare_output_and_logger(args):
         print("Tensorboard not available: not logging progress")
     return tb_writer
 
-def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_iterations, scene : Scene, renderFunc, renderArgs, train_test_exp):
+def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_iterations, scene : Scene, renderFunc, renderArgs, train_test_exp, eval_scheduler : EvalScheduler = None, stage_timer : StageTimer = None):
     if tb_writer:
         tb_writer.add_scalar('train_loss_patches/l1_loss', Ll1.item(), iteration)
         tb_writer.add_scalar('train_loss_patches/total_loss', loss.item(), iteration)
@@ -244,41 +303,31 @@ def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_i
 
     # Report test and samples of training set
     if iteration in testing_iterations:
-        torch.cuda.empty_cache()
-        validation_configs = ({'name': 'test', 'cameras' : scene.getTestCameras()}, 
-                              {'name': 'train', 'cameras' : [scene.getTrainCameras()[idx % len(scene.getTrainCameras())] for idx in range(5, 30, 5)]})
-
-        for config in validation_configs:
-            if config['cameras'] and len(config['cameras']) > 0:
-                l1_test = 0.0
-                psnr_test = 0.0
-                for idx, viewpoint in enumerate(config['cameras']):
-                    image = torch.clamp(renderFunc(viewpoint, scene.gaussians, *renderArgs)["render"], 0.0, 1.0)
-                    gt_image = torch.clamp(viewpoint.original_image.to("cuda"), 0.0, 1.0)
-                    if train_test_exp:
-                        image = image[..., image.shape[-1] // 2:]
-                        gt_image = gt_image[..., gt_image.shape[-1] // 2:]
-                    if tb_writer and (idx < 5):
-                        tb_writer.add_images(config['name'] + "_view_{}/render".format(viewpoint.image_name), image[None], global_step=iteration)
-                        if iteration == testing_iterations[0]:
-                            tb_writer.add_images(config['name'] + "_view_{}/ground_truth".format(viewpoint.image_name), gt_image[None], global_step=iteration)
-                    l1_test += l1_loss(image, gt_image).mean().double()
-                    psnr_test += psnr(image, gt_image).mean().double()
-                psnr_test /= len(config['cameras'])
-                l1_test /= len(config['cameras'])          
-                print("\n[ITER {}] Evaluating {}: L1 {} PSNR {}".format(iteration, config['name'], l1_test, psnr_test))
-                if tb_writer:
-                    tb_writer.add_scalar(config['name'] + '/loss_viewpoint - l1_loss', l1_test, iteration)
-                    tb_writer.add_scalar(config['name'] + '/loss_viewpoint - psnr', psnr_test, iteration)
-                wandb.log({
-                    f"{config['name']}_l1_loss": l1_test.item(),
-                    f"{config['name']}_psnr": psnr_test.item(),
-                }, step=iteration)
+        if eval_scheduler is None:
+            eval_scheduler = EvalScheduler(scene)
+        with (stage_timer.scope("eval") if stage_timer else nullcontext()):
+            results, eval_time = eval_scheduler.evaluate(renderFunc, renderArgs, train_test_exp)
+
+        for name, (l1_test, psnr_test, samples) in results.items():
+            if tb_writer:
+                for image_name, image, gt_image in samples:
+                    tb_writer.add_images(name + "_view_{}/render".format(image_name), image[None], global_step=iteration)
+                    if iteration == testing_iterations[0]:
+                        tb_writer.add_images(name + "_view_{}/ground_truth".format(image_name), gt_image[None], global_step=iteration)
+            print("\n[ITER {}] Evaluating {}: L1 {} PSNR {}".format(iteration, name, l1_test, psnr_test))
+            if tb_writer:
+                tb_writer.add_scalar(name + '/loss_viewpoint - l1_loss', l1_test, iteration)
+                tb_writer.add_scalar(name + '/loss_viewpoint - psnr', psnr_test, iteration)
+            wandb.log({
+                f"{name}_l1_loss": l1_test,
+                f"{name}_psnr": psnr_test,
+            }, step=iteration)
 
         if tb_writer:
+            tb_writer.add_scalar('eval_time', eval_time, iteration)
             tb_writer.add_histogram("scene/opacity_histogram", scene.gaussians.get_opacity, iteration)
             tb_writer.add_scalar('total_points', scene.gaussians.get_xyz.shape[0], iteration)
-        torch.cuda.empty_cache()
+        wandb.log({"eval_time": eval_time}, step=iteration)
 
 
 
@@ -296,12 +345,29 @@ if __name__ == "__main__":
     parser.add_argument("--save_iterations", nargs="+", type=int, default=[7_000, 30_000])
     parser.add_argument("--quiet", action="store_true")
     parser.add_argument('--disable_viewer', action='store_true', default=False)
+    parser.add_argument('--viewer_blocking', action='store_true', default=False,
+                        help="Use the old single-client viewer that renders inside the training loop")
+    parser.add_argument('--viewer_max_fps', type=float, default=15.0)
+    parser.add_argument('--viewer_target_ms', type=float, default=0.0,
+                        help="Render time the viewer holds by switching LOD levels (0 = always full detail)")
     parser.add_argument("--checkpoint_iterations", nargs="+", type=int, default=[])
     parser.add_argument("--start_checkpoint", type=str, default = None)
     parser.add_argument("--mask_folder", type=str, default=None,
                         help="Pfad zu binären Gesichtsmasken")
     parser.add_argument("--face_weight", type=float, default=10.0,
                         help="Gewichtungsfaktor für Pixel innerhalb der Maske")
+    parser.add_argument("--eval_resolution_scale", type=float, default=1.0,
+                        help="Downscale factor for evaluation renders (1.0 = full resolution)")
+    parser.add_argument("--eval_subset", type=int, default=0,
+                        help="Evaluate a rotating subset of this many test views (0 = all)")
+    parser.add_argument("--profile_stages", action="store_true", default=False,
+                        help="Time each stage of the training iteration")
+    parser.add_argument("--profile_interval", type=int, default=500,
+                        help="Iterations between stage timing summaries")
+    parser.add_argument("--chrome_trace", type=str, default=None,
+                        help="Write the stage timings as a Chrome trace to this path")
+    parser.add_argument("--torch_profiler", action="store_true", default=False,
+                        help="Record a torch.profiler trace into <model_path>/torch_profiler")
 
     args = parser.parse_args(sys.argv[1:])
     args.save_iterations.append(args.iterations)
@@ -312,13 +378,21 @@ if __name__ == "__main__":
     safe_state(args.quiet)
 
     # Start GUI server, configure and run training
+    viewer_args = None
     if not args.disable_viewer:
-        network_gui.init(args.ip, args.port)
+        if args.viewer_blocking:
+            network_gui.init(args.ip, args.port)
+        else:
+            viewer_args = dict(ip=args.ip, port=args.port, max_fps=args.viewer_max_fps, target_ms=args.viewer_target_ms)
     torch.autograd.set_detect_anomaly(args.detect_anomaly)
     dataset_params = lp.extract(args)  # war vorher lp.extract(args)
     setattr(dataset_params, "mask_folder", args.mask_folder)  # <– NEU
 
-    training(dataset_params, op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from)
+    training(dataset_params, op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from,
+             dict(resolution_scale=args.eval_resolution_scale, subset_size=args.eval_subset),
+             dict(enabled=args.profile_stages or args.chrome_trace is not None, interval=args.profile_interval,
+                  chrome_trace=args.chrome_trace, torch_profiler=args.torch_profiler),
+             viewer_args)
 
     # All done
     print("\nTraining complete.")
@@ -0,0 +1,69 @@
+import os
+from argparse import ArgumentParser
+
+import torch
+
+from arguments import ModelParams, get_combined_args
+from scene.dataset_readers import sceneLoadTypeCallbacks
+from scene.gaussian_model import GaussianModel
+from utils.camera_path import CameraBatch
+from utils.system_utils import searchForMaxIteration
+from utils.lod_utils import DEFAULT_FRACTIONS, contribution_scores, build_lod, lod_path, save_lod, ordered_model
+
+
+def load_train_cam_infos(args):
+    if os.path.exists(os.path.join(args.source_path, "sparse")):
+        scene_info = sceneLoadTypeCallbacks["Colmap"](args.source_path, args.images, args.depths, args.eval, args.train_test_exp)
+    elif os.path.exists(os.path.join(args.source_path, "transforms_train.json")):
+        scene_info = sceneLoadTypeCallbacks["Blender"](args.source_path, args.white_background, args.depths, args.eval)
+    else:
+        assert False, "Could not recognize scene type!"
+    return scene_info.train_cameras
+
+
+def score_cameras(cam_infos, device):
+    """Projection-only cameras; no images are loaded, so this also runs on the CPU."""
+    return [CameraBatch(info.R[None], info.T[None], info.FovX, info.FovY, info.width, info.height, device=device)[0]
+            for info in cam_infos]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Build nested level-of-detail subsets of a trained model")
+    model = ModelParams(parser, sentinel=True)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--fractions", nargs="+", type=float, default=DEFAULT_FRACTIONS,
+                        help="Share of the ranked Gaussians kept by each level, finest first")
+    parser.add_argument("--min_opacity", type=float, default=0.005,
+                        help="Gaussians below this opacity are left out of every level")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--export_ply", action="store_true",
+                        help="Also write point_cloud_lod<i>.ply for every level")
+    args = get_combined_args(parser)
+    dataset = model.extract(args)
+
+    iteration = args.iteration
+    if iteration == -1:
+        iteration = searchForMaxIteration(os.path.join(dataset.model_path, "point_cloud"))
+    ply_path = os.path.join(dataset.model_path, "point_cloud", "iteration_" + str(iteration), "point_cloud.ply")
+
+    with torch.no_grad():
+        gaussians = GaussianModel(dataset.sh_degree)
+        gaussians.load_ply(ply_path, device=args.device)
+        cameras = score_cameras(load_train_cam_infos(dataset), args.device)
+        print("Scoring {} Gaussians over {} training cameras on {}".format(gaussians.get_xyz.shape[0], len(cameras), args.device))
+
+        scores = contribution_scores(gaussians, cameras)
+        lod = build_lod(scores, gaussians.get_opacity, sorted(args.fractions, reverse=True), args.min_opacity)
+        save_lod(lod_path(dataset.model_path, iteration), lod)
+
+        total = scores.sum().item()
+        ordered = lod["order"].to(scores.device)
+        for level, count in enumerate(lod["counts"]):
+            kept = scores[ordered[:count]].sum().item()
+            print("LOD {}: {} Gaussians ({:.1f}%), {:.1f}% of the contribution".format(
+                level, count, 100.0 * count / lod["num_gaussians"], 100.0 * kept / max(total, 1e-12)))
+
+        if args.export_ply:
+            full = ordered_model(gaussians, lod)
+            for level, count in enumerate(lod["counts"]):
+                full.subset(count).save_ply(ply_path.replace("point_cloud.ply", "point_cloud_lod{}.ply".format(level)))
@@ -0,0 +1,225 @@
+import math
+
+import numpy as np
+import torch
+
+
+def rotmat_to_quat(R):
+    """(N, 3, 3) rotation matrices -> (N, 4) unit quaternions (w, x, y, z)."""
+    m = R
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    candidates = torch.stack([
+        1.0 + trace,
+        1.0 + m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2],
+        1.0 - m[:, 0, 0] + m[:, 1, 1] - m[:, 2, 2],
+        1.0 - m[:, 0, 0] - m[:, 1, 1] + m[:, 2, 2],
+    ], dim=1)
+    # Use the numerically best conditioned of the four standard formulas per matrix
+    best = candidates.argmax(dim=1)
+    s = torch.sqrt(candidates.gather(1, best[:, None]).clamp_min(1e-12))[:, 0] * 2.0
+    q = torch.empty(R.shape[0], 4, dtype=R.dtype, device=R.device)
+    forms = [
+        (s / 4.0, (m[:, 2, 1] - m[:, 1, 2]) / s, (m[:, 0, 2] - m[:, 2, 0]) / s, (m[:, 1, 0] - m[:, 0, 1]) / s),
+        ((m[:, 2, 1] - m[:, 1, 2]) / s, s / 4.0, (m[:, 0, 1] + m[:, 1, 0]) / s, (m[:, 0, 2] + m[:, 2, 0]) / s),
+        ((m[:, 0, 2] - m[:, 2, 0]) / s, (m[:, 0, 1] + m[:, 1, 0]) / s, s / 4.0, (m[:, 1, 2] + m[:, 2, 1]) / s),
+        ((m[:, 1, 0] - m[:, 0, 1]) / s, (m[:, 0, 2] + m[:, 2, 0]) / s, (m[:, 1, 2] + m[:, 2, 1]) / s, s / 4.0),
+    ]
+    for i, form in enumerate(forms):
+        mask = best == i
+        q[mask] = torch.stack(form, dim=1)[mask]
+    return torch.nn.functional.normalize(q, dim=1)
+
+
+def quat_to_rotmat(q):
+    """(N, 4) quaternions (w, x, y, z) -> (N, 3, 3) rotation matrices."""
+    q = torch.nn.functional.normalize(q, dim=1)
+    w, x, y, z = q.unbind(dim=1)
+    return torch.stack([
+        1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+        2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+        2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y),
+    ], dim=1).view(-1, 3, 3)
+
+
+def slerp(q0, q1, t):
+    """Batched spherical interpolation of (N, 4) quaternions at (N,) parameters t."""
+    dot = (q0 * q1).sum(dim=1)
+    # Take the short way around
+    q1 = torch.where(dot[:, None] < 0, -q1, q1)
+    dot = dot.abs().clamp(max=1.0)
+    theta = torch.acos(dot)
+    sin_theta = torch.sin(theta)
+    nearly_equal = sin_theta < 1e-6
+    safe_sin = torch.where(nearly_equal, torch.ones_like(sin_theta), sin_theta)
+    w0 = torch.where(nearly_equal, 1.0 - t, torch.sin((1.0 - t) * theta) / safe_sin)
+    w1 = torch.where(nearly_equal, t, torch.sin(t * theta) / safe_sin)
+    return torch.nn.functional.normalize(w0[:, None] * q0 + w1[:, None] * q1, dim=1)
+
+
+def projection_matrices(fovx, fovy, znear=0.01, zfar=100.0):
+    """Batched getProjectionMatrix: (N,) fields of view -> (N, 4, 4), not transposed."""
+    tan_x = torch.tan(fovx / 2)
+    tan_y = torch.tan(fovy / 2)
+    P = torch.zeros(fovx.shape[0], 4, 4, dtype=fovx.dtype, device=fovx.device)
+    P[:, 0, 0] = 1.0 / tan_x
+    P[:, 1, 1] = 1.0 / tan_y
+    P[:, 3, 2] = 1.0
+    P[:, 2, 2] = zfar / (zfar - znear)
+    P[:, 2, 3] = -(zfar * znear) / (zfar - znear)
+    return P
+
+
+def world_to_view_matrices(R, T):
+    """Batched getWorld2View2 without translate/scale: R (N, 3, 3) camera-to-world, T (N, 3) -> (N, 4, 4)."""
+    Rt = torch.zeros(R.shape[0], 4, 4, dtype=R.dtype, device=R.device)
+    Rt[:, :3, :3] = R.transpose(1, 2)
+    Rt[:, :3, 3] = T
+    Rt[:, 3, 3] = 1.0
+    return Rt
+
+
+class CameraView:
+    """One camera of a CameraBatch, with the attributes render() reads."""
+
+    def __init__(self, batch, index):
+        self.image_width = batch.image_width
+        self.image_height = batch.image_height
+        self.FoVx = batch.fov_list[index][0]
+        self.FoVy = batch.fov_list[index][1]
+        self.znear = batch.znear
+        self.zfar = batch.zfar
+        self.world_view_transform = batch.world_view_transform[index]
+        self.projection_matrix = batch.projection_matrix[index]
+        self.full_proj_transform = batch.full_proj_transform[index]
+        self.camera_center = batch.camera_center[index]
+        self.image_name = "path_{:05d}".format(index)
+
+
+class CameraBatch:
+    """
+    N cameras of the same image size as stacked tensors. All matrices are
+    built in one batched pass: the view matrix is [R^T | T] as in
+    getWorld2View2 and the camera center is -R T, so no matrix inverse is
+    needed. Indexing returns a CameraView that can be passed to render().
+    """
+
+    def __init__(self, R, T, FoVx, FoVy, image_width, image_height, znear=0.01, zfar=100.0, device="cuda"):
+        self.R = torch.as_tensor(R, dtype=torch.float32, device=device)
+        self.T = torch.as_tensor(T, dtype=torch.float32, device=device)
+        n = self.R.shape[0]
+        self.FoVx = torch.as_tensor(FoVx, dtype=torch.float32, device=device).expand(n).contiguous()
+        self.FoVy = torch.as_tensor(FoVy, dtype=torch.float32, device=device).expand(n).contiguous()
+        self.image_width = int(image_width)
+        self.image_height = int(image_height)
+        self.znear = znear
+        self.zfar = zfar
+
+        # Stored transposed, like Camera and MiniCam
+        self.world_view_transform = world_to_view_matrices(self.R, self.T).transpose(1, 2).contiguous()
+        self.projection_matrix = projection_matrices(self.FoVx, self.FoVy, znear, zfar).transpose(1, 2).contiguous()
+        self.full_proj_transform = torch.bmm(self.world_view_transform, self.projection_matrix)
+        self.camera_center = -torch.bmm(self.R, self.T[:, :, None])[:, :, 0]
+        # Read once, so indexing a view never synchronizes with the device
+        self.fov_list = torch.stack((self.FoVx, self.FoVy), dim=1).tolist()
+
+    def __len__(self):
+        return self.R.shape[0]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return CameraView(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _stack_poses(views, device):
+    R = torch.as_tensor(np.stack([v.R for v in views]), dtype=torch.float32, device=device)
+    T = torch.as_tensor(np.stack([v.T for v in views]), dtype=torch.float32, device=device)
+    return R, T
+
+
+def _batch_like(views, R, T, device):
+    v0 = views[0]
+    return CameraBatch(R, T, v0.FoVx, v0.FoVy, v0.image_width, v0.image_height, device=device)
+
+
+def _segment_parameters(num_keys, steps, device):
+    """Key index and local parameter of every frame: steps in-between frames per segment plus the last key."""
+    alphas = torch.linspace(0.0, 1.0, steps + 2, device=device)[:-1]
+    segments = torch.arange(num_keys - 1, device=device)
+    seg = segments.repeat_interleave(alphas.shape[0])
+    t = alphas.repeat(num_keys - 1)
+    seg = torch.cat([seg, torch.tensor([num_keys - 2], device=device)])
+    t = torch.cat([t, torch.ones(1, device=device)])
+    return seg, t
+
+
+def linear_path(views, steps, device="cuda"):
+    """
+    Pairwise interpolation between consecutive views: slerp on the rotation
+    and a linear blend of T, with steps frames between each pair. This is the
+    path render_new_cams.py has always produced.
+    """
+    R, T = _stack_poses(views, device)
+    if len(views) == 1:
+        return _batch_like(views, R, T, device)
+    q = rotmat_to_quat(R)
+    seg, t = _segment_parameters(len(views), steps, device)
+    Rm = quat_to_rotmat(slerp(q[seg], q[seg + 1], t))
+    Tm = (1 - t)[:, None] * T[seg] + t[:, None] * T[seg + 1]
+    return _batch_like(views, Rm, Tm, device)
+
+
+def catmull_rom_path(views, steps, device="cuda"):
+    """
+    Smooth path through the camera centers (uniform Catmull-Rom spline, end
+    points duplicated) with slerped orientations, steps frames per segment.
+    """
+    R, T = _stack_poses(views, device)
+    if len(views) < 3:
+        return linear_path(views, steps, device)
+    centers = -torch.bmm(R, T[:, :, None])[:, :, 0]
+    padded = torch.cat([centers[:1], centers, centers[-1:]])
+    q = rotmat_to_quat(R)
+    seg, t = _segment_parameters(len(views), steps, device)
+    p0, p1, p2, p3 = padded[seg], padded[seg + 1], padded[seg + 2], padded[seg + 3]
+    t1 = t[:, None]
+    t2 = t1 * t1
+    t3 = t2 * t1
+    C = 0.5 * (2 * p1 + (p2 - p0) * t1 + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t2 + (3 * p1 - p0 - 3 * p2 + p3) * t3)
+    Rm = quat_to_rotmat(slerp(q[seg], q[seg + 1], t))
+    Tm = -torch.bmm(Rm.transpose(1, 2), C[:, :, None])[:, :, 0]
+    return _batch_like(views, Rm, Tm, device)
+
+
+def orbit_path(views, num_frames, center, degrees=360.0, device="cuda"):
+    """
+    Orbit around center (e.g. the centroid of the face Gaussians), starting at
+    the first view, at its distance and height, about the mean up direction
+    of the input views. Every frame looks at center.
+    """
+    R, T = _stack_poses(views, device)
+    center = torch.as_tensor(center, dtype=torch.float32, device=device)
+    centers = -torch.bmm(R, T[:, :, None])[:, :, 0]
+    # Camera y points down in the COLMAP convention
+    up = torch.nn.functional.normalize(-R[:, :, 1].mean(dim=0), dim=0)
+    offset = centers[0] - center
+    height = (offset * up).sum()
+    radial = offset - height * up
+    radius = radial.norm()
+    e1 = radial / radius
+    e2 = torch.linalg.cross(up, e1)
+
+    angles = torch.arange(num_frames, device=device, dtype=torch.float32) * math.radians(degrees) / max(num_frames, 1)
+    C = center + height * up + radius * (torch.cos(angles)[:, None] * e1 + torch.sin(angles)[:, None] * e2)
+    forward = torch.nn.functional.normalize(center - C, dim=1)
+    right = torch.nn.functional.normalize(torch.linalg.cross(-up.expand_as(forward), forward, dim=1), dim=1)
+    down = torch.linalg.cross(forward, right, dim=1)
+    Rm = torch.stack((right, down, forward), dim=2)
+    Tm = -torch.bmm(Rm.transpose(1, 2), C[:, :, None])[:, :, 0]
+    return _batch_like(views, Rm, Tm, device)
@@ -0,0 +1,200 @@
+import os
+import time
+from argparse import ArgumentParser
+from random import randint
+
+import torch
+from torch import nn
+from tqdm import tqdm
+
+from arguments import ModelParams, PipelineParams, OptimizationParams, get_combined_args
+from gaussian_renderer import render
+from scene import Scene, GaussianModel
+from utils.compression import COMPRESSED_FILE, save_compressed
+from utils.general_utils import safe_state
+from utils.image_utils import psnr
+from utils.loss_utils import l1_loss, ssim
+
+
+def blending_weights(gaussians, cameras, pipe):
+    """
+    Accumulated blending weight (sum of alpha * transmittance over all pixels)
+    of every Gaussian over the given cameras. The image is linear in the
+    colors, so rendering white splats on black and taking the gradient of the
+    image sum with respect to the colors yields exactly these weights.
+    """
+    weights = torch.zeros(gaussians.get_xyz.shape[0], device=gaussians.get_xyz.device)
+    background = torch.zeros(3, device=gaussians.get_xyz.device)
+    for cam in tqdm(cameras, desc="Blending weights"):
+        colors = torch.ones((gaussians.get_xyz.shape[0], 3), device=gaussians.get_xyz.device, requires_grad=True)
+        image = render(cam, gaussians, pipe, background, override_color=colors)["render"]
+        grad, = torch.autograd.grad(image[0].sum(), colors)
+        weights += grad[:, 0]
+    return weights
+
+
+def sh_band_rms(gaussians):
+    """(N, max_sh_degree) RMS of the rest coefficients of every SH band, over all channels."""
+    rest = gaussians._features_rest.detach()
+    rms = []
+    for l in range(1, gaussians.max_sh_degree + 1):
+        band = rest[:, l * l - 1:(l + 1) * (l + 1) - 1, :]
+        rms.append(band.pow(2).mean(dim=(1, 2)).sqrt())
+    return torch.stack(rms, dim=1) if rms else torch.zeros(rest.shape[0], 0, device=rest.device)
+
+
+def select_sh_degrees(gaussians, threshold):
+    """Highest band of every Gaussian whose RMS is above threshold; lower bands are always kept."""
+    rms = sh_band_rms(gaussians)
+    if rms.shape[1] == 0:
+        return torch.zeros(rms.shape[0], dtype=torch.uint8, device=rms.device)
+    bands = torch.arange(1, rms.shape[1] + 1, device=rms.device)
+    significant = rms > threshold
+    return (significant * bands).max(dim=1).values.to(torch.uint8)
+
+
+def model_file_size(model_path, iteration):
+    """Bytes on disk of the model file Scene loads for an iteration: point_cloud.ply, else point_cloud.gsz."""
+    iteration_path = os.path.join(model_path, "point_cloud", "iteration_{}".format(iteration))
+    for name in ("point_cloud.ply", "point_cloud.gsz"):
+        if os.path.exists(os.path.join(iteration_path, name)):
+            return os.path.getsize(os.path.join(iteration_path, name))
+    return 0
+
+
+@torch.no_grad()
+def evaluate(gaussians, cameras, pipe, background, repeat=3):
+    """Mean PSNR and mean render time in ms over the given cameras."""
+    psnr_total = 0.0
+    times = []
+    for cam in cameras:
+        gt = cam.original_image.cuda()
+        image = render(cam, gaussians, pipe, background)["render"]
+        psnr_total += psnr(image, gt).mean().item()
+        for _ in range(repeat):
+            torch.cuda.synchronize()
+            start = time.perf_counter()
+            render(cam, gaussians, pipe, background)
+            torch.cuda.synchronize()
+            times.append((time.perf_counter() - start) * 1000.0)
+    return {"num_gaussians": gaussians.get_xyz.shape[0],
+            "psnr": psnr_total / max(len(cameras), 1), "render_ms": sum(times) / max(len(times), 1)}
+
+
+def prune(gaussians, keep):
+    """Keeps only the masked Gaussians, as fresh leaf parameters for fine-tuning."""
+    for name in ("_xyz", "_features_dc", "_features_rest", "_scaling", "_rotation", "_opacity"):
+        setattr(gaussians, name, nn.Parameter(getattr(gaussians, name).detach()[keep].contiguous().requires_grad_(True)))
+    if gaussians.sh_degrees is not None:
+        gaussians.sh_degrees = gaussians.sh_degrees[keep]
+    if gaussians.sh_indices is not None:
+        gaussians.sh_indices = gaussians.sh_indices[keep]
+
+
+def finetune(gaussians, scene, opt, pipe, background, iterations, spatial_lr_scale):
+    """
+    Short fine-tuning without densification, at the final learning rates of
+    training. In codebook mode the codebook entries are trained instead of
+    per-Gaussian SH coefficients.
+    """
+    optimizer = torch.optim.Adam([
+        {'params': [gaussians._xyz], 'lr': opt.position_lr_final * spatial_lr_scale},
+        {'params': [gaussians._features_dc], 'lr': opt.feature_lr},
+        {'params': [gaussians.sh_codebook if gaussians.sh_codebook is not None else gaussians._features_rest], 'lr': opt.feature_lr / 20.0},
+        {'params': [gaussians._opacity], 'lr': opt.opacity_lr},
+        {'params': [gaussians._scaling], 'lr': opt.scaling_lr},
+        {'params': [gaussians._rotation], 'lr': opt.rotation_lr},
+    ], lr=0.0, eps=1e-15)
+    sh_mask = gaussians.sh_rest_mask() if gaussians.sh_degrees is not None and gaussians.sh_codebook is None else None
+    viewpoint_stack = []
+    for _ in tqdm(range(iterations), desc="Fine-tuning"):
+        if not viewpoint_stack:
+            viewpoint_stack = scene.getTrainCameras().copy()
+        cam = viewpoint_stack.pop(randint(0, len(viewpoint_stack) - 1))
+        image = render(cam, gaussians, pipe, background)["render"]
+        gt = cam.original_image.cuda()
+        loss = (1.0 - opt.lambda_dssim) * l1_loss(image, gt) + opt.lambda_dssim * (1.0 - ssim(image, gt))
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+        if sh_mask is not None:
+            # Dropped bands must stay zero
+            with torch.no_grad():
+                gaussians._features_rest.mul_(sh_mask)
+
+
+def print_report(before, after):
+    print("\n{:<14} {:>14} {:>14}".format("", "before", "after"))
+    print("{:<14} {:>14d} {:>14d}".format("gaussians", before["num_gaussians"], after["num_gaussians"]))
+    print("{:<14} {:>14.2f} {:>14.2f}".format("size [MB]", before["size_mb"], after["size_mb"]))
+    print("{:<14} {:>14.2f} {:>14.2f}".format("render [ms]", before["render_ms"], after["render_ms"]))
+    print("{:<14} {:>14.2f} {:>14.2f}".format("PSNR [dB]", before["psnr"], after["psnr"]))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compact a trained model: prune by blending weight, drop negligible SH bands, fine-tune")
+    model = ModelParams(parser, sentinel=True)
+    pipeline = PipelineParams(parser)
+    optimization = OptimizationParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--weight_threshold", type=float, default=0.5,
+                        help="Prune Gaussians whose blending weight summed over all training views is below this")
+    parser.add_argument("--sh_threshold", type=float, default=0.01,
+                        help="Drop SH bands whose coefficient RMS is below this")
+    parser.add_argument("--finetune_iterations", type=int, default=1000)
+    parser.add_argument("--output_iteration", type=int, default=None,
+                        help="Save as point_cloud/iteration_<n> (default: loaded iteration + finetune_iterations)")
+    parser.add_argument("--compressed", action="store_true",
+                        help="Write a point_cloud.gsz that stores only the kept SH bands of every Gaussian. "
+                             "The PLY keeps all SH columns, so there only pruning reduces the size")
+    parser.add_argument("--quiet", action="store_true")
+    args = get_combined_args(parser)
+    safe_state(args.quiet)
+
+    dataset, pipe, opt = model.extract(args), pipeline.extract(args), optimization.extract(args)
+    gaussians = GaussianModel(dataset.sh_degree)
+    scene = Scene(dataset, gaussians, load_iteration=args.iteration, shuffle=False)
+    background = torch.tensor([1, 1, 1] if dataset.white_background else [0, 0, 0], dtype=torch.float32, device="cuda")
+    eval_cameras = scene.getTestCameras() or scene.getTrainCameras()
+
+    before = evaluate(gaussians, eval_cameras, pipe, background)
+
+    weights = blending_weights(gaussians, scene.getTrainCameras(), pipe)
+    keep = weights >= args.weight_threshold
+    print("Pruning {} of {} Gaussians".format(int((~keep).sum()), keep.shape[0]))
+    prune(gaussians, keep)
+
+    degrees = select_sh_degrees(gaussians, args.sh_threshold)
+    gaussians.set_sh_degrees(degrees)
+    print("SH degrees: " + ", ".join("{}: {}".format(l, int((degrees == l).sum())) for l in range(gaussians.max_sh_degree + 1)))
+
+    if args.finetune_iterations > 0:
+        finetune(gaussians, scene, opt, pipe, background, args.finetune_iterations, scene.cameras_extent)
+
+    output_iteration = args.output_iteration or scene.loaded_iter + max(args.finetune_iterations, 1)
+    out_dir = os.path.join(dataset.model_path, "point_cloud", "iteration_{}".format(output_iteration))
+    if args.compressed:
+        # Scene only loads the .gsz where no point_cloud.ply exists
+        if os.path.exists(os.path.join(out_dir, "point_cloud.ply")):
+            raise FileExistsError("{} already holds a point_cloud.ply that would be loaded instead, "
+                                  "choose another --output_iteration".format(out_dir))
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, COMPRESSED_FILE)
+        save_compressed(gaussians, out_path)
+        # Report the model as it is loaded back, quantization included
+        compacted = GaussianModel(dataset.sh_degree)
+        compacted.load_compressed(out_path)
+        after = evaluate(compacted, eval_cameras, pipe, background)
+    else:
+        out_path = os.path.join(out_dir, "point_cloud.ply")
+        gaussians.save_ply(out_path)
+        after = evaluate(gaussians, eval_cameras, pipe, background)
+
+    # Sizes of the files on disk, not of the coefficients in use
+    before["size_mb"] = model_file_size(dataset.model_path, scene.loaded_iter) / 2 ** 20
+    after["size_mb"] = model_file_size(dataset.model_path, output_iteration) / 2 ** 20
+    print_report(before, after)
+    if not args.compressed:
+        print("The PLY stores every SH coefficient (dropped bands as zeros), so dropping bands only affects quality, "
+              "not the size; use --compressed to store only the kept bands")
+    print("Compacted model written to {}".format(out_path))
@@ -0,0 +1,72 @@
+import os
+from argparse import ArgumentParser
+
+import torch
+
+from arguments import ModelParams, PipelineParams, get_combined_args
+from gaussian_renderer import render
+from scene import Scene, GaussianModel
+from utils.compact import evaluate
+from utils.compression import CODECS, COMPRESSED_FILE, DEFAULT_BITS, save_compressed
+from utils.general_utils import safe_state
+from utils.image_utils import psnr
+
+
+@torch.no_grad()
+def render_fidelity(original, decoded, cameras, pipe, background):
+    """PSNR of the decoded model's renders against the original model's renders."""
+    total = 0.0
+    for cam in cameras:
+        reference = render(cam, original, pipe, background)["render"]
+        total += psnr(render(cam, decoded, pipe, background)["render"], reference).mean().item()
+    return total / max(len(cameras), 1)
+
+
+def parse_bits(items):
+    bits = {}
+    for item in items or []:
+        key, value = item.split("=")
+        if key not in DEFAULT_BITS:
+            raise ValueError("Unknown attribute {}, expected one of {}".format(key, ", ".join(DEFAULT_BITS)))
+        bits[key] = int(value)
+    return bits
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Write a quantized, entropy coded copy of a trained model and report size vs. PSNR")
+    model = ModelParams(parser, sentinel=True)
+    pipeline = PipelineParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--codec", choices=list(CODECS), default="lzma")
+    parser.add_argument("--sh_codebook", type=int, default=0,
+                        help="Store the SH rest coefficients as indices into a k-means codebook of this size (0 = 8 bit per coefficient)")
+    parser.add_argument("--bits", nargs="*", default=[],
+                        help="Override bits per attribute, e.g. xyz=14 scaling=10")
+    parser.add_argument("--quiet", action="store_true")
+    args = get_combined_args(parser)
+    safe_state(args.quiet)
+
+    dataset, pipe = model.extract(args), pipeline.extract(args)
+    gaussians = GaussianModel(dataset.sh_degree)
+    scene = Scene(dataset, gaussians, load_iteration=args.iteration, shuffle=False)
+    background = torch.tensor([1, 1, 1] if dataset.white_background else [0, 0, 0], dtype=torch.float32, device="cuda")
+    eval_cameras = scene.getTestCameras() or scene.getTrainCameras()
+
+    iteration_path = os.path.join(dataset.model_path, "point_cloud", "iteration_" + str(scene.loaded_iter))
+    out_path = os.path.join(iteration_path, COMPRESSED_FILE)
+    compressed_size = save_compressed(gaussians, out_path, bits=parse_bits(args.bits), codec=args.codec, sh_codebook=args.sh_codebook)
+    ply_size = os.path.getsize(os.path.join(iteration_path, "point_cloud.ply"))
+
+    decoded = GaussianModel(dataset.sh_degree)
+    decoded.load_compressed(out_path)
+
+    before = evaluate(gaussians, eval_cameras, pipe, background)
+    after = evaluate(decoded, eval_cameras, pipe, background)
+    fidelity = render_fidelity(gaussians, decoded, eval_cameras, pipe, background)
+
+    print("\nPLY:        {:>10.2f} MB".format(ply_size / 2 ** 20))
+    print("Compressed: {:>10.2f} MB ({:.1f}x smaller, {:.2f} bytes per Gaussian)".format(
+        compressed_size / 2 ** 20, ply_size / max(compressed_size, 1), compressed_size / max(before["num_gaussians"], 1)))
+    print("PSNR:       {:>10.2f} dB -> {:.2f} dB ({:+.2f} dB)".format(before["psnr"], after["psnr"], after["psnr"] - before["psnr"]))
+    print("PSNR of the decoded renders against the original renders: {:.2f} dB".format(fidelity))
+    print("Written to {}".format(out_path))
@@ -0,0 +1,225 @@
+import json
+import lzma
+import math
+import zlib
+
+import numpy as np
+
+from utils.vq_utils import kmeans
+
+MAGIC = b"GSZ1"
+COMPRESSED_FILE = "point_cloud.gsz"
+
+# Positions of the three components kept by smallest-three packing, by index of the dropped one
+_KEPT = np.array([[1, 2, 3], [0, 2, 3], [0, 1, 3], [0, 1, 2]])
+
+# Bits per value of every attribute; 16 bit values are byte-shuffled before entropy coding
+DEFAULT_BITS = {"xyz": 16, "f_dc": 8, "f_rest": 8, "opacity": 8, "scaling": 8, "rotation": 8}
+
+CODECS = {
+    "lzma": (lambda data: lzma.compress(data, preset=9), lzma.decompress),
+    "zlib": (lambda data: zlib.compress(data, 9), zlib.decompress),
+}
+
+
+def _quantize(values, bits, lo, hi):
+    levels = (1 << bits) - 1
+    scale = np.where(hi > lo, hi - lo, 1.0)
+    q = np.round((values - lo) / scale * levels)
+    return np.clip(q, 0, levels).astype(np.uint16 if bits > 8 else np.uint8)
+
+
+def _dequantize(q, bits, lo, hi):
+    levels = (1 << bits) - 1
+    scale = np.where(hi > lo, hi - lo, 1.0)
+    return q.astype(np.float32) / levels * scale + lo
+
+
+def _quantize_symmetric(values, bits, bound):
+    """Zero stays exactly zero, which keeps dropped SH bands intact."""
+    half = (1 << (bits - 1)) - 1
+    q = np.round(values / np.where(bound > 0, bound, 1.0) * half) + half
+    return np.clip(q, 0, 2 * half).astype(np.uint16 if bits > 8 else np.uint8)
+
+
+def _dequantize_symmetric(q, bits, bound):
+    half = (1 << (bits - 1)) - 1
+    return (q.astype(np.float32) - half) / half * bound
+
+
+def sh_rest_mask(sh_degrees, num_rest):
+    """(N, num_rest * 3) mask of the flattened rest coefficients within each Gaussian's SH degree."""
+    band = np.floor(np.sqrt(np.arange(1, num_rest + 1)))
+    mask = band[None, :] <= np.asarray(sh_degrees, dtype=np.float64)[:, None]
+    return np.repeat(mask, 3, axis=1)
+
+
+def pack_quaternions(rotations, bits):
+    """
+    Smallest-three packing: the largest component is dropped (its index is
+    kept) and made positive, the other three lie in [-1/sqrt(2), 1/sqrt(2)].
+    """
+    q = rotations / np.linalg.norm(rotations, axis=1, keepdims=True).clip(1e-12)
+    largest = np.abs(q).argmax(axis=1)
+    q = q * np.sign(q[np.arange(q.shape[0]), largest])[:, None]
+    rest = np.take_along_axis(q, _KEPT[largest], axis=1)
+    bound = np.full(3, 1.0 / math.sqrt(2.0))
+    return largest.astype(np.uint8), _quantize(rest, bits, -bound, bound)
+
+
+def unpack_quaternions(largest, packed, bits):
+    bound = np.full(3, 1.0 / math.sqrt(2.0))
+    rest = _dequantize(packed, bits, -bound, bound)
+    q = np.zeros((largest.shape[0], 4), dtype=np.float32)
+    missing = np.sqrt(np.clip(1.0 - (rest * rest).sum(axis=1), 0.0, 1.0))
+    np.put_along_axis(q, _KEPT[largest.astype(np.int64)], rest, axis=1)
+    q[np.arange(q.shape[0]), largest] = missing
+    return q
+
+
+def _shuffle(array):
+    """Byte planes of multi-byte arrays one after another; entropy coders like that much better."""
+    raw = np.ascontiguousarray(array)
+    if raw.dtype.itemsize == 1:
+        return raw.tobytes()
+    return raw.view(np.uint8).reshape(-1, raw.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(data, dtype=np.uint8)
+    if dtype.itemsize > 1:
+        planes = planes.reshape(dtype.itemsize, planes.size // dtype.itemsize).T
+    return np.ascontiguousarray(planes).view(dtype).reshape(shape)
+
+
+def encode(gaussians, bits=None, codec="lzma", sh_codebook=0):
+    """
+    Compressed bytes of a GaussianModel. Positions are quantized relative to
+    the bounding box, DC colors, log scales and opacities per attribute
+    range, SH rest coefficients symmetrically per coefficient (or, with
+    sh_codebook > 0, as uint16 indices into a k-means codebook) and
+    rotations as smallest-three quaternions. With per-Gaussian SH degrees
+    only the coefficients within each Gaussian's degree are stored. All
+    sections go through codec.
+    """
+    bits = dict(DEFAULT_BITS, **(bits or {}))
+    compress = CODECS[codec][0]
+    n = gaussians.get_xyz.shape[0]
+    header = {"num_gaussians": n, "max_sh_degree": gaussians.max_sh_degree, "active_sh_degree": gaussians.active_sh_degree,
+              "codec": codec, "bits": bits, "sections": []}
+    blobs = []
+
+    def add(name, array, **meta):
+        data = compress(_shuffle(array))
+        header["sections"].append(dict(name=name, dtype=array.dtype.str, shape=list(array.shape), length=len(data), **meta))
+        blobs.append(data)
+
+    def ranged(name, values):
+        lo, hi = values.min(axis=0), values.max(axis=0)
+        add(name, _quantize(values, bits[name], lo, hi), lo=lo.tolist(), hi=hi.tolist())
+
+    xyz = gaussians._xyz.detach().cpu().numpy()
+    f_dc = gaussians._features_dc.detach().flatten(start_dim=1).cpu().numpy()
+    f_rest = gaussians.get_features_rest.detach().flatten(start_dim=1).cpu().numpy()
+    opacity = gaussians.get_opacity.detach().cpu().numpy()
+    scaling = gaussians._scaling.detach().cpu().numpy()
+    rotation = gaussians._rotation.detach().cpu().numpy()
+
+    ranged("xyz", xyz)
+    ranged("f_dc", f_dc)
+    ranged("opacity", opacity)
+    ranged("scaling", scaling)
+    largest, packed = pack_quaternions(rotation, bits["rotation"])
+    add("rotation_index", largest)
+    add("rotation", packed)
+    if gaussians.sh_codebook is not None:
+        # Model already in codebook mode, keep its (possibly fine-tuned) codebook
+        add("f_rest_codebook", gaussians.sh_codebook.detach().flatten(start_dim=1).cpu().numpy().astype(np.float16))
+        add("f_rest_index", gaussians.sh_indices.cpu().numpy().astype(np.uint16))
+    elif f_rest.shape[1] > 0:
+        if sh_codebook > 0:
+            if sh_codebook > 65536:
+                raise ValueError("SH codebooks are limited to 65536 entries")
+            centers, labels = kmeans(gaussians._features_rest.detach().flatten(start_dim=1), sh_codebook)
+            add("f_rest_codebook", centers.cpu().numpy().astype(np.float16))
+            add("f_rest_index", labels.cpu().numpy().astype(np.uint16))
+        else:
+            bound = np.abs(f_rest).max(axis=0)
+            q = _quantize_symmetric(f_rest, bits["f_rest"], bound)
+            if gaussians.sh_degrees is not None:
+                # Variable degree layout: the dropped bands are not written at all
+                mask = sh_rest_mask(gaussians.sh_degrees.cpu().numpy(), f_rest.shape[1] // 3)
+                add("f_rest", q[mask], bound=bound.tolist(), packed=True)
+            else:
+                add("f_rest", q, bound=bound.tolist())
+    if gaussians.sh_degrees is not None:
+        add("sh_degree", gaussians.sh_degrees.cpu().numpy().astype(np.uint8))
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    return MAGIC + len(header_bytes).to_bytes(4, 'little') + header_bytes + b"".join(blobs)
+
+
+def decode(data):
+    """
+    Inverse of encode: (header, dict of float32 numpy arrays in GaussianModel
+    layout). A codebook is returned as f_rest_codebook and f_rest_index with
+    an empty f_rest.
+    """
+    if data[:4] != MAGIC:
+        raise ValueError("Not a compressed Gaussian model")
+    header_length = int.from_bytes(data[4:8], 'little')
+    header = json.loads(data[8:8 + header_length].decode("utf-8"))
+    decompress = CODECS[header["codec"]][1]
+    bits = header["bits"]
+
+    sections = {}
+    offset = 8 + header_length
+    for section in header["sections"]:
+        raw = decompress(data[offset:offset + section["length"]])
+        offset += section["length"]
+        sections[section["name"]] = (_unshuffle(raw, section["dtype"], section["shape"]), section)
+
+    def ranged(name):
+        q, meta = sections[name]
+        return _dequantize(q, bits[name], np.asarray(meta["lo"]), np.asarray(meta["hi"])).astype(np.float32)
+
+    n = header["num_gaussians"]
+    num_rest = (header["max_sh_degree"] + 1) ** 2 - 1
+    out = {"xyz": ranged("xyz"), "f_dc": ranged("f_dc").reshape(n, 1, 3), "scaling": ranged("scaling")}
+    opacity = np.clip(ranged("opacity"), 1e-6, 1.0 - 1e-6)
+    out["opacity"] = np.log(opacity / (1.0 - opacity)).astype(np.float32)
+    out["rotation"] = unpack_quaternions(sections["rotation_index"][0], sections["rotation"][0], bits["rotation"])
+    out["f_rest_codebook"], out["f_rest_index"] = None, None
+    if "f_rest_codebook" in sections:
+        # Stays a codebook; the loader decides whether to expand it
+        out["f_rest_codebook"] = sections["f_rest_codebook"][0].astype(np.float32).reshape(-1, num_rest, 3)
+        out["f_rest_index"] = sections["f_rest_index"][0]
+        f_rest = np.zeros((n, 0), dtype=np.float32)
+    elif "f_rest" in sections:
+        q, meta = sections["f_rest"]
+        bound = np.asarray(meta["bound"])
+        if meta.get("packed"):
+            # Coefficients above each Gaussian's degree were not stored and are zero
+            rows, cols = np.nonzero(sh_rest_mask(sections["sh_degree"][0], num_rest))
+            f_rest = np.zeros((n, num_rest * 3), dtype=np.float32)
+            f_rest[rows, cols] = _dequantize_symmetric(q, bits["f_rest"], bound[cols])
+        else:
+            f_rest = _dequantize_symmetric(q, bits["f_rest"], bound)
+    else:
+        f_rest = np.zeros((n, 0), dtype=np.float32)
+    out["f_rest"] = f_rest.astype(np.float32).reshape(n, -1, 3)
+    out["sh_degree"] = sections["sh_degree"][0] if "sh_degree" in sections else None
+    return header, out
+
+
+def save_compressed(gaussians, path, **kwargs):
+    data = encode(gaussians, **kwargs)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def load_compressed(path):
+    with open(path, "rb") as f:
+        return decode(f.read())
@@ -0,0 +1,112 @@
+import copy
+import time
+
+import torch
+import torch.nn.functional as F
+
+from utils.image_utils import psnr
+
+
+def scaled_view(viewpoint, resolution_scale):
+    """Shallow copy of a camera that renders at 1/resolution_scale of its size.
+
+    FoV and transforms are shared with the original camera, so only the
+    raster size changes. The ground truth is resized separately in
+    EvalScheduler.
+    """
+    if resolution_scale == 1.0:
+        return viewpoint
+    view = copy.copy(viewpoint)
+    view.image_width = max(1, int(viewpoint.image_width / resolution_scale))
+    view.image_height = max(1, int(viewpoint.image_height / resolution_scale))
+    return view
+
+
+class EvalScheduler:
+    """
+    Periodic evaluation for training_report.
+
+    Views are rendered one at a time under torch.no_grad (the rasterizer
+    takes a single camera), so cameras of different resolutions can be mixed.
+    L1 and PSNR are accumulated on the device and brought to the host in a
+    single transfer at the end of evaluate(). With subset_size > 0 only a rotating
+    window of the test cameras is evaluated each time, so all cameras are
+    covered over consecutive test iterations.
+    """
+
+    def __init__(self, scene, resolution_scale=1.0, subset_size=0, num_train_views=5, num_logged_images=5):
+        self.scene = scene
+        self.resolution_scale = max(1.0, resolution_scale)
+        self.subset_size = subset_size
+        self.num_logged_images = num_logged_images
+        self.offset = 0
+
+        train_cameras = scene.getTrainCameras()
+        self.train_views = [train_cameras[idx % len(train_cameras)] for idx in range(5, 5 * (num_train_views + 1), 5)] if train_cameras else []
+
+    def _next_subset(self, cameras):
+        if self.subset_size <= 0 or self.subset_size >= len(cameras):
+            return list(cameras)
+        subset = [cameras[(self.offset + i) % len(cameras)] for i in range(self.subset_size)]
+        self.offset = (self.offset + self.subset_size) % len(cameras)
+        return subset
+
+    def validation_configs(self):
+        return ({'name': 'test', 'cameras': self._next_subset(self.scene.getTestCameras())},
+                {'name': 'train', 'cameras': self.train_views})
+
+    def _prepare_gt(self, viewpoint, height, width):
+        gt_image = viewpoint.original_image.to("cuda")
+        if gt_image.shape[-2:] != (height, width):
+            gt_image = F.interpolate(gt_image[None], size=(height, width), mode="area")[0]
+        return torch.clamp(gt_image, 0.0, 1.0)
+
+    @torch.no_grad()
+    def _evaluate_cameras(self, cameras, renderFunc, renderArgs, train_test_exp):
+        l1_sum = torch.zeros((), dtype=torch.float64, device="cuda")
+        psnr_sum = torch.zeros((), dtype=torch.float64, device="cuda")
+        samples = []
+
+        for viewpoint in cameras:
+            view = scaled_view(viewpoint, self.resolution_scale)
+            image = torch.clamp(renderFunc(view, self.scene.gaussians, *renderArgs)["render"], 0.0, 1.0)
+            gt_image = self._prepare_gt(viewpoint, image.shape[-2], image.shape[-1])
+            if train_test_exp:
+                image = image[..., image.shape[-1] // 2:]
+                gt_image = gt_image[..., gt_image.shape[-1] // 2:]
+            if len(samples) < self.num_logged_images:
+                samples.append((viewpoint.image_name, image, gt_image))
+
+            # Only the per-view scalars are summed; no sync with the host per view
+            l1_sum += (image - gt_image).abs().mean().double()
+            psnr_sum += psnr(image, gt_image).mean().double()
+
+        return torch.stack((l1_sum, psnr_sum)) / len(cameras), samples
+
+    def evaluate(self, renderFunc, renderArgs, train_test_exp):
+        """
+        Returns ({name: (l1, psnr, samples)}, elapsed_ms). samples holds up to
+        num_logged_images (image_name, render, gt) tuples for image logging.
+        """
+        torch.cuda.synchronize()
+        start = time.perf_counter()
+
+        names = []
+        metrics = []
+        samples = []
+        for config in self.validation_configs():
+            if config['cameras'] and len(config['cameras']) > 0:
+                m, s = self._evaluate_cameras(config['cameras'], renderFunc, renderArgs, train_test_exp)
+                names.append(config['name'])
+                metrics.append(m)
+                samples.append(s)
+
+        results = {}
+        if metrics:
+            # Single device -> host transfer for all configs
+            values = torch.stack(metrics).cpu().tolist()
+            for name, (l1, psnr), s in zip(names, values, samples):
+                results[name] = (l1, psnr, s)
+
+        torch.cuda.synchronize()
+        return results, (time.perf_counter() - start) * 1000.0
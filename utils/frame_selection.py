@@ -0,0 +1,222 @@
+"""
+Frame quality and motion measures for video captures, a selector that
+picks frames while a video is being decoded, and the sharpness/diversity
+selection of a target number of frames with its manifest.
+"""
+import os
+import json
+import cv2
+import numpy as np
+
+SELECTION_MODES = ["all", "stride", "sharpest"]
+DIVERSITY_METRICS = ["pixels", "phash"]
+MANIFEST_FILE = "frames.json"
+# Width the measures are computed at; keeps them cheap and comparable across resolutions
+ANALYSIS_WIDTH = 480
+THUMBNAIL_WIDTH = 64
+# Square thumbnails for the diversity measures
+FEATURE_SIZE = 32
+
+
+def to_gray(frame, width=ANALYSIS_WIDTH):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    h, w = gray.shape
+    if w > width:
+        gray = cv2.resize(gray, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def laplacian_variance_batch(grays):
+    """
+    Sharpness of a (N, H, W) stack of gray frames in one pass: variance of
+    the 4-neighbour Laplacian over the interior pixels, low for blurred frames.
+    """
+    grays = np.asarray(grays, dtype=np.float32)
+    center = grays[:, 1:-1, 1:-1]
+    laplacian = (grays[:, :-2, 1:-1] + grays[:, 2:, 1:-1] + grays[:, 1:-1, :-2] + grays[:, 1:-1, 2:]
+                 - 4.0 * center)
+    return laplacian.reshape(len(grays), -1).var(axis=1)
+
+
+def laplacian_variance(frame):
+    """Sharpness: variance of the Laplacian, low for blurred frames."""
+    return float(laplacian_variance_batch(to_gray(frame)[None])[0])
+
+
+def thumbnail(frame, width=THUMBNAIL_WIDTH):
+    return to_gray(frame, width).astype(np.float32)
+
+
+def motion(thumb_a, thumb_b):
+    """Mean absolute difference of two thumbnails, 0..255."""
+    return float(np.abs(thumb_a - thumb_b).mean())
+
+
+class StreamingSelector:
+    """
+    Picks frames in decode order and holds at most one candidate frame:
+    'all' keeps every frame, 'stride' every stride-th one and 'sharpest'
+    the sharpest frame of every window of stride frames. With min_motion a
+    frame is only kept if it differs enough from the last kept one.
+    """
+
+    def __init__(self, mode="all", stride=1, min_motion=0.0):
+        if mode not in SELECTION_MODES:
+            raise ValueError(f"Unknown selection mode {mode}, expected one of {SELECTION_MODES}")
+        if stride < 1:
+            raise ValueError("stride must be at least 1")
+        self.mode = mode
+        self.stride = stride if mode != "all" else 1
+        self.min_motion = min_motion
+        self.last_thumb = None
+        self.candidate = None
+        self.seen = 0
+
+    def _accept(self, index, frame):
+        if self.min_motion > 0:
+            thumb = thumbnail(frame)
+            if self.last_thumb is not None and motion(thumb, self.last_thumb) < self.min_motion:
+                return []
+            self.last_thumb = thumb
+        return [(index, frame)]
+
+    def push(self, index, frame):
+        """Feeds one decoded frame, returns the (index, frame) pairs selected so far."""
+        position = self.seen % self.stride
+        self.seen += 1
+        if self.mode != "sharpest":
+            return self._accept(index, frame) if position == 0 else []
+
+        score = laplacian_variance(frame)
+        if self.candidate is None or score > self.candidate[0]:
+            self.candidate = (score, index, frame)
+        if position == self.stride - 1:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Releases the pending candidate at the end of the video."""
+        if self.candidate is None:
+            return []
+        _, index, frame = self.candidate
+        self.candidate = None
+        return self._accept(index, frame)
+
+
+def feature_thumbnail(frame, size=FEATURE_SIZE):
+    """size x size gray thumbnail with zero mean and unit variance, so exposure changes do not count as diversity."""
+    thumb = cv2.resize(to_gray(frame), (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return (thumb - thumb.mean()) / (thumb.std() + 1e-6)
+
+
+def _dct_matrix(size):
+    k = np.arange(size)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def perceptual_hashes(thumbs, hash_size=8):
+    """64-bit pHash of every (N, 32, 32) thumbnail: signs of the low DCT frequencies against their median."""
+    dct = _dct_matrix(thumbs.shape[-1])
+    low = (dct @ thumbs @ dct.T)[:, :hash_size, :hash_size].reshape(len(thumbs), -1)[:, 1:]
+    return low > np.median(low, axis=1, keepdims=True)
+
+
+def analyze_frames(frames, chunk_size=64):
+    """
+    Sharpness and diversity features of an iterable of BGR frames. Frames are
+    scored in chunks of chunk_size, so only the small thumbnails of the
+    whole video are kept. Returns (sharpness (N,), thumbnails (N, 32, 32)).
+    """
+    sharpness, thumbs, grays = [], [], []
+    for frame in frames:
+        grays.append(to_gray(frame))
+        thumbs.append(feature_thumbnail(grays[-1]))
+        if len(grays) == chunk_size:
+            sharpness.append(laplacian_variance_batch(np.stack(grays)))
+            grays = []
+    if grays:
+        sharpness.append(laplacian_variance_batch(np.stack(grays)))
+    if not thumbs:
+        return np.zeros(0, np.float32), np.zeros((0, FEATURE_SIZE, FEATURE_SIZE), np.float32)
+    return np.concatenate(sharpness), np.stack(thumbs)
+
+
+def select_frames(sharpness, thumbs, count, blur_percentile=20.0, sharpness_weight=1.0, metric="pixels"):
+    """
+    Indices (sorted) of count frames that are sharp and cover the capture:
+    the blurriest blur_percentile percent are dropped (unless fewer than
+    count would remain), then frames are picked greedily by their distance
+    to the closest frame picked so far, weighted by relative sharpness.
+    """
+    if metric not in DIVERSITY_METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {DIVERSITY_METRICS}")
+    n = len(sharpness)
+    if count >= n:
+        return np.arange(n)
+    threshold = min(np.percentile(sharpness, blur_percentile), np.sort(sharpness)[::-1][count - 1])
+    candidates = np.flatnonzero(sharpness >= threshold)
+    quality = (sharpness[candidates] / max(float(sharpness[candidates].max()), 1e-6)) ** sharpness_weight
+
+    if metric == "phash":
+        features = perceptual_hashes(thumbs[candidates])
+
+        def distance(i):
+            return (features != features[i]).sum(axis=1).astype(np.float32)
+    else:
+        features = thumbs[candidates]
+
+        def distance(i):
+            return np.abs(features - features[i]).mean(axis=(1, 2))
+
+    # Start with the sharpest frame, then farthest-point sampling
+    picked = [int(np.argmax(quality))]
+    min_distance = distance(picked[0])
+    for _ in range(count - 1):
+        gain = min_distance * quality
+        gain[picked] = -1.0
+        best = int(np.argmax(gain))
+        picked.append(best)
+        min_distance = np.minimum(min_distance, distance(best))
+    return np.sort(candidates[picked])
+
+
+def write_manifest(output_dir, video_path, fps, total_frames, frames, params=None):
+    """
+    Writes MANIFEST_FILE next to the extracted frames. frames is a list of
+    dicts with at least 'index' and 'file'; later steps read the selection
+    from here instead of from the folder listing.
+    """
+    manifest = {
+        "video": os.path.abspath(video_path),
+        "fps": fps,
+        "total_frames": total_frames,
+        "params": params or {},
+        "frames": frames,
+    }
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def read_manifest(path):
+    """Manifest from a file or from the MANIFEST_FILE in a frame folder."""
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_FILE)
+    with open(path) as f:
+        return json.load(f)
+
+
+class IndexSelector:
+    """Drop-in for StreamingSelector that keeps the frame indices listed in a manifest."""
+
+    def __init__(self, indices):
+        self.indices = set(int(i) for i in indices)
+
+    def push(self, index, frame):
+        return [(index, frame)] if index in self.indices else []
+
+    def flush(self):
+        return []
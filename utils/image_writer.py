@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torchvision
+
+
+class ImageWriter:
+    """
+    Writes images on a small thread pool so PNG encoding and disk IO overlap
+    with rendering. The image is copied to the CPU when it is submitted; at
+    most max_pending images are in flight, after that save() blocks, which
+    keeps host memory bounded when the disk is slower than the renderer.
+    """
+
+    def __init__(self, num_workers=4, max_pending=16):
+        self.pool = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="image-writer")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.errors = []
+
+    def save(self, image, path):
+        self.slots.acquire()
+        cpu_image = image.detach().cpu()
+        future = self.pool.submit(torchvision.utils.save_image, cpu_image, path)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        self.slots.release()
+        if future.exception() is not None:
+            self.errors.append(future.exception())
+
+    def close(self):
+        """Waits for all pending writes and re-raises the first failure."""
+        self.pool.shutdown(wait=True)
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Long-running Sapiens inference worker. The models are loaded once and stay
+resident; jobs (an image folder plus the maps to produce) are posted over a
+small JSON/HTTP API on localhost and run one after another through the
+batched pipeline of make_depth_maps.py.
+
+    python utils/inference_service.py serve --port 8765
+    python utils/inference_service.py submit <images> <depth_out> <seg_out>
+    python utils/make_depth_maps.py <images> <depth_out> <seg_out> --server http://127.0.0.1:8765
+
+'selftest' runs the whole round trip on the CPU with a tiny stand-in model.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import argparse
+import tempfile
+import threading
+import traceback
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import torch
+from torch import nn
+
+from make_depth_maps import add_runner_arguments, build_runner, list_images, run_pipeline, print_throughput
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class Job:
+    def __init__(self, input_dir, output_depth_dir, output_seg_dir, tasks, batch_size):
+        self.id = uuid.uuid4().hex[:12]
+        self.input_dir = input_dir
+        self.output_depth_dir = output_depth_dir
+        self.output_seg_dir = output_seg_dir
+        self.tasks = tasks
+        self.batch_size = batch_size
+        self.status = "queued"
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.stats = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        elapsed = (self.finished or time.time()) - self.started if self.started else 0.0
+        return {
+            "id": self.id,
+            "status": self.status,
+            "input_dir": self.input_dir,
+            "output_depth_dir": self.output_depth_dir,
+            "output_seg_dir": self.output_seg_dir,
+            "tasks": self.tasks,
+            "batch_size": self.batch_size,
+            "done": self.done,
+            "total": self.total,
+            "images_per_second": self.done / elapsed if elapsed > 0 else 0.0,
+            "elapsed": elapsed,
+            "error": self.error,
+            "stats": self.stats,
+        }
+
+
+class InferenceService:
+    """
+    Owns the runner and a single worker thread. Jobs are queued and run in
+    submission order, so the models are never used by two jobs at once.
+    """
+
+    def __init__(self, runner, decode_threads=4, writer_threads=4, default_batch_size=4):
+        self.runner = runner
+        self.decode_threads = decode_threads
+        self.writer_threads = writer_threads
+        self.default_batch_size = default_batch_size
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self._work, name="inference-worker", daemon=True)
+        self.worker.start()
+
+    def submit(self, request):
+        tasks = request.get("tasks") or [name for name in ("seg", "depth") if name in self.runner.tasks]
+        unknown = [name for name in tasks if name not in self.runner.tasks]
+        if unknown:
+            raise ValueError(f"Tasks {unknown} are not loaded by this service, available: {self.runner.tasks}")
+        input_dir = os.path.abspath(request["input_dir"])
+        if not os.path.isdir(input_dir):
+            raise ValueError(f"Input-Ordner nicht gefunden: {input_dir}")
+        batch_size = int(request.get("batch_size") or self.default_batch_size)
+        if batch_size < 1:
+            raise ValueError("batch_size muss mindestens 1 sein.")
+
+        job = Job(input_dir,
+                  os.path.abspath(request["output_depth_dir"]),
+                  os.path.abspath(request["output_seg_dir"]),
+                  tasks, batch_size)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def stop(self):
+        self.queue.put(None)
+        self.worker.join()
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            self._run(job)
+
+    def _run(self, job):
+        job.status, job.started = "running", time.time()
+        try:
+            image_paths = [os.path.join(job.input_dir, fname) for fname in list_images(job.input_dir)]
+            job.total = len(image_paths)
+            if "depth" in job.tasks:
+                os.makedirs(job.output_depth_dir, exist_ok=True)
+            if "seg" in job.tasks:
+                os.makedirs(job.output_seg_dir, exist_ok=True)
+
+            def progress(done, total):
+                job.done = done
+
+            job.stats = run_pipeline(image_paths, job.output_depth_dir, job.output_seg_dir, self.runner,
+                                     batch_size=job.batch_size, decode_threads=self.decode_threads,
+                                     writer_threads=self.writer_threads, verbose=False,
+                                     tasks=job.tasks, progress=progress)
+            job.status = "done"
+        except Exception as e:
+            traceback.print_exc()
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.time()
+            print(f"Job {job.id} {job.status}: {job.done}/{job.total} Bilder in {job.finished - job.started:.1f} s")
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health          loaded tasks and queue length
+    GET  /jobs            all jobs
+    GET  /jobs/<id>       one job with progress and, once done, the stage timings
+    POST /jobs            {"input_dir", "output_depth_dir", "output_seg_dir", "tasks", "batch_size"}
+    POST /shutdown        stop after the running job
+    """
+    service = None
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["health"]:
+            self._send(200, {"status": "ok", "tasks": self.service.runner.tasks,
+                             "device": str(self.service.runner.device), "queued": self.service.queue.qsize()})
+        elif parts == ["jobs"]:
+            self._send(200, [job.to_dict() for job in self.service.list()])
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self.service.get(parts[1])
+            if job is None:
+                self._send(404, {"error": f"Unknown job {parts[1]}"})
+            else:
+                self._send(200, job.to_dict())
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path == "/jobs":
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                job = self.service.submit(json.loads(self.rfile.read(length) or b"{}"))
+            except (KeyError, ValueError) as e:
+                self._send(400, {"error": f"{type(e).__name__}: {e}"})
+                return
+            self._send(202, job.to_dict())
+        elif self.path == "/shutdown":
+            self._send(200, {"status": "stopping"})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def log_message(self, format, *args):
+        # Progress is polled every second, keep the access log out of the console
+        pass
+
+
+def start_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Binds the HTTP API; port 0 picks a free port (see server.server_address)."""
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+class InferenceClient:
+    """Thin client for the service, used instead of running make_depth_maps.py directly."""
+
+    def __init__(self, url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=30.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read()).get("error", str(e))) from None
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"Inference-Dienst unter {self.url} nicht erreichbar: {e.reason}") from None
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def submit(self, input_dir, output_depth_dir, output_seg_dir, tasks=None, batch_size=None):
+        return self._request("POST", "/jobs", {
+            "input_dir": os.path.abspath(input_dir),
+            "output_depth_dir": os.path.abspath(output_depth_dir),
+            "output_seg_dir": os.path.abspath(output_seg_dir),
+            "tasks": tasks,
+            "batch_size": batch_size,
+        })
+
+    def status(self, job_id=None):
+        return self._request("GET", f"/jobs/{job_id}" if job_id else "/jobs")
+
+    def wait(self, job_id, poll_interval=1.0, callback=None):
+        """Polls until the job is done or failed and returns its final state."""
+        while True:
+            job = self.status(job_id)
+            if callback is not None:
+                callback(job)
+            if job["status"] in ("done", "failed"):
+                return job
+            time.sleep(poll_interval)
+
+    def shutdown(self):
+        return self._request("POST", "/shutdown")
+
+
+def print_job_progress(job):
+    print(f"\r[{job['status']:<7}] {job['done']}/{job['total']} Bilder "
+          f"({job['images_per_second']:.2f} Bilder/s)", end="\n" if job["status"] in ("done", "failed") else "",
+          flush=True)
+
+
+class StandInHead:
+    """
+    Tiny randomly initialized conv head with the interface of the Sapiens
+    models (infer() on a normalized (N, 3, 1024, 768) batch, output at a
+    quarter of the input resolution). Lets the service, the client and the
+    pipeline be exercised on the CPU without downloading any checkpoint.
+    """
+
+    def __init__(self, out_channels, device="cpu", seed=0):
+        torch.manual_seed(seed)
+        self.device = torch.device(device)
+        self.dtype = torch.float32
+        self.model = nn.Sequential(
+            nn.AvgPool2d(2),
+            nn.Conv2d(3, 8, 3, stride=2, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(8, out_channels, 1),
+        ).eval().to(self.device)
+
+    @torch.inference_mode()
+    def infer(self, tensor):
+        return self.model(tensor.to(self.device, self.dtype)).float()
+
+
+def standin_runner(device="cpu", tasks=("seg", "depth")):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "Sapiens-Pytorch-Inference"))
+    from sapiens_inference import SapiensMultiTask
+
+    # 28 body part classes like the segmentation models, one channel for depth
+    heads = {name: StandInHead(28 if name == "seg" else 1, device, seed=i) for i, name in enumerate(tasks)}
+    return SapiensMultiTask(device=device, preprocessing="tensor", use_streams=False, heads=heads)
+
+
+def selftest(args):
+    """Stand-in service on a free port, a few synthetic images, one job, checks the written maps."""
+    import cv2
+
+    service = InferenceService(standin_runner("cpu"), decode_threads=2, writer_threads=2, default_batch_size=2)
+    server = start_server(service, DEFAULT_HOST, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{DEFAULT_HOST}:{server.server_address[1]}"
+    client = InferenceClient(url)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            images, depth_dir, seg_dir = (os.path.join(tmp, name) for name in ("images", "depth", "seg"))
+            os.makedirs(images)
+            rng = np.random.default_rng(0)
+            sizes = [(480, 640), (720, 540), (480, 640)]
+            for i, (h, w) in enumerate(sizes):
+                cv2.imwrite(os.path.join(images, f"frame_{i:03d}.png"), rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+
+            print(f"Stand-in-Dienst unter {url}: {client.health()}")
+            job = client.submit(images, depth_dir, seg_dir, batch_size=2)
+            job = client.wait(job["id"], poll_interval=0.2, callback=print_job_progress)
+            if job["status"] != "done":
+                raise RuntimeError(f"Auftrag fehlgeschlagen: {job['error']}")
+            for i, (h, w) in enumerate(sizes):
+                for folder in (depth_dir, seg_dir):
+                    written = cv2.imread(os.path.join(folder, f"frame_{i:03d}.png"), cv2.IMREAD_UNCHANGED)
+                    if written is None or written.shape[:2] != (h, w):
+                        raise RuntimeError(f"Falsche oder fehlende Ausgabe in {folder} für frame_{i:03d}")
+
+            # Unknown task and missing folder are rejected without stopping the service
+            for bad in ({"input_dir": images, "output_depth_dir": depth_dir, "output_seg_dir": seg_dir,
+                         "tasks": ["normal"]},
+                        {"input_dir": os.path.join(tmp, "missing"), "output_depth_dir": depth_dir,
+                         "output_seg_dir": seg_dir}):
+                try:
+                    client._request("POST", "/jobs", bad)
+                except RuntimeError:
+                    continue
+                raise RuntimeError(f"Ungültiger Auftrag wurde angenommen: {bad}")
+        print_throughput(job["stats"], 2)
+        print("Selbsttest erfolgreich.")
+    finally:
+        server.shutdown()
+        service.stop()
+
+
+def serve(args):
+    if args.standin:
+        runner = standin_runner("cuda" if args.device == "gpu" and torch.cuda.is_available() else "cpu", args.tasks)
+    else:
+        runner = build_runner(args, args.tasks)
+    service = InferenceService(runner, decode_threads=args.decode_threads, writer_threads=args.writer_threads,
+                               default_batch_size=args.batch_size)
+    server = start_server(service, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"Inference-Dienst bereit unter http://{host}:{port} (Aufgaben: {', '.join(runner.tasks)}, "
+          f"Gerät: {runner.device})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Hält die Sapiens-Modelle geladen und verarbeitet Aufträge (Bildordner + Aufgaben) "
+                    "über eine lokale HTTP-Schnittstelle."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = sub.add_parser("serve", help="Dienst starten und Modelle einmal laden.")
+    add_runner_arguments(serve_parser)
+    serve_parser.add_argument("--host", default=DEFAULT_HOST,
+                              help=f"Adresse, an die der Dienst gebunden wird (Standard: {DEFAULT_HOST}, nur lokal).")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (Standard: {DEFAULT_PORT}).")
+    serve_parser.add_argument("--tasks", nargs="+", choices=["seg", "depth"], default=["seg", "depth"],
+                              help="Zu ladende Modelle (Standard: seg depth).")
+    serve_parser.add_argument("--batch_size", type=int, default=4,
+                              help="Batchgröße für Aufträge ohne eigene Angabe (Standard: 4).")
+    serve_parser.add_argument("--decode_threads", type=int, default=4,
+                              help="Threads zum Laden und Vorverarbeiten der Bilder (Standard: 4).")
+    serve_parser.add_argument("--writer_threads", type=int, default=4,
+                              help="Threads zum Schreiben der PNGs (Standard: 4).")
+    serve_parser.add_argument("--standin", action="store_true",
+                              help="Winziges Zufallsmodell statt Sapiens laden (zum Testen ohne Checkpoints).")
+
+    url = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+    submit_parser = sub.add_parser("submit", help="Auftrag schicken und Fortschritt anzeigen.")
+    submit_parser.add_argument("input_dir", help="Ordner mit den Eingabebildern.")
+    submit_parser.add_argument("output_depth_dir", help="Ordner für die Depth-Maps.")
+    submit_parser.add_argument("output_seg_dir", help="Ordner für die Segmentierungs-Maps.")
+    submit_parser.add_argument("--tasks", nargs="+", choices=["seg", "depth"], default=None,
+                               help="Zu erzeugende Maps (Standard: alle vom Dienst geladenen).")
+    submit_parser.add_argument("--batch_size", type=int, default=None,
+                               help="Batchgröße (Standard: die des Dienstes).")
+    submit_parser.add_argument("--no_wait", action="store_true", help="Nur die Auftrags-ID ausgeben.")
+    submit_parser.add_argument("--url", default=url, help=f"Adresse des Dienstes (Standard: {url}).")
+
+    status_parser = sub.add_parser("status", help="Zustand eines oder aller Aufträge.")
+    status_parser.add_argument("job_id", nargs="?", default=None)
+    status_parser.add_argument("--url", default=url, help=f"Adresse des Dienstes (Standard: {url}).")
+
+    shutdown_parser = sub.add_parser("shutdown", help="Dienst nach dem laufenden Auftrag beenden.")
+    shutdown_parser.add_argument("--url", default=url, help=f"Adresse des Dienstes (Standard: {url}).")
+
+    sub.add_parser("selftest", help="Dienst mit Stand-in-Modell auf der CPU starten und einen Auftrag prüfen.")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+    elif args.command == "selftest":
+        selftest(args)
+    elif args.command == "submit":
+        client = InferenceClient(args.url)
+        job = client.submit(args.input_dir, args.output_depth_dir, args.output_seg_dir,
+                            tasks=args.tasks, batch_size=args.batch_size)
+        print(f"Auftrag {job['id']} angenommen.")
+        if args.no_wait:
+            return
+        job = client.wait(job["id"], callback=print_job_progress)
+        if job["status"] != "done":
+            sys.exit(f"Auftrag {job['id']} fehlgeschlagen: {job['error']}")
+        print_throughput(job["stats"], job["batch_size"])
+    elif args.command == "status":
+        print(json.dumps(InferenceClient(args.url).status(args.job_id), indent=2))
+    elif args.command == "shutdown":
+        print(InferenceClient(args.url).shutdown()["status"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import torch
+
+from scene.spatial_index import SpatialIndex
+
+try:
+    from simple_knn._C import distCUDA2
+    SIMPLE_KNN_AVAILABLE = True
+except ImportError:
+    SIMPLE_KNN_AVAILABLE = False
+
+try:
+    from scipy.spatial import cKDTree
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+KNN_BACKENDS = ["auto", "simple_knn", "grid", "kdtree", "brute"]
+
+# Below this many points the exact brute force search is the fastest everywhere
+BRUTE_FORCE_LIMIT = 20_000
+
+
+# Candidate distances held at once by the chunked searches (~128 MB of float32)
+CANDIDATE_BUDGET = 1 << 25
+
+
+def _brute_force(queries, points, k, exclude_self, chunk_size=4096, point_chunk_size=8192):
+    """
+    Exact search of queries against all points, chunked over both so memory
+    stays at chunk_size x point_chunk_size distances; the k nearest are
+    merged chunk by chunk.
+    """
+    extra = 1 if exclude_self else 0
+    kk = min(k + extra, points.shape[0])
+    distances = torch.full((queries.shape[0], k), float("inf"), device=points.device)
+    for start in range(0, queries.shape[0], chunk_size):
+        q = queries[start:start + chunk_size]
+        best = torch.full((q.shape[0], kk), float("inf"), device=points.device)
+        for p_start in range(0, points.shape[0], point_chunk_size):
+            d = torch.cdist(q, points[p_start:p_start + point_chunk_size])
+            best = torch.topk(torch.cat([best, d], dim=1), kk, dim=1, largest=False).values
+        best = best[:, extra:]
+        distances[start:start + chunk_size, :best.shape[1]] = best
+    return distances
+
+
+def _grid(points, k):
+    """Grid-hash search; rows it cannot guarantee exact are redone by brute force."""
+    index = SpatialIndex(points, points_per_cell=max(2 * k, 8))
+    max_per_cell = int(min(index.cell_counts.max().item(), 256))
+    # Each query gathers 27 cells of up to max_per_cell candidates
+    chunk_size = max(256, CANDIDATE_BUDGET // (27 * max_per_cell * 3))
+    distances, _, exact = index.knn(points, k, max_per_cell=max_per_cell, chunk_size=chunk_size,
+                                    exclude_self=True, return_exact=True)
+    redo = (~exact).nonzero()[:, 0]
+    if redo.numel() > 0:
+        distances[redo] = _brute_force(points[redo], points, k, exclude_self=True)
+    return distances
+
+
+def _kdtree(points, k):
+    tree = cKDTree(points.cpu().numpy())
+    d, _ = tree.query(points.cpu().numpy(), k=k + 1, workers=-1)
+    return torch.as_tensor(d[:, 1:], dtype=torch.float32, device=points.device)
+
+
+def select_backend(points, k=3, backend="auto"):
+    if backend != "auto":
+        return backend
+    if points.is_cuda and SIMPLE_KNN_AVAILABLE and k == 3:
+        return "simple_knn"
+    if points.shape[0] <= BRUTE_FORCE_LIMIT:
+        return "brute"
+    if not points.is_cuda and SCIPY_AVAILABLE:
+        return "kdtree"
+    return "grid"
+
+
+@torch.no_grad()
+def knn_distances(points, k=3, backend="auto"):
+    """
+    (N, k) exact distances of every point to its k nearest other points, on
+    the device of points. Every backend returns the same values.
+    """
+    points = points.detach().float().contiguous()
+    backend = select_backend(points, k, backend)
+    if backend == "simple_knn":
+        raise ValueError("simple_knn only provides the mean squared distance, use mean_sq_knn_distance")
+    if backend == "brute":
+        return _brute_force(points, points, k, exclude_self=True)
+    if backend == "kdtree":
+        return _kdtree(points, k)
+    if backend == "grid":
+        return _grid(points, k)
+    raise ValueError("Unknown KNN backend {}, expected one of {}".format(backend, ", ".join(KNN_BACKENDS)))
+
+
+@torch.no_grad()
+def mean_sq_knn_distance(points, k=3, backend="auto"):
+    """Mean squared distance to the k nearest neighbours, the quantity distCUDA2 computes for k = 3."""
+    points = points.detach().float().contiguous()
+    backend = select_backend(points, k, backend)
+    if backend == "simple_knn":
+        return distCUDA2(points)
+    return knn_distances(points, k, backend).pow(2).mean(dim=1)
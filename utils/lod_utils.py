@@ -0,0 +1,118 @@
+import math
+import os
+
+import torch
+
+LOD_FILE = "lod.pt"
+DEFAULT_FRACTIONS = [1.0, 0.5, 0.25, 0.1]
+
+
+@torch.no_grad()
+def contribution_scores(gaussians, cameras, device=None, chunk_size=1 << 20):
+    """
+    Mean contribution of every Gaussian over the given cameras: opacity times
+    the projected area of its 3 sigma footprint in pixels (capped at the image
+    area), zero where it is outside the frustum. Works on any device, the
+    camera matrices are moved to it.
+    """
+    device = device or gaussians.get_xyz.device
+    xyz = gaussians.get_xyz.detach().to(device)
+    opacity = gaussians.get_opacity.detach().to(device)[:, 0]
+    extent = 3.0 * gaussians.get_scaling.detach().to(device).max(dim=1).values
+    scores = torch.zeros(xyz.shape[0], device=device)
+    if len(cameras) == 0:
+        return scores
+
+    for cam in cameras:
+        view = cam.world_view_transform.to(device)
+        proj = cam.full_proj_transform.to(device)
+        focal = math.sqrt(cam.image_width / (2.0 * math.tan(cam.FoVx * 0.5)) *
+                          cam.image_height / (2.0 * math.tan(cam.FoVy * 0.5)))
+        max_area = float(cam.image_width * cam.image_height)
+        for start in range(0, xyz.shape[0], chunk_size):
+            end = min(start + chunk_size, xyz.shape[0])
+            hom = torch.cat((xyz[start:end], torch.ones(end - start, 1, device=device)), dim=1)
+            depth = hom @ view[:, 2]
+            clip = hom @ proj
+            ndc = clip[:, :2] / clip[:, 3:].clamp_min(1e-7)
+            # Same near plane and frustum margin as the rasterizer's culling
+            visible = (depth > 0.2) & (ndc.abs() <= 1.3).all(dim=1)
+            radius = extent[start:end] * focal / depth.clamp_min(0.2)
+            area = (math.pi * radius * radius).clamp(max=max_area)
+            scores[start:end] += torch.where(visible, opacity[start:end] * area, torch.zeros_like(area))
+    return scores / len(cameras)
+
+
+def build_lod(scores, opacity, fractions=DEFAULT_FRACTIONS, min_opacity=0.0):
+    """
+    Nested LOD levels. Gaussians are ranked by score, level i keeps the best
+    fractions[i] of them, so every level is a prefix of the ranking and a
+    subset of the level before. Gaussians below min_opacity or with zero
+    score are in no level.
+    """
+    keep = (scores > 0) & (opacity.reshape(-1).to(scores.device) >= min_opacity)
+    candidates = keep.nonzero()[:, 0]
+    order = candidates[torch.argsort(scores[candidates], descending=True)]
+    counts = [max(1, int(math.ceil(f * order.shape[0]))) for f in fractions]
+    return {"order": order.cpu(), "counts": counts, "fractions": list(fractions), "num_gaussians": int(scores.shape[0])}
+
+
+def lod_path(model_path, iteration):
+    return os.path.join(model_path, "point_cloud", "iteration_" + str(iteration), LOD_FILE)
+
+
+def save_lod(path, lod):
+    torch.save(lod, path)
+
+
+def load_lod(path):
+    if not os.path.exists(path):
+        return None
+    return torch.load(path)
+
+
+def ordered_model(gaussians, lod):
+    """The model reordered by the LOD ranking, so level i is ordered_model(...).subset(counts[i])."""
+    if lod["num_gaussians"] != gaussians.get_xyz.shape[0]:
+        raise ValueError("LOD was built for {} Gaussians, the model has {}".format(lod["num_gaussians"], gaussians.get_xyz.shape[0]))
+    return gaussians.subset(lod["order"].to(gaussians.get_xyz.device))
+
+
+def level_model(gaussians, lod, level):
+    return ordered_model(gaussians, lod).subset(lod["counts"][level])
+
+
+def get_or_build_lod(gaussians, cameras, model_path, iteration, fractions=DEFAULT_FRACTIONS, min_opacity=0.0, device=None):
+    """Loads the stored LOD of a trained model or builds it from the given cameras."""
+    path = lod_path(model_path, iteration)
+    lod = load_lod(path)
+    if lod is not None and lod["num_gaussians"] == gaussians.get_xyz.shape[0]:
+        return lod
+    print("Building LOD levels from {} cameras".format(len(cameras)))
+    scores = contribution_scores(gaussians, cameras, device)
+    return build_lod(scores, gaussians.get_opacity.detach(), fractions, min_opacity)
+
+
+class LodController:
+    """
+    Picks the LOD level for the next frame so the render time stays near
+    target_ms: coarser when the last frames were too slow, finer when they
+    left plenty of headroom.
+    """
+
+    def __init__(self, num_levels, target_ms, smoothing=0.3):
+        self.num_levels = num_levels
+        self.target_ms = target_ms
+        self.smoothing = smoothing
+        self.level = 0
+        self.frame_ms = None
+
+    def update(self, render_ms):
+        self.frame_ms = render_ms if self.frame_ms is None else (1 - self.smoothing) * self.frame_ms + self.smoothing * render_ms
+        if self.frame_ms > 1.1 * self.target_ms and self.level < self.num_levels - 1:
+            self.level += 1
+            self.frame_ms = None
+        elif self.frame_ms < 0.6 * self.target_ms and self.level > 0:
+            self.level -= 1
+            self.frame_ms = None
+        return self.level
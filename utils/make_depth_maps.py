@@ -1,51 +1,282 @@
 #!/usr/bin/env python3
 import os
 import sys
+import time
 import argparse
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from PIL import Image
 import torch
+import torch.nn.functional as F
 
-def main():
+from frame_selection import MANIFEST_FILE, read_manifest
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
+
+
+def list_images(input_dir):
+    """Image files of the folder, or the frames selected in its manifest if vid_to_frames.py wrote one."""
+    if os.path.exists(os.path.join(input_dir, MANIFEST_FILE)):
+        files = [entry["file"] for entry in read_manifest(input_dir)["frames"]]
+        return [f for f in files if os.path.exists(os.path.join(input_dir, f))]
+    return sorted(f for f in os.listdir(input_dir) if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+
+
+def load_image(path, prepare):
+    """Decode worker: reads one image and returns its host side preprocessing result and original size."""
+    # Like PIL, ignore the EXIF orientation so the maps line up with the stored pixels
+    bgr = cv2.imread(path, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if bgr is None:
+        raise IOError(f"Bild konnte nicht gelesen werden: {path}")
+    return prepare(bgr), bgr.shape[:2]
+
+
+def iter_batches(paths, prepare, batch_size, num_workers):
+    """Yields lists of (path, prepared, size) while the pool decodes ahead, at most two batches in flight."""
+    with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="decode") as pool:
+        remaining = iter(paths)
+        pending = deque()
+
+        def submit(path):
+            pending.append((path, pool.submit(load_image, path, prepare)))
+
+        for path in islice(remaining, 2 * batch_size):
+            submit(path)
+        batch = []
+        while pending:
+            path, future = pending.popleft()
+            prepared, size = future.result()
+            batch.append((path, prepared, size))
+            next_path = next(remaining, None)
+            if next_path is not None:
+                submit(next_path)
+            if len(batch) == batch_size or not pending:
+                yield batch
+                batch = []
+
+
+@torch.inference_mode()
+def infer_batch(runner, prepared, sizes, tasks=("seg", "depth")):
+    """
+    One forward per model over the stacked batch, both reading the same
+    device tensor. Upsampling, argmax and depth normalization stay on the
+    device; only the uint8 mask and the uint8 masked depth of every image
+    come back (None for a task that was not requested; without the
+    segmentation the depth is left unmasked). Also returns the seconds
+    each model took.
+    """
+    batch = runner.to_batch(list(prepared))
+    outputs, head_times = runner.forward(batch, tasks=list(tasks))
+    seg_logits, depth = outputs.get("seg"), outputs.get("depth")
+
+    results = []
+    for i, (h, w) in enumerate(sizes):
+        human_mask = seg_mask_8u = modified_8u = None
+        if seg_logits is not None:
+            logits = F.interpolate(seg_logits[i:i + 1].float(), size=(h, w), mode="bilinear")
+            human_mask = logits[0].argmax(dim=0) > 0
+            seg_mask_8u = (human_mask.to(torch.uint8) * 255).cpu().numpy()
+
+        if depth is not None:
+            depth_map = F.interpolate(depth[i:i + 1].float(), size=(h, w), mode="bilinear")[0, 0]
+            finite = depth_map[~torch.isnan(depth_map)]
+            d_min, d_max = finite.min(), finite.max()
+            modified_depth = (depth_map - d_min) / (d_max - d_min + 1e-8)
+            if human_mask is not None:
+                modified_depth = torch.where(human_mask, modified_depth, torch.ones_like(modified_depth))
+            modified_8u = (modified_depth * 255).to(torch.uint8).cpu().numpy()
+        results.append((seg_mask_8u, modified_8u))
+    return results, head_times
+
+
+def write_maps(seg_mask_8u, modified_8u, seg_out_path, depth_out_path, frame=None, image_out_path=None,
+               image_params=()):
+    if frame is not None:
+        cv2.imwrite(image_out_path, frame, list(image_params))
+    if seg_mask_8u is not None:
+        cv2.imwrite(seg_out_path, seg_mask_8u)
+    if modified_8u is not None:
+        cv2.imwrite(depth_out_path, cv2.applyColorMap(modified_8u, cv2.COLORMAP_TURBO))
+
+
+def run_pipeline(image_paths, out_depth_dir, out_seg_dir, runner,
+                 batch_size=4, decode_threads=4, writer_threads=4, verbose=True,
+                 tasks=None, progress=None):
+    """
+    Decode pool -> batched segmentation + depth -> writer pool. runner is a
+    SapiensMultiTask with the seg and/or depth head; tasks restricts the run
+    to some of them. progress(done, total) is called after every batch.
+    Returns the number of images and the seconds spent waiting on each
+    stage and in each model.
+    """
+    batches = iter_batches(image_paths, runner.prepare, batch_size, decode_threads)
+    return process_batches(batches, len(image_paths), out_depth_dir, out_seg_dir, runner,
+                           batch_size=batch_size, writer_threads=writer_threads, verbose=verbose,
+                           tasks=tasks, progress=progress)
+
+
+def process_batches(batches, total, out_depth_dir, out_seg_dir, runner,
+                    batch_size=4, writer_threads=4, verbose=True, tasks=None, progress=None,
+                    out_image_dir=None, image_ext=".png", image_params=()):
+    """
+    Inference and writing part of run_pipeline for any source of batches.
+    An entry is (path, prepared, size) or, for decoded video frames,
+    (name, prepared, size, frame); the frame itself is then written to
+    out_image_dir next to its maps. total may be None if it is not known.
+    """
+    tasks = [name for name in ("seg", "depth") if name in (tasks or runner.tasks)]
+    if not tasks:
+        raise ValueError("Es muss mindestens eine der Aufgaben 'seg' oder 'depth' aktiv sein.")
+    stats = {"images": 0, "decode": 0.0, "inference": 0.0, "write": 0.0, "total": 0.0,
+             "heads": {name: 0.0 for name in tasks}}
+    writer = ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix="map-writer")
+    slots = threading.BoundedSemaphore(2 * batch_size * writer_threads)
+    futures = []
+
+    start = time.perf_counter()
+    try:
+        while True:
+            t0 = time.perf_counter()
+            batch = next(batches, None)
+            stats["decode"] += time.perf_counter() - t0
+            if batch is None:
+                break
+
+            t0 = time.perf_counter()
+            paths, prepared, sizes = zip(*(entry[:3] for entry in batch))
+            frames = [entry[3] if len(entry) > 3 else None for entry in batch]
+            results, head_times = infer_batch(runner, prepared, sizes, tasks)
+            stats["inference"] += time.perf_counter() - t0
+            for name, seconds in head_times.items():
+                stats["heads"][name] += seconds
+
+            t0 = time.perf_counter()
+            for path, frame, (seg_mask_8u, modified_8u) in zip(paths, frames, results):
+                name = os.path.splitext(os.path.basename(path))[0]
+                image_out_path = os.path.join(out_image_dir, f"{name}{image_ext}") if frame is not None else None
+                slots.acquire()
+                future = writer.submit(write_maps, seg_mask_8u, modified_8u,
+                                       os.path.join(out_seg_dir, f"{name}.png"),
+                                       os.path.join(out_depth_dir, f"{name}.png"),
+                                       frame, image_out_path, image_params)
+                future.add_done_callback(lambda _: slots.release())
+                futures.append(future)
+            stats["write"] += time.perf_counter() - t0
+            stats["images"] += len(batch)
+            if verbose:
+                print(f"Processed {stats['images']}/{total if total is not None else '?'}: "
+                      + ", ".join(os.path.basename(p) for p in paths))
+            if progress is not None:
+                progress(stats["images"], total)
+    finally:
+        t0 = time.perf_counter()
+        writer.shutdown(wait=True)
+        stats["write"] += time.perf_counter() - t0
+    for future in futures:
+        future.result()
+    stats["total"] = time.perf_counter() - start
+    return stats
+
+
+def print_throughput(stats, batch_size):
+    n, total = stats["images"], max(stats["total"], 1e-9)
+    print(f"\n{n} Bilder in {total:.1f} s ({n / total:.2f} Bilder/s, Batchgröße {batch_size})")
+    for stage in ("decode", "inference", "write"):
+        print(f"  {stage:<10} {stats[stage]:8.2f} s  ({100 * stats[stage] / total:5.1f} %)")
+        if stage == "inference":
+            for name, seconds in stats["heads"].items():
+                print(f"    {name:<8} {seconds:8.2f} s")
+
+
+def add_runner_arguments(parser):
+    """Model options shared by this script and utils/inference_service.py."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
     default_sapiens = os.path.join(script_dir, "Sapiens-Pytorch-Inference")
+    if not os.path.isdir(default_sapiens):
+        # Checked out next to utils/ at the repository root
+        default_sapiens = os.path.join(os.path.dirname(script_dir), "Sapiens-Pytorch-Inference")
 
-    parser = argparse.ArgumentParser(
-        description="Erstellt Depth- und Segmentation-Maps für alle Bilder in einem Ordner.\n"
-                    "Die Ausgabedateien werden immer als PNG gespeichert."
-    )
-    parser.add_argument(
-        "input_dir",
-        help="Pfad zum Ordner mit den Eingabebildern (z. B. JPG/PNG)."
-    )
-    parser.add_argument(
-        "output_depth_dir",
-        help="Pfad zum Ordner für die ausgegebenen Depth-Maps."
-    )
-    parser.add_argument(
-        "output_seg_dir",
-        help="Pfad zum Ordner für die ausgegebenen Segmentierungs-Maps."
-    )
     parser.add_argument(
         "--sapiens_dir",
         default=default_sapiens,
         help=f"Pfad zum Sapiens-Pytorch-Inference-Ordner (Standard: '{default_sapiens}'). "
              "Die Modelle werden automatisch in '…/Sapiens-Pytorch-Inference/models/' gespeichert."
     )
+    parser.add_argument(
+        "--model_dir",
+        default=None,
+        help="Absoluter Cache-Ordner für die Modelle (Standard: $SAPIENS_MODEL_DIR oder '…/Sapiens-Pytorch-Inference/models/')."
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Nichts herunterladen, nur bereits vorhandene (geprüfte) Modelle verwenden."
+    )
     parser.add_argument(
         "--device",
         choices=["cpu", "gpu"],
         default="gpu",
         help="Gerät, auf dem die Modelle laufen: 'gpu' (CUDA) oder 'cpu' (Standard: gpu)."
     )
+    parser.add_argument(
+        "--preprocessing",
+        choices=["tensor", "pil"],
+        default="tensor",
+        help="'tensor': Resize und Normalisierung auf dem Gerät (Standard), 'pil': bisheriger PIL-Pfad auf der CPU."
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["torchscript", "onnx"],
+        default="torchscript",
+        help="'onnx': exportierte Modelle mit ONNX Runtime ausführen (seg1b.onnx/depth1b.onnx aus onnx_export.py), "
+             "sinnvoll für Rechner ohne GPU (Standard: torchscript)."
+    )
+    parser.add_argument(
+        "--onnx_dir",
+        default=None,
+        help="Ordner mit den ONNX-Modellen (Standard: der Sapiens-Ordner)."
+    )
+    parser.add_argument(
+        "--onnx_threads",
+        type=int,
+        default=0,
+        help="Intra-op-Threads von ONNX Runtime (Standard: 0 = ein Thread pro physischem Kern)."
+    )
+    parser.add_argument(
+        "--precision",
+        choices=["fp32", "fp16", "bf16", "autocast-fp16", "autocast-bf16"],
+        default="fp32",
+        help="Rechengenauigkeit der Modelle (Standard: fp32). Vorher mit "
+             "Sapiens-Pytorch-Inference/benchmark_precision.py gegen fp32 prüfen."
+    )
+    parser.add_argument(
+        "--channels_last",
+        action="store_true",
+        help="Modelle und Eingaben im channels_last-Speicherformat ausführen."
+    )
+    parser.add_argument(
+        "--compile",
+        choices=["none", "freeze", "torch_compile"],
+        default="none",
+        help="'freeze': TorchScript-Modelle einfrieren und für Inferenz optimieren (Standard: none)."
+    )
+    parser.add_argument(
+        "--cache_converted",
+        action="store_true",
+        help="Bei fp16/bf16 die konvertierten Gewichte neben dem Checkpoint speichern (schnellerer Kaltstart)."
+    )
 
-    args = parser.parse_args()
 
-    input_dir = os.path.abspath(args.input_dir)
-    out_depth_dir = os.path.abspath(args.output_depth_dir)
-    out_seg_dir = os.path.abspath(args.output_seg_dir)
+def build_runner(args, tasks=("seg", "depth")):
+    """
+    Loads the models selected by add_runner_arguments() once and returns a
+    SapiensMultiTask with a head for each of the given tasks.
+    """
     sapiens_dir = os.path.abspath(args.sapiens_dir)
+    onnx_dir = os.path.abspath(args.onnx_dir) if args.onnx_dir else sapiens_dir
     device_choice = args.device
 
     if not os.path.isdir(sapiens_dir):
@@ -56,24 +287,28 @@ def main():
             f"Bitte stelle sicher, dass '{sapiens_dir}/sapiens_inference' existiert."
         )
 
-    if not os.path.isdir(input_dir):
-        raise FileNotFoundError(f"Input-Ordner nicht gefunden: {input_dir}")
-    os.makedirs(out_depth_dir, exist_ok=True)
-    os.makedirs(out_seg_dir, exist_ok=True)
-
-    sys.path.insert(0, sapiens_dir)
+    if sapiens_dir not in sys.path:
+        sys.path.insert(0, sapiens_dir)
+    if args.model_dir:
+        os.environ["SAPIENS_MODEL_DIR"] = os.path.abspath(args.model_dir)
+    if args.offline:
+        os.environ["SAPIENS_OFFLINE"] = "1"
 
     from sapiens_inference import (
-        SapiensDepth,
         SapiensDepthType,
-        SapiensSegmentation,
         SapiensSegmentationType,
-        SapiensConfig
+        SapiensConfig,
+        SapiensMultiTask,
+        InferenceOptions,
+        SapiensSegmentationOnnx,
+        SapiensDepthOnnx
     )
 
     config = SapiensConfig()
-    config.depth_type = SapiensDepthType.DEPTH_1B
-    config.segmentation_type = SapiensSegmentationType.SEGMENTATION_1B
+    config.depth_type = SapiensDepthType.DEPTH_1B if "depth" in tasks else SapiensDepthType.OFF
+    config.segmentation_type = SapiensSegmentationType.SEGMENTATION_1B if "seg" in tasks else None
+    config.inference_options = InferenceOptions(precision=args.precision, channels_last=args.channels_last,
+                                                compile=args.compile, cache_converted=args.cache_converted)
 
     if device_choice == "gpu":
         if torch.cuda.is_available():
@@ -84,60 +319,102 @@ def main():
     else:
         config.device = "cpu"
 
-    orig_cwd = os.getcwd()
-    try:
-        os.makedirs(os.path.join(sapiens_dir, "models"), exist_ok=True)
-        os.chdir(sapiens_dir)
-        depth_predictor = SapiensDepth(config.depth_type, config.device, config.dtype)
-        seg_predictor = SapiensSegmentation(config.segmentation_type, config.device, config.dtype)
-    finally:
-        os.chdir(orig_cwd)
-
-    extensions = {".jpg", ".jpeg", ".png", ".bmp", ".tiff"}
+    # The model registry resolves absolute paths, no need to change into the Sapiens folder
+    # Segmentation and depth share one preprocessing pass and run on separate CUDA streams
+    if args.backend == "onnx":
+        heads = {}
+        if "seg" in tasks:
+            heads["seg"] = SapiensSegmentationOnnx(os.path.join(onnx_dir, "seg1b.onnx"), config.device,
+                                                   intra_op_threads=args.onnx_threads, allow_spinning=False)
+        if "depth" in tasks:
+            heads["depth"] = SapiensDepthOnnx(os.path.join(onnx_dir, "depth1b.onnx"), config.device,
+                                              intra_op_threads=args.onnx_threads, allow_spinning=False)
+        return SapiensMultiTask(device=config.device, preprocessing="tensor", use_streams=False, heads=heads)
+    return SapiensMultiTask.from_config(config, preprocessing=args.preprocessing)
 
-    for fname in os.listdir(input_dir):
-        name, ext = os.path.splitext(fname)
-        if ext.lower() not in extensions:
-            continue
 
-        img_path = os.path.join(input_dir, fname)
-        pil = Image.open(img_path).convert("RGB")
-        rgb_np = np.array(pil)
-        bgr_np = cv2.cvtColor(rgb_np, cv2.COLOR_RGB2BGR)
-        H, W = bgr_np.shape[:2]
-
-        seg_logits = seg_predictor(bgr_np)
-        if isinstance(seg_logits, torch.Tensor):
-            seg_map = seg_logits.squeeze().cpu().numpy()
-        else:
-            seg_map = seg_logits
-
-        if seg_map.shape != (H, W):
-            seg_map = cv2.resize(seg_map, (W, H), interpolation=cv2.INTER_LINEAR)
-        human_mask = (seg_map > 0.5).astype(np.uint8)
+def main():
+    parser = argparse.ArgumentParser(
+        description="Erstellt Depth- und Segmentation-Maps für alle Bilder in einem Ordner.\n"
+                    "Die Ausgabedateien werden immer als PNG gespeichert."
+    )
+    parser.add_argument(
+        "input_dir",
+        help="Pfad zum Ordner mit den Eingabebildern (z. B. JPG/PNG)."
+    )
+    parser.add_argument(
+        "output_depth_dir",
+        help="Pfad zum Ordner für die ausgegebenen Depth-Maps."
+    )
+    parser.add_argument(
+        "output_seg_dir",
+        help="Pfad zum Ordner für die ausgegebenen Segmentierungs-Maps."
+    )
+    add_runner_arguments(parser)
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=4,
+        help="Anzahl Bilder pro Forward-Pass beider Modelle (Standard: 4). 1 entspricht der alten Einzelbild-Verarbeitung."
+    )
+    parser.add_argument(
+        "--decode_threads",
+        type=int,
+        default=4,
+        help="Threads zum Laden und Vorverarbeiten der Bilder (Standard: 4)."
+    )
+    parser.add_argument(
+        "--writer_threads",
+        type=int,
+        default=4,
+        help="Threads zum Schreiben der PNGs (Standard: 4)."
+    )
 
-        depth_raw = depth_predictor(bgr_np)
-        if isinstance(depth_raw, torch.Tensor):
-            depth_np = depth_raw.squeeze().cpu().numpy()
-        else:
-            depth_np = depth_raw
+    parser.add_argument(
+        "--tasks",
+        nargs="+",
+        choices=["seg", "depth"],
+        default=["seg", "depth"],
+        help="Zu erzeugende Maps (Standard: seg depth). Ohne 'seg' wird die Depth-Map nicht maskiert."
+    )
+    parser.add_argument(
+        "--server",
+        default=None,
+        help="URL eines laufenden utils/inference_service.py (z. B. http://127.0.0.1:8765). "
+             "Dann werden die Modelle nicht hier geladen, sondern der Auftrag an den Dienst geschickt."
+    )
 
-        d_min, d_max = np.nanmin(depth_np), np.nanmax(depth_np)
-        depth_norm = (depth_np - d_min) / (d_max - d_min + 1e-8)
+    args = parser.parse_args()
 
-        modified_depth = np.where(human_mask == 1, depth_norm, 1.0)
+    input_dir = os.path.abspath(args.input_dir)
+    out_depth_dir = os.path.abspath(args.output_depth_dir)
+    out_seg_dir = os.path.abspath(args.output_seg_dir)
 
-        modified_8u = (modified_depth * 255).astype(np.uint8)
-        depth_color_bgr = cv2.applyColorMap(modified_8u, cv2.COLORMAP_TURBO)
+    if not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"Input-Ordner nicht gefunden: {input_dir}")
+    if args.batch_size < 1:
+        raise ValueError("--batch_size muss mindestens 1 sein.")
 
-        seg_mask_8u = (human_mask * 255).astype(np.uint8)
-        seg_out_path = os.path.join(out_seg_dir, f"{name}.png")
-        cv2.imwrite(seg_out_path, seg_mask_8u)
+    if args.server:
+        # Models stay resident in the service, only the job description is sent
+        from inference_service import InferenceClient, print_job_progress
+        client = InferenceClient(args.server)
+        job = client.submit(input_dir, out_depth_dir, out_seg_dir, tasks=args.tasks, batch_size=args.batch_size)
+        job = client.wait(job["id"], callback=print_job_progress)
+        if job["status"] != "done":
+            sys.exit(f"Auftrag {job['id']} fehlgeschlagen: {job['error']}")
+        print_throughput(job["stats"], args.batch_size)
+        return
 
-        depth_out_path = os.path.join(out_depth_dir, f"{name}.png")
-        cv2.imwrite(depth_out_path, depth_color_bgr)
+    os.makedirs(out_depth_dir, exist_ok=True)
+    os.makedirs(out_seg_dir, exist_ok=True)
+    runner = build_runner(args, args.tasks)
 
-        print(f"Processed: {fname} → Seg: {seg_out_path}, Depth: {depth_out_path}")
+    image_paths = [os.path.join(input_dir, fname) for fname in list_images(input_dir)]
+    stats = run_pipeline(image_paths, out_depth_dir, out_seg_dir, runner,
+                         batch_size=args.batch_size, decode_threads=args.decode_threads,
+                         writer_threads=args.writer_threads, tasks=args.tasks)
+    print_throughput(stats, args.batch_size)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,139 @@
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+import torch
+
+
+class StageTimer:
+    """
+    Named timing scopes for the training loop.
+
+    On CUDA each scope records a pair of torch.cuda.Events, which are only
+    resolved in flush(), so timing does not add a synchronisation per scope.
+    On CPU time.perf_counter is used. Durations are kept in milliseconds per
+    stage until summary() is called. Scopes may nest (eval runs inside
+    logging), in which case the outer scope includes the inner time; nested
+    scopes are remembered so that shares are taken of the top-level total.
+    """
+
+    def __init__(self, enabled=True, device="cuda", chrome_trace_path=None):
+        self.enabled = enabled
+        self.use_cuda = enabled and device == "cuda" and torch.cuda.is_available()
+        self.chrome_trace_path = chrome_trace_path
+        self.durations = {}
+        self.pending = []
+        self.trace_events = []
+        self.origin = time.perf_counter()
+        self.depth = 0
+        self.nested = set()
+
+    def scope(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return self._scope(name)
+
+    @contextmanager
+    def _scope(self, name):
+        if self.depth > 0:
+            self.nested.add(name)
+        self.depth += 1
+        try:
+            with self._timed(name):
+                yield
+        finally:
+            self.depth -= 1
+
+    @contextmanager
+    def _timed(self, name):
+        host_start = time.perf_counter()
+        if self.use_cuda:
+            start = torch.cuda.Event(enable_timing=True)
+            end = torch.cuda.Event(enable_timing=True)
+            start.record()
+            try:
+                yield
+            finally:
+                end.record()
+                self.pending.append((name, host_start, start, end))
+        else:
+            try:
+                yield
+            finally:
+                self._add(name, host_start, (time.perf_counter() - host_start) * 1000.0)
+
+    def _add(self, name, host_start, elapsed_ms):
+        self.durations.setdefault(name, []).append(elapsed_ms)
+        if self.chrome_trace_path:
+            self.trace_events.append({"name": name, "ph": "X", "pid": 0, "tid": 0,
+                                      "ts": (host_start - self.origin) * 1e6, "dur": elapsed_ms * 1000.0})
+
+    def flush(self):
+        """Resolve outstanding CUDA events (synchronises once)."""
+        if not self.pending:
+            return
+        self.pending[-1][3].synchronize()
+        for name, host_start, start, end in self.pending:
+            self._add(name, host_start, start.elapsed_time(end))
+        self.pending = []
+
+    def summary(self, percentiles=(50, 90, 99), reset=True):
+        """Returns {stage: {"mean": .., "p50": .., ..., "total": .., "count": ..}} in ms."""
+        self.flush()
+        stats = {}
+        for name, values in self.durations.items():
+            values = np.asarray(values)
+            entry = {"mean": float(values.mean()), "total": float(values.sum()), "count": int(values.size)}
+            for p, v in zip(percentiles, np.percentile(values, percentiles)):
+                entry["p{}".format(p)] = float(v)
+            stats[name] = entry
+        if reset:
+            self.durations = {}
+        return stats
+
+    def report(self, iteration, tb_writer=None, wandb_run=None, print_summary=False):
+        """Streams the current summary to TensorBoard / wandb and resets the window."""
+        stats = self.summary()
+        if not stats:
+            return stats
+        if tb_writer:
+            for name, entry in stats.items():
+                for key, value in entry.items():
+                    if key != "count":
+                        tb_writer.add_scalar("stage_time/{}/{}".format(name, key), value, iteration)
+        if wandb_run is not None:
+            wandb_run.log({"stage_time/{}/{}".format(name, key): value
+                           for name, entry in stats.items() for key, value in entry.items() if key != "count"}, step=iteration)
+        if print_summary:
+            # Nested scopes are already part of their parent's time
+            total = sum(entry["total"] for name, entry in stats.items() if name not in self.nested)
+            print("\n[ITER {}] Stage breakdown (ms, mean / p90 / share):".format(iteration))
+            for name in sorted(stats, key=lambda n: -stats[n]["total"]):
+                entry = stats[name]
+                print("  {:<14} {:>9.3f} {:>9.3f} {:>6.1f}%".format(name, entry["mean"], entry.get("p90", entry["mean"]), 100.0 * entry["total"] / max(total, 1e-9)))
+        return stats
+
+    def export_chrome_trace(self, path=None):
+        path = path or self.chrome_trace_path
+        if not path:
+            return
+        self.flush()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, f)
+        print("Chrome trace written to {}".format(path))
+
+
+def make_torch_profiler(output_dir, wait=5, warmup=5, active=10):
+    """torch.profiler schedule writing a TensorBoard trace into output_dir. Call .step() each iteration."""
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=wait, warmup=warmup, active=active, repeat=1),
+        on_trace_ready=torch.profiler.tensorboard_trace_handler(output_dir),
+        record_shapes=False,
+        with_stack=False)
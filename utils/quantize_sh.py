@@ -0,0 +1,59 @@
+import os
+from argparse import ArgumentParser
+
+import torch
+
+from arguments import ModelParams, PipelineParams, OptimizationParams, get_combined_args
+from scene import Scene, GaussianModel
+from utils.compact import evaluate, finetune
+from utils.compression import COMPRESSED_FILE, save_compressed
+from utils.general_utils import safe_state
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Replace the SH rest coefficients by a k-means codebook and fine-tune it")
+    model = ModelParams(parser, sentinel=True)
+    pipeline = PipelineParams(parser)
+    optimization = OptimizationParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--codebook_size", type=int, default=4096)
+    parser.add_argument("--kmeans_iterations", type=int, default=20)
+    parser.add_argument("--kmeans_device", type=str, default=None,
+                        help="Device for the clustering (default: the model's device)")
+    parser.add_argument("--finetune_iterations", type=int, default=1000)
+    parser.add_argument("--output_iteration", type=int, default=None,
+                        help="Save as point_cloud/iteration_<n> (default: loaded iteration + finetune_iterations)")
+    parser.add_argument("--quiet", action="store_true")
+    args = get_combined_args(parser)
+    safe_state(args.quiet)
+
+    if not 0 < args.codebook_size <= 65536:
+        raise ValueError("The codebook size must be between 1 and 65536 to fit uint16 indices")
+
+    dataset, pipe, opt = model.extract(args), pipeline.extract(args), optimization.extract(args)
+    gaussians = GaussianModel(dataset.sh_degree)
+    scene = Scene(dataset, gaussians, load_iteration=args.iteration, shuffle=False)
+    background = torch.tensor([1, 1, 1] if dataset.white_background else [0, 0, 0], dtype=torch.float32, device="cuda")
+    eval_cameras = scene.getTestCameras() or scene.getTrainCameras()
+
+    results = [("original", evaluate(gaussians, eval_cameras, pipe, background))]
+    gaussians.quantize_sh(args.codebook_size, args.kmeans_iterations, args.kmeans_device)
+    results.append(("codebook", evaluate(gaussians, eval_cameras, pipe, background)))
+    if args.finetune_iterations > 0:
+        finetune(gaussians, scene, opt, pipe, background, args.finetune_iterations, scene.cameras_extent)
+        results.append(("fine-tuned", evaluate(gaussians, eval_cameras, pipe, background)))
+
+    print("\n{:<12} {:>12} {:>12}".format("", "PSNR [dB]", "render [ms]"))
+    for name, result in results:
+        print("{:<12} {:>12.2f} {:>12.2f}".format(name, result["psnr"], result["render_ms"]))
+
+    # A new iteration folder: Scene only loads the .gsz where no point_cloud.ply exists
+    output_iteration = args.output_iteration or scene.loaded_iter + max(args.finetune_iterations, 1)
+    out_dir = os.path.join(dataset.model_path, "point_cloud", "iteration_{}".format(output_iteration))
+    if os.path.exists(os.path.join(out_dir, "point_cloud.ply")):
+        raise FileExistsError("{} already holds a point_cloud.ply that would be loaded instead, "
+                              "choose another --output_iteration".format(out_dir))
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, COMPRESSED_FILE)
+    size = save_compressed(gaussians, out_path)
+    print("Codebook model ({:.2f} MB) written to {}".format(size / 2 ** 20, out_path))
@@ -14,9 +14,11 @@ from scene import Scene
 import os
 from tqdm import tqdm
 from os import makedirs
-from gaussian_renderer import render
-import torchvision
+from gaussian_renderer import render_views
 from utils.general_utils import safe_state
+from utils.image_writer import ImageWriter
+from utils.lod_utils import get_or_build_lod, level_model
+from scene.spatial_index import crop_model
 from argparse import ArgumentParser
 from arguments import ModelParams, PipelineParams, get_combined_args
 from gaussian_renderer import GaussianModel
@@ -27,37 +29,49 @@ except:
     SPARSE_ADAM_AVAILABLE = False
 
 
-def render_set(model_path, name, iteration, views, gaussians, pipeline, background, train_test_exp, separate_sh):
+def render_set(model_path, name, iteration, views, gaussians, pipeline, background, train_test_exp, separate_sh, spatial_index=None):
     render_path = os.path.join(model_path, name, "ours_{}".format(iteration), "renders")
     gts_path = os.path.join(model_path, name, "ours_{}".format(iteration), "gt")
 
     makedirs(render_path, exist_ok=True)
     makedirs(gts_path, exist_ok=True)
 
-    for idx, view in enumerate(tqdm(views, desc="Rendering progress")):
-        rendering = render(view, gaussians, pipeline, background, use_trained_exp=train_test_exp, separate_sh=separate_sh)["render"]
-        gt = view.original_image[0:3, :, :]
+    with ImageWriter(num_workers=args.writer_threads) as writer:
+        renders = render_views(views, gaussians, pipeline, background, use_trained_exp=train_test_exp, separate_sh=separate_sh, spatial_index=spatial_index)
+        for idx, render_pkg in tqdm(renders, total=len(views), desc="Rendering progress"):
+            rendering = render_pkg["render"]
+            gt = views[idx].original_image[0:3, :, :]
 
-        if args.train_test_exp:
-            rendering = rendering[..., rendering.shape[-1] // 2:]
-            gt = gt[..., gt.shape[-1] // 2:]
+            if args.train_test_exp:
+                rendering = rendering[..., rendering.shape[-1] // 2:]
+                gt = gt[..., gt.shape[-1] // 2:]
 
-        torchvision.utils.save_image(rendering, os.path.join(render_path, '{0:05d}'.format(idx) + ".png"))
-        torchvision.utils.save_image(gt, os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"))
+            writer.save(rendering, os.path.join(render_path, '{0:05d}'.format(idx) + ".png"))
+            writer.save(gt, os.path.join(gts_path, '{0:05d}'.format(idx) + ".png"))
 
-def render_sets(dataset : ModelParams, iteration : int, pipeline : PipelineParams, skip_train : bool, skip_test : bool, separate_sh: bool):
+def render_sets(dataset : ModelParams, iteration : int, pipeline : PipelineParams, skip_train : bool, skip_test : bool, separate_sh: bool, lod : int = -1, crop_box = None, frustum_cull : bool = False):
     with torch.no_grad():
         gaussians = GaussianModel(dataset.sh_degree)
         scene = Scene(dataset, gaussians, load_iteration=iteration, shuffle=False)
+        if lod >= 0:
+            lod_info = get_or_build_lod(gaussians, scene.getTrainCameras(), dataset.model_path, scene.loaded_iter)
+            lod = min(lod, len(lod_info["counts"]) - 1)
+            gaussians = level_model(gaussians, lod_info, lod)
+            print("Rendering LOD {} with {} Gaussians".format(lod, gaussians.get_xyz.shape[0]))
+        if crop_box:
+            gaussians = crop_model(gaussians, crop_box[:3], crop_box[3:])
+            print("Rendering the {} Gaussians inside the crop box".format(gaussians.get_xyz.shape[0]))
+        spatial_index = gaussians.build_spatial_index() if frustum_cull else None
+        gaussians.freeze()
 
         bg_color = [1,1,1] if dataset.white_background else [0, 0, 0]
         background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
 
         if not skip_train:
-             render_set(dataset.model_path, "train", scene.loaded_iter, scene.getTrainCameras(), gaussians, pipeline, background, dataset.train_test_exp, separate_sh)
+             render_set(dataset.model_path, "train", scene.loaded_iter, scene.getTrainCameras(), gaussians, pipeline, background, dataset.train_test_exp, separate_sh, spatial_index)
 
         if not skip_test:
-             render_set(dataset.model_path, "test", scene.loaded_iter, scene.getTestCameras(), gaussians, pipeline, background, dataset.train_test_exp, separate_sh)
+             render_set(dataset.model_path, "test", scene.loaded_iter, scene.getTestCameras(), gaussians, pipeline, background, dataset.train_test_exp, separate_sh, spatial_index)
 
 if __name__ == "__main__":
     # Set up command line argument parser
@@ -68,10 +82,14 @@ if __name__ == "__main__":
     parser.add_argument("--skip_train", action="store_true")
     parser.add_argument("--skip_test", action="store_true")
     parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--writer_threads", default=4, type=int)
+    parser.add_argument("--crop_box", nargs=6, type=float, default=None, help="Only render Gaussians inside x0 y0 z0 x1 y1 z1")
+    parser.add_argument("--frustum_cull", action="store_true", help="Cull Gaussians per view with a spatial index before rasterizing")
+    parser.add_argument("--lod", default=-1, type=int, help="Render this level of detail (0 = finest), see utils/build_lod.py")
     args = get_combined_args(parser)
     print("Rendering " + args.model_path)
 
     # Initialize system state (RNG)
     safe_state(args.quiet)
 
-    render_sets(model.extract(args), args.iteration, pipeline.extract(args), args.skip_train, args.skip_test, SPARSE_ADAM_AVAILABLE)
\ No newline at end of file
+    render_sets(model.extract(args), args.iteration, pipeline.extract(args), args.skip_train, args.skip_test, SPARSE_ADAM_AVAILABLE, args.lod, args.crop_box, args.frustum_cull)
\ No newline at end of file
@@ -1,29 +1,15 @@
 
 import os
-import numpy as np
 import torch
-import torchvision
 from argparse import ArgumentParser
-from scipy.spatial.transform import Rotation as R_scipy, Slerp
 
 from scene import Scene
 from arguments import ModelParams, PipelineParams, get_combined_args
-from gaussian_renderer import GaussianModel, render
-
-def make_cam(Rm, t, fovx, fovy, W, H):
-    from utils.graphics_utils import getWorld2View2, getProjectionMatrix
-    def to_cuda(mat):
-        return torch.as_tensor(mat, dtype=torch.float32, device="cuda")
-    P  = to_cuda(getProjectionMatrix(0.01, 100.0, fovx, fovy)).T
-    WV = to_cuda(getWorld2View2(Rm, t, np.zeros(3), 1.0)).T
-    cam = type("Cam", (), {})()
-    cam.world_view_transform = WV
-    cam.projection_matrix    = P
-    cam.full_proj_transform  = WV @ P
-    cam.camera_center        = torch.inverse(WV)[:3,3]
-    cam.image_width, cam.image_height = W, H
-    cam.FoVx, cam.FoVy = fovx, fovy
-    return cam
+from gaussian_renderer import GaussianModel, render_views
+from utils.image_writer import ImageWriter
+from utils.video_writer import VideoWriter
+from utils.camera_path import linear_path, catmull_rom_path, orbit_path
+from utils.lod_utils import get_or_build_lod, level_model
 
 def main():
 
@@ -44,6 +30,22 @@ def main():
                         help="nur Test-Views")
     parser.add_argument("--no_shuffle", action="store_true",
                         help="kein Shuffle der Original-Views")
+    parser.add_argument("--path", choices=["linear", "catmull_rom", "orbit"], default="linear",
+                        help="Kamerapfad: paarweise linear, Catmull-Rom-Spline oder Orbit um den Schwerpunkt")
+    parser.add_argument("--orbit_frames", type=int, default=120)
+    parser.add_argument("--orbit_degrees", type=float, default=360.0)
+    parser.add_argument("--lod", type=int, default=-1,
+                        help="Detailstufe rendern (0 = feinste, -1 = alle Gaussians), siehe utils/build_lod.py")
+    parser.add_argument("--writer_threads", type=int, default=4,
+                        help="Threads zum Schreiben der PNGs")
+    parser.add_argument("--video", action="store_true",
+                        help="Frames direkt in ein Video streamen (ffmpeg oder PyAV)")
+    parser.add_argument("--codec", type=str, default="libx264")
+    parser.add_argument("--crf", type=int, default=18)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--video_backend", choices=["auto", "ffmpeg", "pyav"], default="auto")
+    parser.add_argument("--png", choices=["all", "keyframes", "none"], default=None,
+                        help="Welche Frames als PNG gespeichert werden (default: all, mit --video: keyframes)")
     args = get_combined_args(parser)
     if args.no_shuffle: 
         torch.manual_seed(0)
@@ -59,6 +61,12 @@ def main():
         shuffle=not args.no_shuffle,
         resolution_scales=[max(args.scale, 1.0)]
     )
+    if args.lod >= 0:
+        lod_info = get_or_build_lod(gaussians, scene.getTrainCameras(max(args.scale, 1.0)), args.model_path, scene.loaded_iter)
+        lod = min(args.lod, len(lod_info["counts"]) - 1)
+        gaussians = level_model(gaussians, lod_info, lod)
+        print(f"Rendering LOD {lod} with {gaussians.get_xyz.shape[0]} Gaussians")
+    gaussians.freeze()
     bgcol = [1.0,1.0,1.0] if args.white_background else [0.0,0.0,0.0]
     background = torch.tensor(bgcol, dtype=torch.float32, device="cuda")
 
@@ -75,44 +83,17 @@ def main():
 
     # View-List interpolated
 
-    interp_views = []
     Nsteps = args.steps
-    for i in range(len(orig_views)-1):
-        v0 = orig_views[i]
-        v1 = orig_views[i+1]
-        # Rotation & Translation
-        R0 = v0.R
-        R1 = v1.R
-        t0 = v0.T
-        t1 = v1.T
-
-        # SLERP-Interpolator
-        key_times = [0.0, 1.0]
-        rots      = R_scipy.from_matrix([R0, R1])
-        slerp     = Slerp(key_times, rots)
-
-        alphas = np.linspace(0.0, 1.0, Nsteps+2)
-        for a in alphas[:-1]:
-            Rm = slerp(a).as_matrix()
-            tm = (1-a)*t0 + a*t1
-            # new cam object
-            cam = make_cam(
-                Rm, tm,
-                v0.FoVx, v0.FoVy,
-                v0.image_width, v0.image_height
-            )
-            interp_views.append(cam)
-
-    interp_views.append(
-        make_cam(
-            orig_views[-1].R,
-            orig_views[-1].T,
-            orig_views[-1].FoVx,
-            orig_views[-1].FoVy,
-            orig_views[-1].image_width,
-            orig_views[-1].image_height
-        )
-    )
+    if args.path == "orbit":
+        # Median instead of mean, so floaters do not pull the center off the face
+        centroid = gaussians.get_xyz.median(dim=0).values
+        interp_views = orbit_path(orig_views, args.orbit_frames, centroid, degrees=args.orbit_degrees)
+        keyframes = {0}
+    else:
+        path_fn = catmull_rom_path if args.path == "catmull_rom" else linear_path
+        interp_views = path_fn(orig_views, Nsteps)
+        # Frames at the original camera poses
+        keyframes = set(range(0, len(interp_views), Nsteps + 1))
 
 
     # Render-Loop
@@ -120,12 +101,25 @@ def main():
     out_dir = os.path.join(args.model_path, f"renders_interpolated_{args.iters}")
     os.makedirs(out_dir, exist_ok=True)
 
-    for idx, view in enumerate(interp_views):
-        out = render(view, gaussians, pipeline_obj, background)["render"]
-        torchvision.utils.save_image(
-            out,
-            os.path.join(out_dir, f"{idx:03d}.png")
-        )
+    png_mode = args.png or ("keyframes" if args.video else "all")
+    video = None
+    if args.video:
+        video = VideoWriter(os.path.join(args.model_path, f"renders_interpolated_{args.iters}.mp4"),
+                            fps=args.fps, codec=args.codec, crf=args.crf, backend=args.video_backend)
+
+    with ImageWriter(num_workers=args.writer_threads) as writer:
+        for idx, render_pkg in render_views(interp_views, gaussians, pipeline_obj, background):
+            image = render_pkg["render"]
+            if video is not None:
+                video.write(image)
+            if png_mode == "all" or (png_mode == "keyframes" and idx in keyframes):
+                writer.save(
+                    image,
+                    os.path.join(out_dir, f"{idx:03d}.png")
+                )
+    if video is not None:
+        video.close()
+        print(f"Video with {video.num_frames} frames written to {video.path}")
 
 if __name__ == "__main__":
     main()
@@ -2,70 +2,123 @@
 """
 extract_frames.py
 
-Extracts all frames from an MP4 video and saves them as JPEG images in the specified output directory.
+Extracts frames from an MP4 video and saves them as JPEG images in the specified output directory.
+With --count, only that many frames are kept: blurry frames are dropped and the rest are picked
+for viewpoint diversity (see frame_selection.select_frames). A frames.json manifest listing the
+written frames is saved next to them for the later pipeline steps.
 
 Usage:
     python extract_frames.py /path/to/video.mp4 /path/to/output_dir
+    python extract_frames.py /path/to/video.mp4 /path/to/output_dir --count 150
 
 Dependencies:
-    pip install opencv-python tqdm
+    pip install opencv-python tqdm numpy
 """
 
 import argparse
 import os
 from pathlib import Path
+from typing import Iterator, Optional
 
 import cv2
 from tqdm import tqdm
 
+from frame_selection import DIVERSITY_METRICS, MANIFEST_FILE, analyze_frames, select_frames, write_manifest
 
-def extract_frames(video_path: Path, output_dir: Path, prefix: str = "frame", ext: str = ".jpg") -> None:
-    """Extract all frames from *video_path* and save them as *ext* images in *output_dir*.
 
-    Args:
-        video_path: Path to the input .mp4 file.
-        output_dir: Directory where extracted frames will be written.
-        prefix: Filename prefix for saved frames (default "frame").
-        ext: File extension for saved images (default ".jpg").
-    """
-    if not video_path.is_file():
-        raise FileNotFoundError(f"Input video not found: {video_path}")
+def read_frames(cap: cv2.VideoCapture, total_frames: int, desc: str) -> Iterator:
+    """Yields every decoded frame of *cap* with a progress bar."""
+    with tqdm(total=total_frames, unit="frame", desc=desc) as pbar:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break  # no more frames
+            yield frame
+            pbar.update(1)
 
-    # Ensure output directory exists
-    output_dir.mkdir(parents=True, exist_ok=True)
 
+def open_video(video_path: Path) -> cv2.VideoCapture:
+    if not video_path.is_file():
+        raise FileNotFoundError(f"Input video not found: {video_path}")
     cap = cv2.VideoCapture(str(video_path))
     if not cap.isOpened():
         raise IOError(f"Could not open video: {video_path}")
+    return cap
 
+
+def extract_frames(video_path: Path, output_dir: Path, prefix: str = "frame", ext: str = ".jpg",
+                   count: Optional[int] = None, blur_percentile: float = 20.0, sharpness_weight: float = 1.0,
+                   metric: str = "pixels") -> Path:
+    """Extract frames from *video_path* and save them as *ext* images in *output_dir*.
+
+    Args:
+        video_path: Path to the input .mp4 file.
+        output_dir: Directory where extracted frames will be written.
+        prefix: Filename prefix for saved frames (default "frame").
+        ext: File extension for saved images (default ".jpg").
+        count: Number of frames to keep (default: all). Selected by sharpness and diversity
+            in a first decoding pass that only keeps small thumbnails in memory.
+        blur_percentile: Percentage of the blurriest frames that is never selected.
+        sharpness_weight: Exponent of the relative sharpness in the selection score.
+        metric: Diversity measure, "pixels" (thumbnail distance) or "phash" (perceptual hash).
+
+    Returns:
+        Path of the frames.json manifest.
+    """
+    if count is not None and count < 1:
+        raise ValueError("count must be at least 1")
+    cap = open_video(video_path)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
     num_padding = len(str(total_frames))  # zero‑pad filenames so they sort naturally
 
-    with tqdm(total=total_frames, unit="frame", desc="Extracting") as pbar:
-        idx = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break  # no more frames
+    sharpness, selected = None, None
+    if count is not None:
+        sharpness, thumbs = analyze_frames(read_frames(cap, total_frames, "Scoring"))
+        selected = set(select_frames(sharpness, thumbs, count, blur_percentile, sharpness_weight, metric).tolist())
+        cap.release()
+        cap = open_video(video_path)
 
-            filename = f"{prefix}_{idx:0{num_padding}d}{ext}"
-            cv2.imwrite(str(output_dir / filename), frame, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
-            idx += 1
-            pbar.update(1)
+    # Ensure output directory exists
+    output_dir.mkdir(parents=True, exist_ok=True)
 
+    frames = []
+    for idx, frame in enumerate(read_frames(cap, total_frames, "Extracting")):
+        if selected is not None and idx not in selected:
+            continue
+        filename = f"{prefix}_{idx:0{num_padding}d}{ext}"
+        cv2.imwrite(str(output_dir / filename), frame, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
+        entry = {"index": idx, "file": filename, "time": idx / fps if fps else None}
+        if sharpness is not None:
+            entry["sharpness"] = float(sharpness[idx])
+        frames.append(entry)
     cap.release()
-    print(f"Saved {idx} frames to {output_dir.resolve()}")
+
+    params = {"count": count, "blur_percentile": blur_percentile, "sharpness_weight": sharpness_weight,
+              "metric": metric} if count is not None else {}
+    manifest = write_manifest(str(output_dir), str(video_path), fps, total_frames, frames, params)
+    print(f"Saved {len(frames)} frames to {output_dir.resolve()}")
+    return Path(manifest)
 
 
 def main() -> None:
-    parser = argparse.ArgumentParser(description="Extract frames from an MP4 video and save them as JPEG images.")
+    parser = argparse.ArgumentParser(description=f"Extract frames from an MP4 video and save them as JPEG images with a {MANIFEST_FILE} manifest.")
     parser.add_argument("video", type=Path, help="Path to the .mp4 file")
     parser.add_argument("output", type=Path, help="Directory to write extracted frames")
     parser.add_argument("--prefix", default="frame", help="Filename prefix for saved frames (default: 'frame')")
     parser.add_argument("--ext", default=".jpg", choices=[".jpg", ".jpeg"], help="Image file extension (default: .jpg)")
+    parser.add_argument("--count", type=int, default=None,
+                        help="Keep only this many sharp, diverse frames (default: all frames)")
+    parser.add_argument("--blur_percentile", type=float, default=20.0,
+                        help="Never select the blurriest N percent of the frames (default: 20)")
+    parser.add_argument("--sharpness_weight", type=float, default=1.0,
+                        help="Weight of sharpness against diversity, 0 ignores sharpness (default: 1)")
+    parser.add_argument("--metric", choices=DIVERSITY_METRICS, default="pixels",
+                        help="Diversity measure: downsampled-image distance or perceptual hash (default: pixels)")
     args = parser.parse_args()
 
-    extract_frames(args.video, args.output, prefix=args.prefix, ext=args.ext)
+    extract_frames(args.video, args.output, prefix=args.prefix, ext=args.ext, count=args.count,
+                   blur_percentile=args.blur_percentile, sharpness_weight=args.sharpness_weight, metric=args.metric)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Streams a capture video straight into segmentation and depth: every frame
+is decoded once, optionally thinned out by stride or by sharpness/motion,
+and the selected frames go in batches through the make_depth_maps pipeline.
+Images, masks and depth maps are written in one pass, without writing and
+re-reading intermediate JPEGs. The decode queue and the writer pool are
+bounded, so memory does not grow with the length of the video.
+
+    python utils/video_to_maps.py capture.mp4 data/images data/depth data/seg --select sharpest --stride 5
+"""
+import os
+import math
+import queue
+import argparse
+import threading
+import cv2
+
+from make_depth_maps import add_runner_arguments, build_runner, process_batches, print_throughput
+from frame_selection import SELECTION_MODES, IndexSelector, StreamingSelector, read_manifest
+
+_END = object()
+
+
+def decode_frames(capture, selector, prepare, prefix, num_padding, frames, stop):
+    """Decoder thread: reads the video once and queues the selected frames with their host side preprocessing."""
+    try:
+        index = 0
+        while not stop.is_set():
+            ret, frame = capture.read()
+            selected = selector.push(index, frame) if ret else selector.flush()
+            for frame_index, selected_frame in selected:
+                name = f"{prefix}_{frame_index:0{num_padding}d}"
+                frames.put((name, prepare(selected_frame), selected_frame.shape[:2], selected_frame))
+            if not ret:
+                break
+            index += 1
+        frames.put(_END)
+    except Exception as e:
+        frames.put(e)
+
+
+def iter_video_batches(video_path, selector, prepare, batch_size, prefix="frame"):
+    """Yields lists of (name, prepared, size, frame); at most two batches wait in the decode queue."""
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError(f"Video konnte nicht geöffnet werden: {video_path}")
+    num_padding = len(str(max(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 1)))
+    frames = queue.Queue(maxsize=2 * batch_size)
+    stop = threading.Event()
+    decoder = threading.Thread(target=decode_frames, name="video-decode", daemon=True,
+                               args=(capture, selector, prepare, prefix, num_padding, frames, stop))
+    decoder.start()
+    try:
+        batch = []
+        while True:
+            item = frames.get()
+            if isinstance(item, Exception):
+                raise item
+            if item is _END:
+                break
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # Unblock the decoder if the consumer stopped early
+        stop.set()
+        while decoder.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        capture.release()
+
+
+def expected_frames(video_path, selector):
+    """Number of frames the selection will produce, None if it depends on the content."""
+    capture = cv2.VideoCapture(video_path)
+    count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    if count <= 0 or selector.min_motion > 0:
+        return None
+    return math.ceil(count / selector.stride)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dekodiert ein Video einmal und schreibt Bilder, Segmentierungs- und Depth-Maps "
+                    "der ausgewählten Frames in einem Durchlauf."
+    )
+    parser.add_argument("video", help="Pfad zum Video (z. B. MP4).")
+    parser.add_argument("output_image_dir", help="Ordner für die ausgewählten Frames.")
+    parser.add_argument("output_depth_dir", help="Ordner für die ausgegebenen Depth-Maps.")
+    parser.add_argument("output_seg_dir", help="Ordner für die ausgegebenen Segmentierungs-Maps.")
+    add_runner_arguments(parser)
+    parser.add_argument(
+        "--select",
+        choices=SELECTION_MODES,
+        default="all",
+        help="'all': jeder Frame, 'stride': jeder n-te Frame, 'sharpest': der schärfste Frame "
+             "(Laplace-Varianz) aus jedem Fenster von --stride Frames (Standard: all)."
+    )
+    parser.add_argument(
+        "--stride",
+        type=int,
+        default=1,
+        help="Schrittweite bzw. Fenstergröße für --select stride/sharpest (Standard: 1)."
+    )
+    parser.add_argument(
+        "--min_motion",
+        type=float,
+        default=0.0,
+        help="Frames verwerfen, die sich im Mittel um weniger als diesen Grauwert (0-255) vom zuletzt "
+             "behaltenen Frame unterscheiden (Standard: 0 = aus)."
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="frames.json von vid_to_frames.py (oder dessen Ordner): genau die dort ausgewählten Frames "
+             "verarbeiten, statt --select/--stride/--min_motion."
+    )
+    parser.add_argument("--prefix", default="frame", help="Präfix der Dateinamen (Standard: 'frame').")
+    parser.add_argument(
+        "--image_ext",
+        choices=[".jpg", ".png"],
+        default=".jpg",
+        help="Format der ausgegebenen Frames (Standard: .jpg mit Qualität 95 wie vid_to_frames.py)."
+    )
+    parser.add_argument(
+        "--tasks",
+        nargs="+",
+        choices=["seg", "depth"],
+        default=["seg", "depth"],
+        help="Zu erzeugende Maps (Standard: seg depth). Ohne 'seg' wird die Depth-Map nicht maskiert."
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=4,
+        help="Anzahl Frames pro Forward-Pass (Standard: 4)."
+    )
+    parser.add_argument(
+        "--writer_threads",
+        type=int,
+        default=4,
+        help="Threads zum Schreiben der Bilder und PNGs (Standard: 4)."
+    )
+
+    args = parser.parse_args()
+
+    video_path = os.path.abspath(args.video)
+    if not os.path.isfile(video_path):
+        raise FileNotFoundError(f"Video nicht gefunden: {video_path}")
+    if args.batch_size < 1:
+        raise ValueError("--batch_size muss mindestens 1 sein.")
+    out_dirs = [os.path.abspath(d) for d in (args.output_image_dir, args.output_depth_dir, args.output_seg_dir)]
+    for out_dir in out_dirs:
+        os.makedirs(out_dir, exist_ok=True)
+    out_image_dir, out_depth_dir, out_seg_dir = out_dirs
+
+    runner = build_runner(args, args.tasks)
+    if args.manifest:
+        indices = [entry["index"] for entry in read_manifest(args.manifest)["frames"]]
+        selector, total = IndexSelector(indices), len(indices)
+    else:
+        selector = StreamingSelector(args.select, args.stride, args.min_motion)
+        total = expected_frames(video_path, selector)
+    image_params = [int(cv2.IMWRITE_JPEG_QUALITY), 95] if args.image_ext == ".jpg" else []
+
+    batches = iter_video_batches(video_path, selector, runner.prepare, args.batch_size, args.prefix)
+    stats = process_batches(batches, total, out_depth_dir, out_seg_dir, runner,
+                            batch_size=args.batch_size, writer_threads=args.writer_threads, tasks=args.tasks,
+                            out_image_dir=out_image_dir, image_ext=args.image_ext, image_params=image_params)
+    print_throughput(stats, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    PYAV_AVAILABLE = False
+
+
+def available_backends():
+    backends = []
+    if shutil.which("ffmpeg") is not None:
+        backends.append("ffmpeg")
+    if PYAV_AVAILABLE:
+        backends.append("pyav")
+    return backends
+
+
+def to_uint8_frame(image):
+    """CHW float tensor in [0, 1] -> HxWx3 uint8 numpy array."""
+    return (image.detach().clamp(0, 1) * 255).round().byte().permute(1, 2, 0).contiguous().cpu().numpy()
+
+
+class VideoWriter:
+    """
+    Streams frames into a video encoder instead of writing single images.
+
+    Frames go through a bounded queue to an encoder thread, so rendering and
+    encoding overlap and at most max_queue frames wait in host memory. The
+    encoder is an ffmpeg subprocess fed over stdin or, if ffmpeg is not on the
+    PATH, PyAV. Odd frame sizes are padded to even ones as yuv420p requires.
+    """
+
+    def __init__(self, path, fps=30, codec="libx264", crf=18, backend="auto", max_queue=8, pix_fmt="yuv420p"):
+        backends = available_backends()
+        if backend == "auto":
+            if not backends:
+                raise RuntimeError("Video output needs ffmpeg on the PATH or PyAV (pip install av)")
+            backend = backends[0]
+        elif backend not in backends:
+            raise RuntimeError("Video backend {} is not available (found: {})".format(backend, ", ".join(backends) or "none"))
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+        self.crf = crf
+        self.pix_fmt = pix_fmt
+        self.backend = backend
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.size = None
+        self.error = None
+        self.num_frames = 0
+        self.thread = threading.Thread(target=self._encode_loop, name="video-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, image):
+        """image: CHW float tensor in [0, 1] or HxWx3 uint8 array. Blocks while the queue is full."""
+        if self.error is not None:
+            raise self.error
+        frame = image if isinstance(image, np.ndarray) else to_uint8_frame(image)
+        if self.size is None:
+            self.size = frame.shape[:2]
+        elif frame.shape[:2] != self.size:
+            raise ValueError("All frames of a video need the same size, got {} after {}".format(frame.shape[:2], self.size))
+        self.frames.put(frame)
+        self.num_frames += 1
+
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _pad_even(self, frame):
+        h, w = frame.shape[:2]
+        if h % 2 == 0 and w % 2 == 0:
+            return frame
+        return np.pad(frame, ((0, h % 2), (0, w % 2), (0, 0)), mode="edge")
+
+    def _encode_loop(self):
+        sink = None
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+                frame = self._pad_even(frame)
+                if sink is None:
+                    sink = self._open(frame.shape[1], frame.shape[0])
+                sink.write(frame)
+        except Exception as e:
+            self.error = e
+            # Keep draining so write() never blocks on a dead encoder
+            while self.frames.get() is not None:
+                pass
+        finally:
+            if sink is not None:
+                try:
+                    sink.close()
+                except Exception as e:
+                    self.error = self.error or e
+
+    def _open(self, width, height):
+        if self.backend == "ffmpeg":
+            return _FFmpegSink(self.path, width, height, self.fps, self.codec, self.crf, self.pix_fmt)
+        return _PyAVSink(self.path, width, height, self.fps, self.codec, self.crf, self.pix_fmt)
+
+
+class _FFmpegSink:
+    def __init__(self, path, width, height, fps, codec, crf, pix_fmt):
+        cmd = ["ffmpeg", "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "{}x{}".format(width, height), "-r", str(fps), "-i", "-",
+               "-c:v", codec, "-pix_fmt", pix_fmt]
+        if crf is not None:
+            cmd += ["-crf", str(crf)]
+        cmd.append(path)
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError("ffmpeg exited with status {}".format(self.process.returncode))
+
+
+class _PyAVSink:
+    def __init__(self, path, width, height, fps, codec, crf, pix_fmt):
+        self.container = av.open(path, mode="w")
+        self.stream = self.container.add_stream(codec, rate=fps)
+        self.stream.width = width
+        self.stream.height = height
+        self.stream.pix_fmt = pix_fmt
+        if crf is not None:
+            self.stream.options = {"crf": str(crf)}
+
+    def write(self, frame):
+        for packet in self.stream.encode(av.VideoFrame.from_ndarray(frame, format="rgb24")):
+            self.container.mux(packet)
+
+    def close(self):
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
@@ -0,0 +1,41 @@
+import torch
+
+
+def assign(x, centers, chunk_size=65536):
+    """Index of the nearest center for every row of x, computed in chunks to bound memory."""
+    labels = torch.empty(x.shape[0], dtype=torch.long, device=x.device)
+    center_sq = (centers * centers).sum(dim=1)
+    for start in range(0, x.shape[0], chunk_size):
+        chunk = x[start:start + chunk_size]
+        # |x - c|^2 without the |x|^2 term, which does not change the argmin
+        dist = center_sq[None, :] - 2.0 * chunk @ centers.T
+        labels[start:start + chunk_size] = dist.argmin(dim=1)
+    return labels
+
+
+@torch.no_grad()
+def kmeans(x, k, iterations=20, chunk_size=65536, seed=0, tolerance=1e-4):
+    """
+    Batched k-means on whatever device x lives on. Returns (centers, labels).
+    Empty clusters are re-seeded with random rows, so all k centers are used.
+    """
+    x = x.float()
+    n = x.shape[0]
+    k = min(k, n)
+    generator = torch.Generator(device="cpu").manual_seed(seed)
+    centers = x[torch.randperm(n, generator=generator)[:k].to(x.device)].clone()
+    labels = assign(x, centers, chunk_size)
+    for _ in range(iterations):
+        sums = torch.zeros_like(centers).index_add_(0, labels, x)
+        counts = torch.bincount(labels, minlength=k).to(x.dtype)
+        empty = counts == 0
+        new_centers = sums / counts.clamp_min(1)[:, None]
+        if empty.any():
+            reseed = torch.randint(0, n, (int(empty.sum()),), generator=generator).to(x.device)
+            new_centers[empty] = x[reseed]
+        shift = (new_centers - centers).norm(dim=1).max()
+        centers = new_centers
+        labels = assign(x, centers, chunk_size)
+        if shift < tolerance:
+            break
+    return centers, labels